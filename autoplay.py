@@ -7,11 +7,60 @@ It provides a GUI for users to set start and play positions, intervals, and numb
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import pyautogui
-import time
-import json
+import os
+import sqlite3
 import threading
 from datetime import datetime
-import random
+
+from engine import StepRunner, PyAutoGUIBackend, STEP_CLICK, STEP_MOVE, STEP_CLICK_IMAGE, STEP_SCROLL
+from capture import ScreenFrameSource, FrameGrabber
+from plan import IntervalPlan, Script, PAGE_SCROLL, PAGE_CLICK
+from vision import normalize_probes
+from steplist import StepListView
+from uibus import UIBus
+from monitor import MouseMonitor
+from journal import ProgressJournal, script_fingerprint, journal_path, read_progress
+from recorder import ActionRecorder, capture_next_click
+from metrics import (RunMetrics, PHASE_JITTER, PHASE_ACTION, PHASE_WAIT, PHASE_VIDEO_WAIT,
+                     PHASE_READY_WAIT, PHASE_LOOP_INTERVAL)
+from simulate import simulate, format_duration
+from durations import DurationStore, DurationLearner, MARGIN_SECONDS
+from supervisor import Supervisor, IncidentLog, INCIDENT_LOG
+from layout import Display, LayoutError, ANCHOR_SCREEN, ANCHOR_WINDOW, FIT_STRETCH
+import scriptio
+
+# 预览窗口最多列出的课程数
+PREVIEW_COURSE_LIMIT = 500
+
+# 翻页方式的显示名称
+PAGE_ACTIONS = {"滚动": PAGE_SCROLL, "点击下一页": PAGE_CLICK}
+# 手工添加滚动步骤时默认滚动的格数(负数向下)
+DEFAULT_SCROLL = -5
+
+# 故障处理方式的显示名称
+INCIDENT_ACTIONS = {"retry": "重试", "recover": "重新选择课程", "skip": "跳过该步骤", "abort": "结束执行",
+                    "continue": "按固定等待继续"}
+
+# 取色时把鼠标停在检测点上的时间(秒)，取色不点击，避免改变页面
+PROBE_DELAY = 3.0
+
+# 执行计时统计的导出目录和定期导出间隔(秒)
+METRICS_DIR = "run_metrics"
+METRICS_EXPORT_INTERVAL = 60
+
+# 预览中各执行阶段的名称
+PHASE_NAMES = {PHASE_JITTER: "鼠标抖动", PHASE_ACTION: "点击/移动", PHASE_WAIT: "步骤等待",
+               PHASE_VIDEO_WAIT: "视频结束检测(最长)", PHASE_READY_WAIT: "页面就绪检测(最长)",
+               PHASE_LOOP_INTERVAL: "循环间隔"}
+
+# 脚本文件类型
+SCRIPT_FILETYPES = [("JSON文件", "*.json"), ("JSON Lines文件", "*.jsonl"),
+                    ("紧凑二进制脚本", "*.aps"), ("脚本语言源码", "*.apl"), ("所有文件", "*.*")]
+
+# 界面刷新间隔(毫秒)，以及同一帧内只显示最新一条的进度事件
+UI_REFRESH_MS = 50
+COALESCED_EVENTS = ("status", "loop_start", "step_start", "step_end", "loop_wait",
+                    "video_end", "page_ready", "image_found")
 
 class VideoCourseAutomator:
     def __init__(self, root):
@@ -20,13 +69,42 @@ class VideoCourseAutomator:
         self.root.geometry("950x700")
         
         # 脚本步骤存储
-        self.script_steps = []
+        self.script_steps = Script()
         self.is_recording = False
         self.is_playing = False
+        # 录制器在独立线程采样，不占用 Tk 线程
+        self.recorder = ActionRecorder(pyautogui.position)
         self.current_step_index = 0
         
+        # 共享截图线程：只在有视觉检测时截取所需区域
+        self.frame_grabber = FrameGrabber(ScreenFrameSource())
+        self.frame_grabber.start()
+        
+        # 执行引擎
+        # 工作线程通过消息队列更新界面，不直接操作 Tk 控件
+        self.ui_bus = UIBus(self.root, self.on_ui_event, interval=UI_REFRESH_MS, coalesce=COALESCED_EVENTS)
+        self.runner = StepRunner(PyAutoGUIBackend(), on_event=self.ui_bus.post,
+                                 frame_source=self.frame_grabber)
+        # 无人值守时失败的步骤自动重试/恢复，故障写入 incidents.jsonl
+        self.supervisor = Supervisor(self.runner, incident_log=IncidentLog(INCIDENT_LOG))
+        
+        # 当前显示布局：加载和执行脚本时把坐标换算到当前分辨率/窗口位置
+        self.display = Display()
+        
+        # 各课程实际时长的记录，生成步骤时按课程设置等待时间
+        try:
+            self.duration_store = DurationStore()
+        except sqlite3.Error:
+            self.duration_store = None
+        
         self.setup_ui()
-        self.update_mouse_position()
+        self.ui_bus.start()
+        
+        # 鼠标位置监控：移动时加快、静止时退避，最小化或执行脚本时停止
+        self.mouse_monitor = MouseMonitor(self.root, pyautogui.position, self.update_mouse_position)
+        self.root.bind("<Map>", self.on_window_map, add="+")
+        self.root.bind("<Unmap>", self.on_window_unmap, add="+")
+        self.mouse_monitor.start()
         
     def setup_ui(self):
         # 主框架
@@ -71,7 +149,7 @@ class VideoCourseAutomator:
         self.interval_y.grid(row=1, column=3, padx=2)
         
         ttk.Label(interval_frame, text="课程数量:").grid(row=1, column=4, padx=2)
-        self.course_count = ttk.Spinbox(interval_frame, from_=1, to=100, width=8)
+        self.course_count = ttk.Spinbox(interval_frame, from_=1, to=100000, width=8)
         self.course_count.grid(row=1, column=5, padx=2)
         self.course_count.set("5")
         
@@ -80,6 +158,68 @@ class VideoCourseAutomator:
         self.video_duration.grid(row=1, column=7, padx=2)
         self.video_duration.insert(0, "300")
         
+        # 视频结束检测区域(进度条/重播提示)，留空则按固定时长等待
+        ttk.Label(interval_frame, text="结束检测区域(X,Y,宽,高):").grid(row=3, column=0, columnspan=2, padx=2)
+        self.video_region = ttk.Entry(interval_frame, width=20)
+        self.video_region.grid(row=3, column=2, columnspan=2, padx=2, sticky=tk.W)
+        
+        # 按记录的课程时长等待时额外加上的时间
+        ttk.Label(interval_frame, text="时长余量(秒):").grid(row=3, column=4, padx=2)
+        self.duration_margin = ttk.Entry(interval_frame, width=8)
+        self.duration_margin.grid(row=3, column=5, padx=2)
+        self.duration_margin.insert(0, str(int(MARGIN_SECONDS)))
+        
+        # 第五行：网格(每行课程数为空或0表示只有一行)
+        ttk.Label(interval_frame, text="每行课程数:").grid(row=4, column=0, padx=2)
+        self.columns = ttk.Entry(interval_frame, width=8)
+        self.columns.grid(row=4, column=1, padx=2)
+        
+        ttk.Label(interval_frame, text="行间隔X:").grid(row=4, column=2, padx=2)
+        self.row_x = ttk.Entry(interval_frame, width=8)
+        self.row_x.grid(row=4, column=3, padx=2)
+        
+        ttk.Label(interval_frame, text="行间隔Y:").grid(row=4, column=4, padx=2)
+        self.row_y = ttk.Entry(interval_frame, width=8)
+        self.row_y.grid(row=4, column=5, padx=2)
+        
+        # 每页课程数为空或0表示不翻页
+        ttk.Label(interval_frame, text="每页课程数:").grid(row=4, column=6, padx=2)
+        self.page_size = ttk.Entry(interval_frame, width=8)
+        self.page_size.grid(row=4, column=7, padx=2)
+        
+        # 第六行：翻页
+        ttk.Label(interval_frame, text="翻页方式:").grid(row=5, column=0, padx=2)
+        self.page_action = ttk.Combobox(interval_frame, values=list(PAGE_ACTIONS), state="readonly", width=10)
+        self.page_action.grid(row=5, column=1, padx=2)
+        self.page_action.set("滚动")
+        
+        ttk.Label(interval_frame, text="翻页X:").grid(row=5, column=2, padx=2)
+        self.page_x = ttk.Entry(interval_frame, width=8)
+        self.page_x.grid(row=5, column=3, padx=2)
+        
+        ttk.Label(interval_frame, text="翻页Y:").grid(row=5, column=4, padx=2)
+        self.page_y = ttk.Entry(interval_frame, width=8)
+        self.page_y.grid(row=5, column=5, padx=2)
+        
+        ttk.Label(interval_frame, text="滚动格数:").grid(row=5, column=6, padx=2)
+        self.page_scroll = ttk.Entry(interval_frame, width=8)
+        self.page_scroll.grid(row=5, column=7, padx=2)
+        self.page_scroll.insert(0, str(DEFAULT_SCROLL))
+        
+        ttk.Button(interval_frame, text="获取翻页位置", 
+                  command=self.get_page_position).grid(row=6, column=0, columnspan=2, padx=2, pady=5)
+        ttk.Label(interval_frame, text="翻页后等待(秒):").grid(row=6, column=2, padx=2)
+        self.page_wait = ttk.Entry(interval_frame, width=8)
+        self.page_wait.grid(row=6, column=3, padx=2)
+        self.page_wait.insert(0, "2")
+        
+        # 选择视频后的就绪检测点 "X,Y,#RRGGBB;..."，留空则固定等待2秒
+        ttk.Label(interval_frame, text="就绪检测点:").grid(row=6, column=4, padx=2)
+        self.ready_probes = ttk.Entry(interval_frame, width=24)
+        self.ready_probes.grid(row=6, column=5, columnspan=2, padx=2, sticky=tk.W)
+        ttk.Button(interval_frame, text="添加检测点", 
+                  command=self.add_ready_probe).grid(row=6, column=7, padx=2, pady=5)
+        
         # 第三行：按钮
         ttk.Button(interval_frame, text="获取起始位置", 
                   command=self.get_start_position).grid(row=2, column=0, columnspan=2, padx=2, pady=5)
@@ -110,6 +250,14 @@ class VideoCourseAutomator:
         test_btn = ttk.Button(control_frame, text="测试步骤", command=self.test_current_step)
         test_btn.grid(row=0, column=3, padx=5, pady=5)
         
+        # 暂停/继续按钮
+        self.pause_btn = ttk.Button(control_frame, text="暂停", command=self.toggle_pause)
+        self.pause_btn.grid(row=0, column=4, padx=5, pady=5)
+        
+        # 录制按钮
+        self.record_btn = ttk.Button(control_frame, text="开始录制", command=self.toggle_recording)
+        self.record_btn.grid(row=0, column=5, padx=5, pady=5)
+        
         # 脚本步骤编辑区域
         script_frame = ttk.LabelFrame(main_frame, text="脚本步骤编辑", padding="5")
         script_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5)
@@ -137,12 +285,15 @@ class VideoCourseAutomator:
         scrollbar.grid(row=0, column=4, sticky=(tk.N, tk.S))
         self.steps_tree.configure(yscrollcommand=scrollbar.set)
         
+        # 增量/虚拟化的步骤列表
+        self.steps_view = StepListView(self.steps_tree, scrollbar, lambda: self.script_steps)
+        
         # 步骤编辑区域
         edit_frame = ttk.Frame(script_frame)
         edit_frame.grid(row=1, column=0, columnspan=5, sticky=(tk.W, tk.E), pady=5)
         
         ttk.Label(edit_frame, text="步骤类型:").grid(row=0, column=0, padx=2)
-        self.step_type = ttk.Combobox(edit_frame, values=["点击", "等待", "移动"], state="readonly")
+        self.step_type = ttk.Combobox(edit_frame, values=["点击", "等待", "移动", "点击图像", "滚动"], state="readonly")
         self.step_type.grid(row=0, column=1, padx=2)
         self.step_type.set("点击")
         
@@ -200,6 +351,11 @@ class VideoCourseAutomator:
         self.loop_interval.grid(row=0, column=3, padx=2)
         self.loop_interval.insert(0, "2")
         
+        # 坐标参考：留空时以整个屏幕为参考，填写窗口标题时以该窗口为参考(窗口移动或缩放后坐标随之换算)
+        ttk.Label(settings_frame, text="参考窗口:").grid(row=0, column=4, padx=2)
+        self.reference_window = ttk.Entry(settings_frame, width=20)
+        self.reference_window.grid(row=0, column=5, padx=2)
+        
         # 状态显示
         self.status_label = ttk.Label(main_frame, text="就绪", relief=tk.SUNKEN, anchor=tk.W)
         self.status_label.grid(row=6, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
@@ -212,12 +368,19 @@ class VideoCourseAutomator:
         script_frame.columnconfigure(0, weight=1)
         script_frame.rowconfigure(0, weight=1)
         
-    def update_mouse_position(self):
-        """实时更新鼠标位置"""
-        if not self.is_playing:  # 只在非播放状态更新位置
-            x, y = pyautogui.position()
-            self.position_label.config(text=f"X: {x}, Y: {y}")
-        self.root.after(100, self.update_mouse_position)
+    def update_mouse_position(self, x, y):
+        """鼠标位置变化时更新显示"""
+        self.position_label.config(text=f"X: {x}, Y: {y}")
+    
+    def on_window_map(self, event):
+        """窗口恢复显示时继续监控鼠标位置"""
+        if event.widget is self.root:
+            self.mouse_monitor.resume("minimized")
+    
+    def on_window_unmap(self, event):
+        """窗口最小化时停止监控鼠标位置"""
+        if event.widget is self.root:
+            self.mouse_monitor.suspend("minimized")
     
     def get_current_position(self):
         """获取当前鼠标位置并填入输入框"""
@@ -229,125 +392,231 @@ class VideoCourseAutomator:
     
     def get_start_position(self):
         """获取起始位置"""
-        self.waiting_for_position = "start"
-        self.instruction_label.config(text="请点击起始位置", foreground="red")
-        self.cancel_btn.config(state="normal")
+        self.wait_for_position(self.start_x, self.start_y, "起始位置")
     
     def get_play_position(self):
         """获取播放位置"""
-        self.waiting_for_position = "play"
-        self.instruction_label.config(text="请点击播放位置", foreground="red")
-        self.cancel_btn.config(state="normal")
+        self.wait_for_position(self.play_x, self.play_y, "播放位置")
+    
+    def get_page_position(self):
+        """获取翻页位置(滚动的位置或"下一页"按钮)"""
+        self.wait_for_position(self.page_x, self.page_y, "翻页位置")
+    
+    def add_ready_probe(self):
+        """页面加载完成后，把鼠标停在加载完成才会出现的位置(如播放按钮)上，记录该点的颜色"""
+        def add(x, y, color):
+            text = self.ready_probes.get().strip().rstrip(";")
+            probe = f"{x},{y},#{color[0]:02X}{color[1]:02X}{color[2]:02X}"
+            self.ready_probes.delete(0, tk.END)
+            self.ready_probes.insert(0, f"{text};{probe}" if text else probe)
+            self.set_status(f"已添加检测点: {probe}")
+        
+        def grab():
+            x, y = pyautogui.position()
+            color = pyautogui.pixel(x, y)
+            self.ui_bus.call(add, x, y, tuple(color[:3]))
+        
+        timer = threading.Timer(PROBE_DELAY, grab)
+        timer.daemon = True
+        timer.start()
+        self.set_status(f"请在{PROBE_DELAY:.0f}秒内把鼠标移到页面加载完成后才会出现的位置")
+    
+    def parse_probes(self, text):
+        """解析 "X,Y,#RRGGBB;..." 格式的检测点，空字符串返回 None"""
+        text = text.replace("；", ";").replace("，", ",").strip().strip(";")
+        if not text:
+            return None
+        return normalize_probes([part.split(",") for part in text.split(";")])
+    
+    def wait_for_position(self, x_entry, y_entry, name):
+        """捕获下一次点击的位置填入输入框，没有 pynput 时3秒后取当前鼠标位置"""
+        def fill(x, y):
+            x_entry.delete(0, tk.END)
+            x_entry.insert(0, str(x))
+            y_entry.delete(0, tk.END)
+            y_entry.insert(0, str(y))
+            self.set_status(f"{name}: ({x}, {y})")
+        
+        # 回调在监听线程中执行，通过消息队列回到 Tk 线程
+        if capture_next_click(lambda x, y: self.ui_bus.call(fill, x, y), position=pyautogui.position):
+            self.set_status(f"请点击{name}")
+        else:
+            self.set_status(f"请在3秒内把鼠标移到{name}")
+    
+    def toggle_recording(self):
+        """开始/停止录制鼠标动作"""
+        if self.is_playing:
+            return
+        if not self.recorder.is_recording:
+            # 不录制本程序窗口内的点击(包括结束时按下的"停止录制")
+            self.root.update_idletasks()
+            window = (self.root.winfo_rootx(), self.root.winfo_rooty(),
+                      self.root.winfo_width(), self.root.winfo_height())
+            self.recorder.start(exclude=window)
+            self.is_recording = True
+            self.record_btn.config(text="停止录制")
+            self.play_btn.config(state="disabled")
+            if self.recorder.clicks_supported:
+                self.set_status("正在录制鼠标动作...")
+            else:
+                self.set_status("正在录制鼠标移动(未安装 pynput，无法录制点击)...")
+            return
+        
+        self.recorder.stop()
+        self.is_recording = False
+        self.record_btn.config(text="开始录制")
+        self.play_btn.config(state="normal")
+        steps = self.recorder.to_steps()
+        if not steps:
+            self.set_status("没有录制到动作")
+            return
+        self.script_steps.extend(steps)
+        self.update_steps_display()
+        self.set_status(f"录制完成，添加了 {len(steps)} 个步骤")
+    
+    def read_interval_plan(self):
+        """根据间隔设置创建计划，参数无效时抛出 ValueError"""
+        start_x = int(self.start_x.get())
+        start_y = int(self.start_y.get())
+        play_x = int(self.play_x.get())
+        play_y = int(self.play_y.get())
+        interval_x = int(self.interval_x.get()) if self.interval_x.get() else 0
+        interval_y = int(self.interval_y.get()) if self.interval_y.get() else 0
+        course_count = int(self.course_count.get())
+        video_duration = float(self.video_duration.get())
+        # 设置了检测区域时，检测到视频结束即进入下一步，视频时长作为超时时间
+        video_region = self.parse_region(self.video_region.get())
+        
+        # 网格和翻页，留空表示单行、不翻页
+        page_size = int(self.page_size.get()) if self.page_size.get() else 0
+        grid = {
+            "columns": int(self.columns.get()) if self.columns.get() else 0,
+            "row_x": int(self.row_x.get()) if self.row_x.get() else 0,
+            "row_y": int(self.row_y.get()) if self.row_y.get() else 0,
+            "page_size": page_size,
+        }
+        if page_size:
+            grid.update(page_action=PAGE_ACTIONS[self.page_action.get()],
+                        page_x=int(self.page_x.get()), page_y=int(self.page_y.get()),
+                        page_scroll=int(self.page_scroll.get()) if self.page_scroll.get() else DEFAULT_SCROLL,
+                        page_wait=float(self.page_wait.get()) if self.page_wait.get() else 2)
+        
+        # 选择视频后等待2秒加载，设置了检测点时检测到页面就绪即进入下一步
+        plan = IntervalPlan(start_x, start_y, play_x, play_y, interval_x, interval_y,
+                            course_count, video_duration, load_wait=2, video_region=video_region,
+                            ready_probes=self.parse_probes(self.ready_probes.get()), **grid)
+        
+        # 已记录实际时长的课程按 时长 + 余量 等待，其余使用视频时长
+        if self.duration_store is not None:
+            margin = float(self.duration_margin.get()) if self.duration_margin.get() else MARGIN_SECONDS
+            try:
+                plan.durations = self.duration_store.plan_durations(plan, margin) or None
+            except sqlite3.Error as e:
+                self.set_status(f"读取课程时长记录失败: {e}")
+        return plan
     
     def generate_interval_steps(self):
         """生成间隔步骤：奇数序号选择视频，偶数序号播放"""
         try:
-            start_x = int(self.start_x.get())
-            start_y = int(self.start_y.get())
-            play_x = int(self.play_x.get())
-            play_y = int(self.play_y.get())
-            interval_x = int(self.interval_x.get()) if self.interval_x.get() else 0
-            interval_y = int(self.interval_y.get()) if self.interval_y.get() else 0
-            course_count = int(self.course_count.get())
-            video_duration = float(self.video_duration.get())
-            
-            if course_count <= 0:
+            if int(self.course_count.get()) <= 0:
                 messagebox.showerror("错误", "课程数量必须大于0")
                 return
-            
-            # 清除现有步骤
-            if messagebox.askyesno("确认", "是否清除现有步骤并生成新的间隔步骤？"):
-                self.script_steps.clear()
-            
-            # 生成间隔步骤
-            for i in range(course_count):
-                # 计算当前课程的位置
-                course_x = start_x + (interval_x * i)
-                course_y = start_y + (interval_y * i)
-                
-                # 奇数序号：选择视频
-                select_step = {
-                    "type": "点击",
-                    "x": course_x,
-                    "y": course_y,
-                    "wait": 2,  # 选择后等待2秒加载
-                    "desc": f"选择视频{i+1}"
-                }
-                self.script_steps.append(select_step)
-                
-                # 偶数序号：播放视频
-                play_step = {
-                    "type": "点击",
-                    "x": play_x,
-                    "y": play_y,
-                    "wait": video_duration,  # 播放等待时间
-                    "desc": f"播放视频{i+1}"
-                }
-                self.script_steps.append(play_step)
-            
-            self.update_steps_display()
-            total_steps = len(self.script_steps)
-            self.set_status(f"已生成 {total_steps} 个步骤 ({course_count}个课程)")
-            
-        except ValueError as e:
+            plan = self.read_interval_plan()
+        except ValueError:
             messagebox.showerror("错误", "请输入有效的数字参数")
+            return
+        
+        # 清除现有步骤
+        if messagebox.askyesno("确认", "是否清除现有步骤并生成新的间隔步骤？"):
+            self.script_steps.clear()
+        
+        # 计划按需生成步骤，不展开成列表
+        self.script_steps.extend(plan)
+        
+        self.update_steps_display()
+        total_steps = len(self.script_steps)
+        learned = len(plan.durations) if plan.durations else 0
+        self.set_status(f"已生成 {total_steps} 个步骤 ({plan.course_count}个课程，{plan.pages}页，"
+                        f"{learned}个使用记录的时长)")
+    
+    def parse_region(self, text):
+        """解析 "X,Y,宽,高" 格式的区域，空字符串返回 None"""
+        text = text.strip()
+        if not text:
+            return None
+        parts = [int(v) for v in text.replace("，", ",").split(",")]
+        if len(parts) != 4 or parts[2] <= 0 or parts[3] <= 0:
+            raise ValueError(f"无效的区域: {text}")
+        return parts
     
     def preview_interval_positions(self):
         """预览间隔位置和步骤"""
         try:
-            start_x = int(self.start_x.get())
-            start_y = int(self.start_y.get())
-            play_x = int(self.play_x.get())
-            play_y = int(self.play_y.get())
-            interval_x = int(self.interval_x.get()) if self.interval_x.get() else 0
-            interval_y = int(self.interval_y.get()) if self.interval_y.get() else 0
-            course_count = int(self.course_count.get())
-            video_duration = float(self.video_duration.get())
-            
-            preview_window = tk.Toplevel(self.root)
-            preview_window.title("步骤预览")
-            preview_window.geometry("500x600")
-            
-            text_widget = scrolledtext.ScrolledText(preview_window, width=60, height=35)
-            text_widget.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
-            
-            preview_text = f"步骤预览 (共{course_count}个课程):\n{'='*50}\n\n"
-            preview_text += f"播放按钮位置: ({play_x}, {play_y})\n"
-            preview_text += f"视频时长: {video_duration}秒\n\n"
-            
-            step_number = 1
-            for i in range(course_count):
-                course_x = start_x + (interval_x * i)
-                course_y = start_y + (interval_y * i)
-                
-                # 选择步骤
-                preview_text += f"步骤{step_number}: 选择视频{i+1}\n"
-                preview_text += f"   位置: ({course_x}, {course_y})\n"
-                # preview_text += f"   等待: 2秒\n\n"
-                step_number += 1
-                
-                # 播放步骤
-                preview_text += f"步骤{step_number}: 播放视频{i+1}\n"
-                preview_text += f"   位置: ({play_x}, {play_y})\n"
-                preview_text += f"   等待: {video_duration}秒\n\n"
-                step_number += 1
-            
-            total_time = (video_duration + 2) * course_count
-            preview_text += f"{'='*50}\n"
-            preview_text += f"总步骤数: {step_number-1}\n"
-            preview_text += f"预计总时间: {total_time/60:.1f}分钟\n"
-            
-            text_widget.insert(tk.END, preview_text)
-            text_widget.config(state=tk.DISABLED)
-            
+            plan = self.read_interval_plan()
         except ValueError:
             messagebox.showerror("错误", "请输入有效的数字参数")
+            return
+        
+        preview_window = tk.Toplevel(self.root)
+        preview_window.title("步骤预览")
+        preview_window.geometry("500x600")
+        
+        text_widget = scrolledtext.ScrolledText(preview_window, width=60, height=35)
+        text_widget.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+        
+        course_count = plan.course_count
+        video_duration = plan.video_duration
+        lines = [f"步骤预览 (共{course_count}个课程，{plan.pages}页):\n{'='*50}\n\n",
+                 f"播放按钮位置: ({plan.play_x}, {plan.play_y})\n",
+                 f"视频时长: {video_duration}秒\n\n"]
+        
+        # 课程很多时只列出前面的部分
+        shown = 0
+        for n in range(len(plan)):
+            course = plan.course_of(n)
+            if course is not None and course >= PREVIEW_COURSE_LIMIT:
+                break
+            step = plan.step(n)
+            lines.append(f"步骤{n+1}: {step['desc']}\n")
+            lines.append(f"   位置: ({step['x']}, {step['y']})\n")
+            lines.append(f"   等待: {step['wait']}秒\n\n")
+            if course is not None:
+                shown = course + 1
+        if shown < course_count:
+            lines.append(f"... 省略其余 {course_count - shown} 个课程\n\n")
+        
+        lines.append(f"{'='*50}\n")
+        lines.append(f"总步骤数: {len(plan)}\n")
+        lines.extend(self.estimate_lines(plan))
+        
+        text_widget.insert(tk.END, "".join(lines))
+        text_widget.config(state=tk.DISABLED)
+    
+    def estimate_lines(self, plan):
+        """用虚拟时钟模拟执行，给出计划本身和加入脚本后的预计用时(含抖动、循环次数和间隔)"""
+        try:
+            loop_count = int(self.loop_count.get())
+            loop_interval = float(self.loop_interval.get())
+        except ValueError:
+            loop_count, loop_interval = 1, 0
+        
+        single = simulate(plan)
+        lines = [f"预计单次用时: {format_duration(single.total)}\n"]
+        
+        combined = Script()
+        combined.extend(self.script_steps)
+        combined.extend(plan)
+        result = simulate(combined, loop_count, loop_interval)
+        lines.append(f"加入脚本后预计总时间({loop_count}次循环): {format_duration(result.total)}\n")
+        for phase, seconds in sorted(result.phases.items(), key=lambda item: -item[1]):
+            if seconds > 0:
+                lines.append(f"   {PHASE_NAMES.get(phase, phase)}: {format_duration(seconds)}\n")
+        return lines
     
     def test_current_step(self):
         """测试当前选中的步骤"""
-        selection = self.steps_tree.selection()
-        if selection:
-            index = int(selection[0]) - 1
+        index = self.steps_view.selected_index()
+        if index is not None:
             if 0 <= index < len(self.script_steps):
                 step = self.script_steps[index]
                 self.set_status(f"测试步骤: {step['desc']}")
@@ -358,6 +627,16 @@ class VideoCourseAutomator:
                 elif step["type"] == "移动":
                     pyautogui.moveTo(step["x"], step["y"])
                     self.set_status(f"已测试移动: ({step['x']}, {step['y']})")
+                elif step["type"] == STEP_SCROLL:
+                    pyautogui.scroll(step["clicks"], x=step["x"], y=step["y"])
+                    self.set_status(f"已测试滚动: ({step['x']}, {step['y']}) {step['clicks']}格")
+                elif step["type"] == STEP_CLICK_IMAGE:
+                    pos = self.runner.locator.locate(step["template"])
+                    if pos is None:
+                        self.set_status(f"未找到图像: {step['template']}")
+                    else:
+                        pyautogui.click(*pos)
+                        self.set_status(f"已测试点击图像: {pos}")
         else:
             messagebox.showwarning("警告", "请先选择一个步骤进行测试")
     
@@ -377,15 +656,32 @@ class VideoCourseAutomator:
                 "wait": wait_time,
                 "desc": description
             }
+            if step_type == STEP_CLICK_IMAGE:
+                step["template"] = self.ask_template()
+                if not step["template"]:
+                    return
+            elif step_type == STEP_SCROLL:
+                step["clicks"] = int(self.page_scroll.get()) if self.page_scroll.get() else DEFAULT_SCROLL
             
             self.script_steps.append(step)
-            self.update_steps_display()
+            index = len(self.script_steps) - 1
+            self.steps_view.step_inserted(index)
+            self.steps_view.see(index)
             self.clear_inputs()
             self.set_status(f"已添加步骤: {description}")
             
         except ValueError:
             messagebox.showerror("错误", "请输入有效的数字")
     
+    def ask_template(self):
+        """选择按钮模板图片"""
+        from tkinter import filedialog
+        
+        return filedialog.askopenfilename(
+            title="选择按钮图片",
+            filetypes=[("图片文件", "*.png *.bmp *.jpg"), ("所有文件", "*.*")]
+        )
+    
     def clear_inputs(self):
         """清空输入框"""
         self.x_entry.delete(0, tk.END)
@@ -396,9 +692,8 @@ class VideoCourseAutomator:
     
     def modify_step(self):
         """修改选中的步骤"""
-        selection = self.steps_tree.selection()
-        if selection:
-            index = int(selection[0]) - 1
+        index = self.steps_view.selected_index()
+        if index is not None:
             if 0 <= index < len(self.script_steps):
                 try:
                     step_type = self.step_type.get()
@@ -406,14 +701,22 @@ class VideoCourseAutomator:
                     y = int(self.y_entry.get()) if self.y_entry.get() else 0
                     wait_time = float(self.wait_entry.get()) if self.wait_entry.get() else 0
                     description = self.desc_entry.get()
-                    self.script_steps[index] = {
+                    step = {
                         "type": step_type,
                         "x": x,
                         "y": y,
                         "wait": wait_time,
                         "desc": description
                     }
-                    self.update_steps_display()
+                    if step_type == STEP_CLICK_IMAGE:
+                        # 原来就是图像步骤时沿用模板，否则重新选择
+                        step["template"] = self.script_steps[index].get("template") or self.ask_template()
+                        if not step["template"]:
+                            return
+                    elif step_type == STEP_SCROLL:
+                        step["clicks"] = self.script_steps[index].get("clicks", DEFAULT_SCROLL)
+                    self.script_steps[index] = step
+                    self.steps_view.step_updated(index)
                     self.set_status(f"已修改步骤: {description}")
                 except ValueError:
                     messagebox.showerror("错误", "请输入有效的数字")
@@ -422,26 +725,17 @@ class VideoCourseAutomator:
     
     def delete_step(self):
         """删除选中的步骤"""
-        selection = self.steps_tree.selection()
-        if selection:
-            index = int(selection[0]) - 1
+        index = self.steps_view.selected_index()
+        if index is not None:
             self.script_steps.pop(index)
-            self.update_steps_display()
+            self.steps_view.step_removed(index)
             self.set_status("已删除选中步骤")
         else:
             messagebox.showwarning("警告", "请先选择一个步骤")
     
     def update_steps_display(self):
-        """更新步骤列表显示"""
-        # 清空现有显示
-        for item in self.steps_tree.get_children():
-            self.steps_tree.delete(item)
-        
-        # 添加所有步骤
-        for i, step in enumerate(self.script_steps, 1):
-            self.steps_tree.insert("", "end", values=(
-                i, step["type"], step["x"], step["y"], step["wait"], step["desc"]
-            ))
+        """脚本整体变化后重建步骤列表显示(单个步骤的增删改走增量更新)"""
+        self.steps_view.refresh()
     
     def execute_script(self):
         """执行脚本"""
@@ -460,13 +754,93 @@ class VideoCourseAutomator:
             messagebox.showerror("错误", "请输入有效的循环设置")
             return
         
+        # 分辨率或参考窗口位置变化后，先把整个脚本换算到当前布局
+        if not self.fit_layout():
+            return
+        
+        # 有上次未完成的进度时询问是否继续
+        fingerprint = script_fingerprint(self.script_steps)
+        start_loop, start_index = self.ask_resume(fingerprint, loop_count)
+        try:
+            self.runner.journal = ProgressJournal(
+                journal_path(fingerprint), fingerprint, loop_count, len(self.script_steps),
+                resume=(start_loop, start_index) != (0, 0))
+        except OSError as e:
+            self.runner.journal = None
+            self.set_status(f"无法创建进度日志: {e}")
+        
+        # 每次执行的各阶段耗时，附带鼠标监控的轮询统计
+        self.runner.metrics = RunMetrics(
+            json_path=os.path.join(METRICS_DIR, "last_run.json"),
+            prom_path=os.path.join(METRICS_DIR, "autoplay.prom"),
+            export_interval=METRICS_EXPORT_INTERVAL,
+            gauges=self.metrics_gauges)
+        
+        self.is_playing = True
+        self.play_btn.config(state="disabled")
+        self.mouse_monitor.suspend("playing")
+        
         # 在后台线程中执行
         self.play_thread = threading.Thread(
             target=self.run_script, 
-            args=(loop_count, loop_interval)
+            args=(loop_count, loop_interval, start_loop, start_index)
         )
         self.play_thread.daemon = True
         self.play_thread.start()
+    
+    def fit_layout(self):
+        """把脚本坐标换算到当前显示布局，布局没有变化时不做任何换算；出错时返回 False"""
+        try:
+            self.display.refresh()
+            if self.display.fit(self.script_steps):
+                self.update_steps_display()
+                self.set_status(f"坐标已换算到当前屏幕区域 {self.script_steps.reference.frame}")
+        except LayoutError as e:
+            messagebox.showerror("错误", f"无法换算坐标: {e}")
+            return False
+        return True
+    
+    def set_reference(self):
+        """
+        保存前记录坐标参考区域：先把脚本换算到当前布局，
+        再以参考窗口当前的位置(或整个屏幕)作为参考，保留原来的缩放方式
+        找不到参考窗口时不阻止保存，返回警告信息，否则返回 None
+        """
+        self.display.refresh()
+        old = self.script_steps.reference
+        try:
+            self.display.fit(self.script_steps)
+        except LayoutError as e:
+            # 坐标仍然相对于原来的参考区域，原样保存
+            return f"无法换算坐标({e})，保留原来的参考区域"
+        title = self.reference_window.get().strip()
+        fit = old.fit if old is not None else FIT_STRETCH
+        warning = None
+        if title:
+            try:
+                self.script_steps.reference = self.display.reference(ANCHOR_WINDOW, title, fit)
+                return None
+            except LayoutError as e:
+                warning = f"{e}，已改为以整个屏幕为参考"
+        self.script_steps.reference = self.display.reference(ANCHOR_SCREEN, fit=fit)
+        return warning
+    
+    def metrics_gauges(self):
+        """导出计时统计时附带的鼠标监控统计"""
+        return {f"mouse_{key}": value for key, value in self.mouse_monitor.stats().items()}
+    
+    def ask_resume(self, fingerprint, loop_count):
+        """检查进度日志，返回开始执行的 (循环序号, 步骤序号)"""
+        progress = read_progress(journal_path(fingerprint), fingerprint)
+        if progress is None or not progress.completed or progress.next_loop >= loop_count:
+            return 0, 0
+        if messagebox.askyesno(
+                "恢复进度",
+                f"上次执行到第 {progress.next_loop + 1} 次循环的第 {progress.next_index + 1} 步，"
+                f"是否从这里继续？"):
+            return progress.next_loop, progress.next_index
+        return 0, 0
+    
     def move_with_jitter(self, x, y,duration =1.0, jitter=8):
         """
         鼠标移动到制定位置模拟人抖动操作，用于唤醒播放和选择视频按键
@@ -475,75 +849,105 @@ class VideoCourseAutomator:
         "param duration: 移动持续时间，默认为1.0秒
         "param jitter: 抖动幅度，默认为8像素
         """
-        start_time = time.time()
-        while time.time() - start_time < duration:
-            dx = random.randint(-jitter, jitter)
-            dy = random.randint(-jitter, jitter)
-            pyautogui.moveTo(x + dx, y + dy, duration=0.05)
-        # pyautogui.moveTo(x, y, duration=0.1) # 最后移动到目标位置
-        time.sleep(0.5) 
-    def run_script(self, loop_count, loop_interval):
-        """运行脚本的主逻辑"""
-        self.is_playing = True
-        self.play_btn.config(state="disabled")
-        
+        self.runner.move_with_jitter(x, y, duration, jitter)
+    
+    def on_runner_event(self, kind, info):
+        """把执行引擎的进度事件显示到状态栏"""
+        if kind == "loop_start":
+            self.set_status(f"开始第 {info['loop'] + 1}/{info['loop_count']} 次循环")
+        elif kind == "step_start":
+            step = info["step"]
+            self.current_step_index = info["index"]
+            self.set_status(f"执行步骤 {info['index'] + 1}/{info['total']}: {step['desc']}")
+        elif kind == "step_end":
+            step = info["step"]
+            if step["type"] == STEP_CLICK:
+                self.set_status(f"点击位置 ({step['x']}, {step['y']})")
+            elif step["type"] == STEP_MOVE:
+                self.set_status(f"移动到 ({step['x']}, {step['y']})")
+        elif kind == "image_found":
+            self.set_status(f"找到图像，点击位置 ({info['x']}, {info['y']})")
+        elif kind == "video_end":
+            if info["result"] == "finished":
+                self.set_status(f"检测到视频结束，用时 {info['elapsed']:.0f} 秒")
+            elif info["result"] == "timeout":
+                self.set_status("未检测到视频结束，已达到视频时长")
+        elif kind == "incident":
+            action = INCIDENT_ACTIONS[info["action"]]
+            self.set_status(f"第 {info['index'] + 1} 步出现故障({info['detail']})，处理: {action}")
+        elif kind == "page_ready":
+            if info["result"] == "ready":
+                self.set_status(f"页面已就绪，用时 {info['elapsed']:.1f} 秒")
+            elif info["result"] == "timeout":
+                self.set_status("未检测到页面就绪，已达到最长等待时间")
+        elif kind == "loop_wait":
+            self.set_status(f"等待 {info['interval']} 秒后开始下一次循环")
+    
+    def on_ui_event(self, kind, info):
+        """在 Tk 线程中处理消息队列里的事件"""
+        if kind == "status":
+            self.set_status(info)
+        else:
+            self.on_runner_event(kind, info)
+    
+    def run_script(self, loop_count, loop_interval, start_loop=0, start_index=0):
+        """运行脚本的主逻辑(在工作线程中执行，只通过 ui_bus 更新界面)"""
+        finished = False
+        # 收集视频结束检测得到的实际时长，执行结束后写入记录
+        learner = None
+        if self.duration_store is not None:
+            learner = DurationLearner(self.script_steps, self.duration_store)
+            self.runner.on_event = learner.tap(self.ui_bus.post)
         try:
-            for loop in range(loop_count):
-                if not self.is_playing:
-                    break
-                
-                self.set_status(f"开始第 {loop + 1}/{loop_count} 次循环")
-                
-                for i, step in enumerate(self.script_steps):
-                    if not self.is_playing:
-                        break
-                    
-                    self.current_step_index = i
-                    self.set_status(f"执行步骤 {i + 1}/{len(self.script_steps)}: {step['desc']}")
-                    
-                    # 执行步骤
-                    if step["type"] == "点击":
-                        # 鼠标抖动
-                        self.move_with_jitter(step["x"], step["y"])
-                        # 点击
-                        pyautogui.click(step["x"], step["y"])
-                        self.set_status(f"点击位置 ({step['x']}, {step['y']})")
-                    elif step["type"] == "移动":
-                        # 鼠标抖动
-                        self.move_with_jitter(step["x"], step["y"])
-                        pyautogui.moveTo(step["x"], step["y"])
-                        self.set_status(f"移动到 ({step['x']}, {step['y']})")
-                    
-                    # 等待指定时间
-                    if step["wait"] > 0:
-                        wait_remaining = step["wait"]
-                        while wait_remaining > 0 and self.is_playing:
-                            time.sleep(0.1)
-                            wait_remaining -= 0.1
-                
-                # 循环间隔（除了最后一次）
-                if loop < loop_count - 1 and self.is_playing:
-                    self.set_status(f"等待 {loop_interval} 秒后开始下一次循环")
-                    time.sleep(loop_interval)
-            
-            self.set_status("脚本执行完成")
+            self.supervisor.run(self.script_steps, loop_count, loop_interval, start_loop, start_index)
+            finished = not self.runner.stopped
+            if self.runner.stopped:
+                self.ui_bus.post("status", "脚本执行已停止")
+            else:
+                self.ui_bus.post("status", "脚本执行完成")
             
         except Exception as e:
-            self.set_status(f"执行出错: {str(e)}")
-            messagebox.showerror("错误", f"执行过程中出现错误: {str(e)}")
+            self.ui_bus.post("status", f"执行出错: {str(e)}")
+            self.ui_bus.call(messagebox.showerror, "错误", f"执行过程中出现错误: {str(e)}")
         
         finally:
+            if learner is not None:
+                self.runner.on_event = self.ui_bus.post
+                try:
+                    learner.save()
+                except sqlite3.Error as e:
+                    self.ui_bus.post("status", f"保存课程时长记录失败: {e}")
+            # 执行完毕删除进度日志，停止或出错时保留以便恢复
+            if self.runner.journal is not None:
+                self.runner.journal.close(finished)
+                self.runner.journal = None
             self.is_playing = False
-            self.root.after(0, self.enable_buttons)
+            self.ui_bus.call(self.enable_buttons)
     
     def stop_script(self):
         """停止脚本执行"""
         self.is_playing = False
+        self.supervisor.stop()
         self.set_status("脚本执行已停止")
     
+    def toggle_pause(self):
+        """暂停或继续脚本执行"""
+        if not self.is_playing:
+            return
+        if self.runner.paused:
+            self.runner.resume()
+            self.pause_btn.config(text="暂停")
+            self.set_status("脚本继续执行")
+        else:
+            self.runner.pause()
+            self.pause_btn.config(text="继续")
+            self.set_status("脚本已暂停")
+    
     def enable_buttons(self):
         """重新启用按钮"""
         self.play_btn.config(state="normal")
+        self.pause_btn.config(text="暂停")
+        self.mouse_monitor.resume("playing")
     
     def clear_script(self):
         """清除所有步骤"""
@@ -553,31 +957,56 @@ class VideoCourseAutomator:
             self.set_status("已清除所有步骤")
     
     def save_script(self):
-        """保存脚本到文件"""
+        """保存脚本到文件(json / jsonl / aps 按扩展名选择格式)"""
+        from tkinter import filedialog
+        
         if not self.script_steps:
             messagebox.showwarning("警告", "没有可保存的步骤")
             return
         
-        filename = f"video_course_script_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        filename = filedialog.asksaveasfilename(
+            title="保存脚本",
+            initialfile=f"video_course_script_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            defaultextension=".json",
+            filetypes=SCRIPT_FILETYPES
+        )
+        if not filename:
+            return
+        
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'timestamp': datetime.now().isoformat(),
-                    'settings': {
-                        'start_x': self.start_x.get(),
-                        'start_y': self.start_y.get(),
-                        'play_x': self.play_x.get(),
-                        'play_y': self.play_y.get(),
-                        'interval_x': self.interval_x.get(),
-                        'interval_y': self.interval_y.get(),
-                        'course_count': self.course_count.get(),
-                        'video_duration': self.video_duration.get()
-                    },
-                    'steps': self.script_steps
-                }, f, indent=2, ensure_ascii=False)
+            settings = {
+                'start_x': self.start_x.get(),
+                'start_y': self.start_y.get(),
+                'play_x': self.play_x.get(),
+                'play_y': self.play_y.get(),
+                'interval_x': self.interval_x.get(),
+                'interval_y': self.interval_y.get(),
+                'course_count': self.course_count.get(),
+                'video_duration': self.video_duration.get(),
+                'video_region': self.video_region.get(),
+                'columns': self.columns.get(),
+                'row_x': self.row_x.get(),
+                'row_y': self.row_y.get(),
+                'page_size': self.page_size.get(),
+                'page_action': self.page_action.get(),
+                'page_x': self.page_x.get(),
+                'page_y': self.page_y.get(),
+                'page_scroll': self.page_scroll.get(),
+                'page_wait': self.page_wait.get(),
+                'ready_probes': self.ready_probes.get(),
+                'reference_window': self.reference_window.get()
+            }
+            # 记录参考区域，在其他分辨率或窗口位置下加载时换算坐标
+            warning = self.set_reference()
+            # 流式写入临时文件后原子替换，保存失败不会损坏原文件
+            scriptio.save(filename, self.script_steps, settings)
             
-            self.set_status(f"脚本已保存到: {filename}")
-            messagebox.showinfo("成功", f"脚本已保存到: {filename}")
+            if warning:
+                self.set_status(f"脚本已保存到: {filename}，{warning}")
+                messagebox.showwarning("注意", f"脚本已保存到: {filename}\n{warning}")
+            else:
+                self.set_status(f"脚本已保存到: {filename}")
+                messagebox.showinfo("成功", f"脚本已保存到: {filename}")
             
         except Exception as e:
             messagebox.showerror("错误", f"保存失败: {str(e)}")
@@ -588,26 +1017,39 @@ class VideoCourseAutomator:
         
         filename = filedialog.askopenfilename(
             title="选择脚本文件",
-            filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")]
+            filetypes=SCRIPT_FILETYPES
         )
         
         if filename:
             try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                self.script_steps = data.get('steps', [])
-                settings = data.get('settings', {})
+                steps, settings = scriptio.load(filename)
+                # 按录制时的参考区域把坐标换算到当前屏幕；找不到参考窗口时仍然加载(坐标不换算)，便于编辑
+                warning = None
+                self.display.refresh()
+                try:
+                    self.display.fit(steps)
+                except LayoutError as e:
+                    warning = f"坐标未换算: {e}"
+                self.script_steps = steps
                 
                 # 恢复设置
                 for key, value in settings.items():
-                    if hasattr(self, key):
-                        getattr(self, key).delete(0, tk.END)
-                        getattr(self, key).insert(0, str(value))
+                    if not hasattr(self, key):
+                        continue
+                    widget = getattr(self, key)
+                    if isinstance(widget, ttk.Combobox) and str(widget.cget("state")) == "readonly":
+                        widget.set(str(value))
+                    else:
+                        widget.delete(0, tk.END)
+                        widget.insert(0, str(value))
                 
                 self.update_steps_display()
-                self.set_status(f"已加载脚本: {filename}")
-                messagebox.showinfo("成功", f"已加载 {len(self.script_steps)} 个步骤")
+                if warning:
+                    self.set_status(f"已加载脚本: {filename}，{warning}")
+                    messagebox.showwarning("注意", f"已加载 {len(self.script_steps)} 个步骤\n{warning}")
+                else:
+                    self.set_status(f"已加载脚本: {filename}")
+                    messagebox.showinfo("成功", f"已加载 {len(self.script_steps)} 个步骤")
                 
             except Exception as e:
                 messagebox.showerror("错误", f"加载失败: {str(e)}")
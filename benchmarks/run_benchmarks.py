@@ -0,0 +1,341 @@
+"""
+Description: Headless benchmark suite for AutoPlay.
+Covers interval plan generation (10^2..10^6 courses), script editing, step list refresh (when a Tk display,
+real or virtual, is available), save/load round trips, per-step dispatch overhead with the null backend,
+scheduler wake-up accuracy, simulation speed and mapping a script to another display layout. Results are written as JSON and
+compared with a reference baseline (the best of several runs, ignoring differences below each metric's noise floor):
+    python benchmarks/run_benchmarks.py --output results.json --baseline benchmarks/baseline.json
+Regressions only change the exit status with --fail-on-regression, since a baseline recorded on another machine is a reference,
+not a pass/fail threshold.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+
+# 从仓库根目录导入模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from plan import IntervalPlan, Script, iter_from
+from engine import StepRunner, NullBackend
+from scheduler import DeadlineScheduler
+from simulate import simulate
+from layout import Display, DisplayLayout, Frame, Reference
+import scriptio
+
+# 所有指标都是越小越好
+BENCHMARKS = []
+
+# 每种单位的噪声下限：与基线相差不到这个值的结果不算退化(毫秒以下的计时主要是噪声)
+NOISE_FLOORS = {"s": 5e-3, "ms": 0.5, "us/step": 0.5}
+
+
+def benchmark(func):
+    BENCHMARKS.append(func)
+    return func
+
+
+def measure(func, repeat=7):
+    """执行 repeat 次，返回每次耗时(秒)"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def result(name, times, unit="s", scale=1.0, floor=None, **extra):
+    """floor 为该指标的噪声下限(与 value 同单位)，默认按单位取 NOISE_FLOORS"""
+    values = [t * scale for t in times]
+    data = {"name": name, "unit": unit, "value": statistics.median(values), "min": min(values),
+            "runs": len(values), "floor": NOISE_FLOORS.get(unit, 0.0) if floor is None else floor}
+    data.update(extra)
+    return data
+
+
+def make_plan(courses):
+    return IntervalPlan(100, 200, 800, 600, 0, 40, courses, 300, 2)
+
+
+def hand_steps(n):
+    return [{"type": "点击", "x": i % 1920, "y": i % 1080, "wait": 1.0, "desc": f"步骤{i + 1}"}
+            for i in range(n)]
+
+
+@benchmark
+def bench_generate(quick):
+    """等价于 generate_interval_steps：创建计划并加入脚本，访问首尾步骤"""
+    sizes = (10 ** 2, 10 ** 4) if quick else (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+    results = []
+    for courses in sizes:
+        def run():
+            script = Script()
+            script.extend(make_plan(courses))
+            script[0]
+            script[len(script) - 1]
+        results.append(result(f"generate_{courses}", measure(run)))
+
+    # 分页网格：每行10个、每页40个课程
+    courses = sizes[-1]
+
+    def run_grid():
+        script = Script()
+        script.extend(IntervalPlan(100, 200, 800, 600, 150, 0, courses, 300, 2,
+                                   columns=10, row_y=120, page_size=40, page_x=960, page_y=540))
+        script[0]
+        script[len(script) - 1]
+    results.append(result(f"generate_grid_{courses}", measure(run_grid)))
+    return results
+
+
+@benchmark
+def bench_iterate(quick):
+    """从中间开始顺序遍历一个生成的脚本(与 StepRunner.run 相同的访问方式)"""
+    courses = 10 ** 4 if quick else 10 ** 5
+    script = Script()
+    script.extend(make_plan(courses))
+    start = len(script) // 2
+    count = len(script) - start
+
+    def run():
+        for _ in iter_from(script, start):
+            pass
+    return [result(f"iterate_{courses}", measure(run), "us/step", 1e6 / count)]
+
+
+@benchmark
+def bench_edit(quick):
+    """在大脚本中间修改、插入、删除步骤"""
+    courses = 10 ** 4 if quick else 10 ** 6
+    step = {"type": "移动", "x": 1, "y": 2, "wait": 0.5, "desc": "编辑"}
+
+    def run():
+        script = Script()
+        script.extend(make_plan(courses))
+        middle = len(script) // 2
+        for i in range(100):
+            script[middle + i * 7] = step
+            script.insert(middle + i * 5, step)
+            script.pop(middle + i * 3)
+    # 每次都要重新创建百万课程的脚本，不同进程之间相差可达数毫秒
+    return [result(f"edit_{courses}", measure(run), floor=0.01)]
+
+
+@benchmark
+def bench_steplist(quick):
+    """步骤列表刷新，需要 Tk 显示(可用 Xvfb 提供虚拟显示)"""
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+        root = tk.Tk()
+    except Exception as e:
+        return [{"name": "steplist_refresh", "skipped": f"没有可用的 Tk 显示: {e}"}]
+
+    from steplist import StepListView
+    try:
+        root.withdraw()
+        tree = ttk.Treeview(root, columns=("序号", "类型", "X", "Y", "等待时间", "描述"),
+                            show="headings", height=10)
+        scrollbar = ttk.Scrollbar(root, orient=tk.VERTICAL, command=tree.yview)
+        holder = {}
+        view = StepListView(tree, scrollbar, lambda: holder["steps"])
+        results = []
+        sizes = (10 ** 2, 10 ** 4) if quick else (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 6)
+        for courses in sizes:
+            script = Script()
+            script.extend(make_plan(courses))
+            holder["steps"] = script
+
+            def run():
+                view.refresh()
+                root.update_idletasks()
+            results.append(result(f"steplist_refresh_{courses}", measure(run, 3)))
+        return results
+    finally:
+        root.destroy()
+
+
+@benchmark
+def bench_persistence(quick):
+    """三种格式的保存/加载往返"""
+    count = 10 ** 3 if quick else 10 ** 4
+    script = Script()
+    script.extend(hand_steps(count))
+    # json 格式会展开计划，规模与其他格式相同才有可比性
+    script.extend(make_plan(10 ** 4 if quick else 10 ** 5))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in (scriptio.FORMAT_JSON, scriptio.FORMAT_JSONL, scriptio.FORMAT_BINARY):
+            path = os.path.join(tmp, "script." + fmt)
+
+            def run():
+                scriptio.save(path, script, {"loop": 1})
+                loaded, _ = scriptio.load(path)
+                assert len(loaded) == len(script)
+            times = measure(run)
+            # 包含文件读写，受磁盘缓存影响
+            results.append(result(f"roundtrip_{fmt}", times, floor=0.05, size_bytes=os.path.getsize(path)))
+    return results
+
+
+@benchmark
+def bench_dispatch(quick):
+    """空操作后端下每个步骤的调度开销"""
+    steps = Script()
+    steps.extend(hand_steps(10 ** 4 if quick else 10 ** 5))
+    runner = StepRunner(NullBackend(), jitter_duration=0, time_scale=0)
+    times = measure(lambda: runner.run(steps))
+    # 整体只有零点几秒，受 CPU 调频和其他进程影响较大
+    return [result("dispatch", times, "us/step", 1e6 / len(steps), floor=1.0)]
+
+
+@benchmark
+def bench_scheduler(quick):
+    """调度器唤醒精度：每次等待醒来比截止时间晚多少"""
+    scheduler = DeadlineScheduler()
+    lateness = []
+    for _ in range(50 if quick else 200):
+        scheduler.wait(0.005)
+        lateness.append(scheduler.lateness)
+    lateness.sort()
+    return [
+        result("scheduler_lateness_median", [statistics.median(lateness)], "ms", 1e3),
+        # 尾部延迟取决于系统调度，只有明显变差才有意义
+        result("scheduler_lateness_p99", [lateness[int(len(lateness) * 0.99) - 1]], "ms", 1e3, floor=5.0),
+    ]
+
+
+@benchmark
+def bench_simulate(quick):
+    """虚拟时钟模拟 1000 次循环、100 个课程的脚本"""
+    script = Script()
+    script.extend(make_plan(100))
+    simulate(script, 2)
+    return [result("simulate_1000x100", measure(lambda: simulate(script, 1000, 60)))]
+
+
+@benchmark
+def bench_layout(quick):
+    """把 1920x1080 上录制的脚本(手工步骤 + 生成的计划)换算到 1280x720"""
+    count = 10 ** 4 if quick else 10 ** 6
+    steps = hand_steps(count)
+    screen = Frame(0, 0, 1280, 720)
+    display = Display(DisplayLayout(screen, screen))
+
+    def run():
+        script = Script()
+        script.extend(steps)
+        script.extend(make_plan(count))
+        script.reference = Reference(Frame(0, 0, 1920, 1080))
+        start = time.perf_counter()
+        display.fit(script)
+        return time.perf_counter() - start
+    times = [run() for _ in range(5)]
+    return [result(f"layout_fit_{count}", times)]
+
+
+def run_all(quick=False, only=None):
+    results = []
+    for func in BENCHMARKS:
+        name = func.__name__[len("bench_"):]
+        if only and name not in only:
+            continue
+        print(f"运行 {name} ...", file=sys.stderr)
+        results.extend(func(quick))
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    按多次运行中的最好成绩(min)与基线比较，返回 (比较结果列表, 是否有退化)
+    慢了超过 tolerance 且差值超过该单位的噪声下限才算退化；
+    基线中有、本次没有测量的指标(如没有显示时的步骤列表刷新)标记为未比较
+    """
+    current = {r["name"]: r for r in report["results"]}
+    rows = []
+    regressed = False
+    for old in baseline.get("results", []):
+        if "min" not in old:
+            if "skipped" in old:
+                rows.append({"name": old["name"], "baseline": None, "value": None, "ratio": None,
+                             "regressed": False, "skipped": f"基线中未测量({old['skipped']})"})
+            continue
+        r = current.get(old["name"])
+        if r is None or "min" not in r:
+            reason = r["skipped"] if r is not None and "skipped" in r else "本次未运行"
+            rows.append({"name": old["name"], "baseline": old["min"], "value": None, "ratio": None,
+                         "regressed": False, "skipped": reason})
+            continue
+        floor = r.get("floor", NOISE_FLOORS.get(r["unit"], 0.0))
+        ratio = r["min"] / old["min"] if old["min"] else None
+        slower = ratio is not None and ratio > 1 + tolerance and r["min"] - old["min"] > floor
+        regressed |= slower
+        row = {"name": r["name"], "baseline": old["min"], "value": r["min"], "ratio": ratio, "regressed": slower}
+        if max(r["min"], old["min"]) < floor:
+            row["below_floor"] = True
+        rows.append(row)
+    return rows, regressed
+
+
+def format_row(row):
+    if "skipped" in row:
+        baseline = "-" if row["baseline"] is None else f"{row['baseline']:.6g}"
+        return f"{row['name']:<32} {baseline:>12} -> {'-':>12} 未比较: {row['skipped']}"
+    if row["regressed"]:
+        mark = "退化"
+    elif row.get("below_floor"):
+        mark = "低于噪声下限"
+    else:
+        mark = "正常"
+    ratio = f"x{row['ratio']:.2f}" if row["ratio"] is not None else "-"
+    return f"{row['name']:<32} {row['baseline']:>12.6g} -> {row['value']:>12.6g} {ratio} {mark}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AutoPlay 性能基准测试")
+    parser.add_argument("--output", help="结果 JSON 文件路径(默认打印到标准输出)")
+    parser.add_argument("--baseline", help="用于比较的参考基线 JSON 文件(如 benchmarks/baseline.json)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许比基线慢的比例")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="有退化时以状态 1 退出(只在与同一台机器上记录的基线比较时使用)")
+    parser.add_argument("--quick", action="store_true", help="使用较小的规模快速运行")
+    parser.add_argument("--only", nargs="+", help="只运行指定的基准，例如 generate dispatch")
+    args = parser.parse_args(argv)
+    if args.baseline and not os.path.exists(args.baseline):
+        # 给出的基线不存在时不能悄悄跳过比较
+        print(f"找不到基线文件: {args.baseline}", file=sys.stderr)
+        return 2
+
+    report = run_all(args.quick, args.only)
+    regressed = False
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"], regressed = compare(report, baseline, args.tolerance)
+        for row in report["comparison"]:
+            print(format_row(row), file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 1 if regressed and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+Description: Frame sources for visual checks.
+A frame source returns a region of the screen as a NumPy array of shape (height, width, 3), uint8 RGB.
+The screen source uses pyautogui; the recorded source replays frames from memory or an .npz file so
+visual checks can be tested without a display.
+"""
+
+import time
+import threading
+
+import numpy as np
+
+
+def normalize_region(region):
+    """把 (left, top, width, height) 规范成整数元组"""
+    left, top, width, height = (int(v) for v in region)
+    if width <= 0 or height <= 0:
+        raise ValueError(f"无效的区域: {region}")
+    return left, top, width, height
+
+
+class FrameSource:
+    """帧来源接口"""
+
+    def grab(self, region):
+        """截取 region=(left, top, width, height)，返回 (h, w, 3) 的 uint8 数组"""
+        raise NotImplementedError
+
+    def size(self):
+        """屏幕尺寸 (width, height)"""
+        raise NotImplementedError
+
+    def grab_screen(self):
+        """截取整个屏幕"""
+        width, height = self.size()
+        return self.grab((0, 0, width, height))
+
+    def register(self, region):
+        """声明接下来会持续读取 region，返回用于注销的句柄"""
+        return region
+
+    def unregister(self, handle):
+        """取消 register 的声明"""
+
+
+class ScreenFrameSource(FrameSource):
+    """用 pyautogui 截取真实屏幕"""
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def grab(self, region):
+        image = self.pyautogui.screenshot(region=normalize_region(region))
+        return np.asarray(image.convert("RGB"))
+
+    def size(self):
+        width, height = self.pyautogui.size()
+        return width, height
+
+
+class RecordedFrameSource(FrameSource):
+    """
+    回放预先录制的帧
+    "param frames: 帧数组序列
+    "param loop: 播放完后是否从头开始，否则一直返回最后一帧
+    "param full_screen: 帧为整屏截图时按请求的区域裁剪，否则原样返回
+    """
+
+    def __init__(self, frames, loop=False, full_screen=False):
+        self.frames = [np.asarray(f, dtype=np.uint8) for f in frames]
+        if not self.frames:
+            raise ValueError("至少需要一帧")
+        self.loop = loop
+        self.full_screen = full_screen
+        self.index = 0
+
+    @classmethod
+    def load(cls, path, loop=False, full_screen=False):
+        """从 np.savez 保存的文件加载，按键名排序"""
+        with np.load(path) as data:
+            frames = [data[key] for key in sorted(data.files)]
+        return cls(frames, loop, full_screen)
+
+    def size(self):
+        height, width = self.frames[self.index].shape[:2]
+        return width, height
+
+    def grab(self, region):
+        frame = self.frames[self.index]
+        if self.index + 1 < len(self.frames):
+            self.index += 1
+        elif self.loop:
+            self.index = 0
+        if self.full_screen:
+            left, top, width, height = normalize_region(region)
+            return frame[top:top + height, left:left + width]
+        return frame
+
+
+def union_region(regions):
+    """多个区域的外接矩形"""
+    lefts, tops, rights, bottoms = [], [], [], []
+    for left, top, width, height in regions:
+        lefts.append(left)
+        tops.append(top)
+        rights.append(left + width)
+        bottoms.append(top + height)
+    left, top = min(lefts), min(tops)
+    return left, top, max(rights) - left, max(bottoms) - top
+
+
+def contains(outer, inner):
+    """outer 区域是否完整包含 inner 区域"""
+    return (outer[0] <= inner[0] and outer[1] <= inner[1]
+            and inner[0] + inner[2] <= outer[0] + outer[2]
+            and inner[1] + inner[3] <= outer[1] + outer[3])
+
+
+class FrameGrabber(FrameSource):
+    """
+    共享的后台截图线程
+    只截取所有已注册区域的外接矩形，结果写入预分配的环形缓冲区，读取方拿到的是缓冲区视图(不复制)
+    没有注册区域时线程自动挂起，不占用 CPU
+    注意：返回的视图在 capacity - 1 个采样周期后会被新帧覆盖
+    "param source: 实际截图的帧来源
+    "param rate: 每秒截图次数
+    "param capacity: 环形缓冲区保留的帧数
+    """
+
+    def __init__(self, source, rate=2.0, capacity=8):
+        if rate <= 0 or capacity < 2:
+            raise ValueError("截图频率必须大于0，缓冲区至少2帧")
+        self.source = source
+        self.rate = rate
+        self.capacity = capacity
+
+        self._cond = threading.Condition()
+        self._regions = {}
+        self._next_handle = 0
+        self._union = None
+        self._running = False
+        self._thread = None
+
+        # 环形缓冲区
+        self.buffer = None
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.frame_count = 0
+        self.buffer_region = None
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._loop, name="FrameGrabber", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def active(self):
+        """当前是否有读取方(没有时线程挂起)"""
+        return bool(self._regions)
+
+    # ---- 注册 ----
+
+    def register(self, region):
+        region = normalize_region(region)
+        with self._cond:
+            handle = self._next_handle
+            self._next_handle += 1
+            self._regions[handle] = region
+            self._union = union_region(self._regions.values())
+            self._cond.notify_all()
+        return handle
+
+    def unregister(self, handle):
+        with self._cond:
+            self._regions.pop(handle, None)
+            self._union = union_region(self._regions.values()) if self._regions else None
+
+    # ---- 读取 ----
+
+    def size(self):
+        return self.source.size()
+
+    def latest(self):
+        """最新一帧及其区域，尚无帧时返回 (None, None)"""
+        with self._cond:
+            if self.frame_count == 0:
+                return None, None
+            return self.buffer[(self.frame_count - 1) % self.capacity], self.buffer_region
+
+    def frames(self, count=None):
+        """按时间顺序返回最近 count 帧的视图列表"""
+        with self._cond:
+            available = min(self.frame_count, self.capacity)
+            if count is None or count > available:
+                count = available
+            start = self.frame_count - count
+            return [self.buffer[i % self.capacity] for i in range(start, self.frame_count)]
+
+    def grab(self, region, timeout=1.0):
+        """
+        返回 region 的最新画面
+        region 在缓冲区范围内时直接返回视图，否则(或等待首帧超时)直接截图
+        """
+        region = normalize_region(region)
+        with self._cond:
+            if self._running and self._union is not None and contains(self._union, region):
+                deadline = time.monotonic() + timeout
+                while self.buffer_region is None or not contains(self.buffer_region, region):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._running:
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    frame = self.buffer[(self.frame_count - 1) % self.capacity]
+                    left = region[0] - self.buffer_region[0]
+                    top = region[1] - self.buffer_region[1]
+                    return frame[top:top + region[3], left:left + region[2]]
+        return self.source.grab(region)
+
+    # ---- 截图线程 ----
+
+    def _ensure_buffer(self, region):
+        """外接矩形变化时重新分配缓冲区(只在注册变化时发生)"""
+        shape = (self.capacity, region[3], region[2], 3)
+        if self.buffer is None or self.buffer.shape != shape:
+            self.buffer = np.empty(shape, dtype=np.uint8)
+        # 旧帧属于别的区域，作废
+        self.frame_count = 0
+        self.buffer_region = region
+
+    def _loop(self):
+        interval = 1.0 / self.rate
+        next_time = time.monotonic()
+        while True:
+            with self._cond:
+                # 没有读取方时挂起，直到有人注册或停止
+                while self._running and self._union is None:
+                    self.buffer_region = None
+                    self._cond.wait()
+                    next_time = time.monotonic()
+                if not self._running:
+                    return
+                region = self._union
+
+            frame = self.source.grab(region)
+
+            with self._cond:
+                if region != self._union:
+                    # 截图期间注册发生变化，丢弃这一帧
+                    continue
+                if self.buffer_region != region:
+                    self._ensure_buffer(region)
+                slot = self.frame_count % self.capacity
+                np.copyto(self.buffer[slot], frame[:region[3], :region[2], :3])
+                self.timestamps[slot] = time.monotonic()
+                self.frame_count += 1
+                self._cond.notify_all()
+
+                # 按绝对时间安排下一次截图，落后太多时不追赶
+                next_time += interval
+                remaining = next_time - time.monotonic()
+                if remaining < 0:
+                    next_time = time.monotonic()
+                elif self._running:
+                    self._cond.wait(remaining)
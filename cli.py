@@ -0,0 +1,360 @@
+"""
+Description: Headless command line entry point for AutoPlay.
+Loads a saved script and runs it through the engine without creating a Tk root, e.g.
+    python cli.py run video_course_script.json --loops 3 --backend pyautogui
+Only the modules the chosen backend needs are imported (pyautogui/numpy stay unloaded for the null
+backend), and `python cli.py import-time` measures cold start so it stays low.
+"""
+
+import sys
+import argparse
+
+# 执行结果对应的退出码
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_STOPPED = 2
+EXIT_INTERRUPTED = 130
+
+# 冷启动时不应被导入的重量级模块
+HEAVY_MODULES = ("tkinter", "pyautogui", "numpy", "PIL")
+
+
+def print_event(kind, info):
+    """把执行进度打印到标准输出"""
+    if kind == "loop_start":
+        print(f"第 {info['loop'] + 1}/{info['loop_count']} 次循环")
+    elif kind == "step_start":
+        step = info["step"]
+        print(f"  步骤 {info['index'] + 1}/{info['total']}: {step['type']} ({step['x']}, {step['y']}) "
+              f"{step.get('desc', '')}")
+    elif kind == "loop_wait":
+        print(f"等待 {info['interval']} 秒后开始下一次循环")
+    elif kind == "video_end":
+        print(f"  视频结束检测: {info['result']} ({info['elapsed']:.1f} 秒)")
+    elif kind == "incident":
+        print(f"  故障: {info['detail']} (第 {info['index'] + 1} 步，处理: {info['action']})", file=sys.stderr)
+    elif kind == "page_ready":
+        print(f"  页面就绪检测: {info['result']} ({info['elapsed']:.2f} 秒，{info['samples']} 次)")
+
+
+def create_frame_source(backend_name):
+    """真实屏幕后端才需要截图(视频结束检测、图像点击)，其余后端不导入 numpy"""
+    if backend_name != "pyautogui":
+        return None
+    from capture import ScreenFrameSource, FrameGrabber
+    grabber = FrameGrabber(ScreenFrameSource())
+    grabber.start()
+    return grabber
+
+
+def run(args):
+    import scriptio
+    from engine import StepRunner, create_backend
+
+    steps, _ = scriptio.load(args.script, args.format)
+    if not steps:
+        print(f"脚本中没有步骤: {args.script}", file=sys.stderr)
+        return EXIT_ERROR
+
+    if args.screen or args.backend == "pyautogui":
+        # 把脚本坐标从录制时的屏幕/窗口换算到当前布局，整个脚本只换算一次
+        from layout import Display, Frame, Reference, LayoutError
+        try:
+            default = Reference(Frame.parse(args.reference)) if args.reference else None
+            display = Display.for_backend(args.backend, Frame.parse(args.screen) if args.screen else None)
+            source = steps.reference or default
+            if display.fit(steps, default) and not args.quiet:
+                print(f"坐标已从 {source.frame} 换算到 {steps.reference.frame}")
+        except (ValueError, LayoutError) as e:
+            print(f"无法换算坐标: {e}", file=sys.stderr)
+            return EXIT_ERROR
+
+    backend = create_backend(args.backend)
+    frame_source = create_frame_source(args.backend)
+    runner = StepRunner(backend, jitter_duration=0 if args.no_jitter else 1.0,
+                        time_scale=args.time_scale, frame_source=frame_source,
+                        on_event=None if args.quiet else print_event)
+
+    if args.metrics_json or args.metrics_prom:
+        from metrics import RunMetrics
+        runner.metrics = RunMetrics(args.metrics_json, args.metrics_prom, args.metrics_interval)
+
+    learner = None
+    if args.durations:
+        # 记录视频结束检测得到的课程实际时长
+        from durations import DurationStore, DurationLearner
+        learner = DurationLearner(steps, DurationStore(args.durations))
+        runner.on_event = learner.tap(runner.on_event)
+
+    start_loop = start_index = 0
+    if args.resume:
+        from journal import ProgressJournal, script_fingerprint, journal_path, read_progress
+        fingerprint = script_fingerprint(steps)
+        path = journal_path(fingerprint)
+        progress = read_progress(path, fingerprint)
+        if progress is not None and progress.next_loop < args.loops:
+            start_loop, start_index = progress.next_loop, progress.next_index
+            if not args.quiet:
+                print(f"从第 {start_loop + 1} 次循环第 {start_index + 1} 步继续执行")
+        runner.journal = ProgressJournal(path, fingerprint, args.loops, len(steps),
+                                         resume=(start_loop, start_index) != (0, 0))
+
+    # 默认在监督下执行：失败的步骤重试、恢复后跳过，不会因为一次异常结束整个执行
+    executor = runner
+    if args.retries >= 0:
+        from supervisor import Supervisor, IncidentLog
+        executor = Supervisor(runner, max_retries=args.retries, max_incidents=args.max_incidents,
+                              ready_timeout_fails=args.ready_timeout_fails, incident_log=IncidentLog(args.incident_log))
+
+    finished = False
+    try:
+        executed = executor.run(steps, args.loops, args.interval, start_loop, start_index)
+        finished = not runner.stopped
+    except KeyboardInterrupt:
+        executor.stop()
+        print("已中断", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        print(f"执行出错: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        # 与界面一致：执行完毕删除进度日志，中断或出错时保留
+        if runner.journal is not None:
+            runner.journal.close(finished)
+        if frame_source is not None:
+            frame_source.stop()
+        if learner is not None:
+            # 保存失败只提示，不能掩盖执行本身的结果或异常
+            import sqlite3
+            try:
+                learner.save()
+            except (sqlite3.Error, OSError) as e:
+                print(f"保存课程时长记录失败: {e}", file=sys.stderr)
+
+    if not args.quiet:
+        print(f"执行完成，共 {executed} 个步骤")
+    return EXIT_OK if finished else EXIT_STOPPED
+
+
+def simulate_script(args):
+    import scriptio
+    from simulate import simulate, format_duration
+
+    steps, _ = scriptio.load(args.script, args.format)
+    result = simulate(steps, args.loops, args.interval,
+                      jitter_duration=0 if args.no_jitter else 1.0)
+    if args.json:
+        import json
+        print(json.dumps(result.summary(), ensure_ascii=False, indent=2))
+        return EXIT_OK
+
+    print(f"步骤数: {len(steps)}, 循环次数: {args.loops}, 共执行 {result.executed} 个步骤")
+    print(f"预计总时间: {format_duration(result.total)} ({result.total:.1f} 秒)")
+    for phase, seconds in sorted(result.phases.items(), key=lambda item: -item[1]):
+        print(f"  {phase}: {format_duration(seconds)} ({seconds:.1f} 秒)")
+    if args.timeline:
+        for start, loop, index, step in result.timeline(args.timeline):
+            print(f"{start:>12.1f}s  第{loop + 1}次循环 步骤{index + 1}: {step['type']} "
+                  f"({step['x']}, {step['y']}) {step.get('desc', '')}")
+    return EXIT_OK
+
+
+def run_sessions(args):
+    import json
+    from sessions import SessionPool, Job
+
+    with open(args.jobs, encoding="utf-8") as f:
+        jobs = [Job.from_dict(item) for item in json.load(f)]
+
+    def on_event(kind, info):
+        if args.quiet and kind == "progress":
+            return
+        if kind == "progress":
+            print(f"[{info['job']}] 第 {info['loop'] + 1} 次循环 步骤 {info['index'] + 1}/{info['total']}")
+        elif kind == "incident":
+            print(f"[{info['job']}] 故障: {info['detail']} (第 {info['index'] + 1} 步，处理: {info['action']})",
+                  file=sys.stderr)
+        elif kind == "restart":
+            print(f"[{info['job']}] 会话异常退出(退出码 {info['exitcode']})，第 {info['attempt']} 次重启",
+                  file=sys.stderr)
+        else:
+            print(f"[{info['job']}] {'完成' if kind == 'done' else '失败'}")
+
+    pool = SessionPool(args.workers, args.backend, args.max_restarts, on_event=on_event)
+    results = pool.run(jobs)
+    failed = [name for name, result in results.items() if result["status"] != "done"]
+    print(f"共 {len(jobs)} 个任务，完成 {len(jobs) - len(failed)} 个")
+    for name in failed:
+        print(f"[{name}] 失败:\n{results[name]['error']}", file=sys.stderr)
+    return EXIT_ERROR if failed else EXIT_OK
+
+
+def serve(args):
+    import asyncio
+    from control import ScriptController, ControlServer
+
+    controller = ScriptController(args.backend, jitter_duration=0 if args.no_jitter else 1.0,
+                                  frame_source=create_frame_source(args.backend))
+    if args.script:
+        controller.load(args.script)
+    server = ControlServer(controller, path=args.socket, port=args.port)
+    print(f"控制服务已启动: {args.socket or f'127.0.0.1:{args.port}'}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        controller.stop()
+    return EXIT_OK
+
+
+def control(args):
+    """向控制服务发送一条命令并打印响应，subscribe 时持续打印事件"""
+    import json
+    import socket
+
+    if args.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(args.socket)
+    else:
+        sock = socket.create_connection(("127.0.0.1", args.port))
+    request = {"id": 1, "cmd": args.cmd}
+    for item in args.params:
+        key, _, value = item.partition("=")
+        try:
+            request[key] = json.loads(value)
+        except ValueError:
+            request[key] = value
+    with sock, sock.makefile("rb") as stream:
+        sock.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        for line in stream:
+            message = json.loads(line)
+            print(json.dumps(message, ensure_ascii=False))
+            if args.cmd != "subscribe" and "id" in message:
+                return EXIT_OK if message["ok"] else EXIT_ERROR
+            if message.get("event") in ("done", "stopped", "error") and args.until_done:
+                return EXIT_OK
+    return EXIT_OK
+
+
+def measure_import_time(modules, runs=5):
+    """
+    在新进程中导入 modules，返回 (每次耗时毫秒列表, 被导入的重量级模块)
+    每次都是冷启动，结果包含解释器本身的启动时间
+    """
+    import time
+    import subprocess
+
+    code = ("import sys\n"
+            f"import {', '.join(modules)}\n"
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    times = []
+    loaded = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+        loaded = result.stdout.strip()
+    return times, [m for m in loaded.split(",") if m]
+
+
+def import_time(args):
+    times, loaded = measure_import_time(args.modules, args.runs)
+    best = min(times)
+    print(f"导入 {', '.join(args.modules)}: 最快 {best:.1f} ms, 平均 {sum(times) / len(times):.1f} ms")
+    if loaded:
+        print(f"冷启动导入了重量级模块: {', '.join(loaded)}", file=sys.stderr)
+        return EXIT_ERROR
+    if args.max_ms is not None and best > args.max_ms:
+        print(f"启动时间超过 {args.max_ms} ms", file=sys.stderr)
+        return EXIT_ERROR
+    return EXIT_OK
+
+
+def build_parser():
+    # 后端名称与 engine.BACKENDS 一致，这里不导入 engine 以免拖慢 --help
+    parser = argparse.ArgumentParser(prog="autoplay", description="AutoPlay 无界面执行工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="执行脚本文件")
+    run_p.add_argument("script", help="脚本文件(.json / .jsonl / .aps / .apl)")
+    run_p.add_argument("--loops", type=int, default=1, help="循环次数")
+    run_p.add_argument("--interval", type=float, default=0.0, help="循环间隔(秒)")
+    run_p.add_argument("--backend", default="pyautogui", choices=("pyautogui", "null", "recording"),
+                       help="输入后端，null/recording 不操作鼠标")
+    run_p.add_argument("--format", choices=("json", "jsonl", "aps", "apl"), help="脚本格式(默认按扩展名)")
+    run_p.add_argument("--screen", metavar="WxH[+X+Y]",
+                       help="当前屏幕区域(默认读取真实屏幕；null/recording 后端不换算坐标)")
+    run_p.add_argument("--reference", metavar="WxH[+X+Y]", help="没有记录参考区域的旧脚本录制时的屏幕区域")
+    run_p.add_argument("--time-scale", type=float, default=1.0, help="等待时间缩放系数，0 表示跳过等待")
+    run_p.add_argument("--no-jitter", action="store_true", help="点击/移动前不抖动")
+    run_p.add_argument("--resume", action="store_true", help="记录进度日志，并从上次中断的位置继续")
+    run_p.add_argument("--metrics-json", help="执行结束时把各阶段耗时摘要写入该 JSON 文件")
+    run_p.add_argument("--metrics-prom", help="执行结束时写出 Prometheus 文本格式的指标文件")
+    run_p.add_argument("--metrics-interval", type=float, help="执行中每隔多少秒导出一次指标")
+    run_p.add_argument("--durations", metavar="DB", help="把检测到的课程实际时长写入该数据库")
+    run_p.add_argument("--retries", type=int, default=3,
+                       help="失败的步骤最多重试几次，之后重新选择课程或跳过；-1 表示出错即结束")
+    run_p.add_argument("--max-incidents", type=int,
+                       help="需要处理的故障总数上限，超过后结束执行(默认至少 100，长脚本为执行步骤数的 10%%)")
+    run_p.add_argument("--ready-timeout-fails", action="store_true",
+                       help="页面就绪检测超时按失败处理(重试、重新选择课程)，默认只记录并按固定等待继续")
+    run_p.add_argument("--incident-log", default="incidents.jsonl", help="故障记录文件")
+    run_p.add_argument("-q", "--quiet", action="store_true", help="不打印执行进度")
+    run_p.set_defaults(func=run)
+
+    sim_p = sub.add_parser("simulate", help="在虚拟时钟上模拟执行，报告总时间和各阶段耗时")
+    sim_p.add_argument("script", help="脚本文件(.json / .jsonl / .aps / .apl)")
+    sim_p.add_argument("--loops", type=int, default=1, help="循环次数")
+    sim_p.add_argument("--interval", type=float, default=0.0, help="循环间隔(秒)")
+    sim_p.add_argument("--format", choices=("json", "jsonl", "aps", "apl"), help="脚本格式(默认按扩展名)")
+    sim_p.add_argument("--no-jitter", action="store_true", help="点击/移动前不抖动")
+    sim_p.add_argument("--timeline", type=int, metavar="N", help="列出前 N 个步骤的开始时间")
+    sim_p.add_argument("--json", action="store_true", help="以 JSON 输出摘要")
+    sim_p.set_defaults(func=simulate_script)
+
+    ses_p = sub.add_parser("sessions", help="在多个独立虚拟显示(Xvfb)上并行执行多个任务")
+    ses_p.add_argument("jobs", help='任务列表 JSON，例如 [{"name": "账号1", "script": "a.json", "loops": 2, '
+                                    '"setup": ["chromium", "--user-data-dir=profiles/a"]}]')
+    ses_p.add_argument("--workers", type=int, help="同时运行的会话数(默认 CPU 核数)")
+    ses_p.add_argument("--backend", default="pyautogui", choices=("pyautogui", "null", "recording"),
+                       help="输入后端，pyautogui 时每个会话使用独立的 Xvfb 显示")
+    ses_p.add_argument("--max-restarts", type=int, default=2, help="任务失败后最多重启几次")
+    ses_p.add_argument("-q", "--quiet", action="store_true", help="不打印执行进度")
+    ses_p.set_defaults(func=run_sessions)
+
+    srv_p = sub.add_parser("serve", help="启动本地控制服务(Unix socket 或 127.0.0.1 端口)")
+    where = srv_p.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", help="Unix socket 路径")
+    where.add_argument("--port", type=int, help="本机 TCP 端口")
+    srv_p.add_argument("--script", help="启动时加载的脚本")
+    srv_p.add_argument("--backend", default="pyautogui", choices=("pyautogui", "null", "recording"))
+    srv_p.add_argument("--no-jitter", action="store_true", help="点击/移动前不抖动")
+    srv_p.set_defaults(func=serve)
+
+    ctl_p = sub.add_parser("ctl", help="向控制服务发送命令，例如 ctl --socket s run loops=3")
+    where = ctl_p.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", help="Unix socket 路径")
+    where.add_argument("--port", type=int, help="本机 TCP 端口")
+    ctl_p.add_argument("cmd", choices=("load", "run", "pause", "resume", "stop", "status", "metrics",
+                                       "subscribe"))
+    ctl_p.add_argument("params", nargs="*", help="命令参数 key=value，值按 JSON 解析")
+    ctl_p.add_argument("--until-done", action="store_true", help="subscribe 时收到结束事件后退出")
+    ctl_p.set_defaults(func=control)
+
+    imp_p = sub.add_parser("import-time", help="测量无界面执行所需模块的冷启动导入时间")
+    imp_p.add_argument("--modules", nargs="+", default=["cli", "engine", "scriptio", "journal"])
+    imp_p.add_argument("--runs", type=int, default=5)
+    imp_p.add_argument("--max-ms", type=float, help="最快一次超过该值时返回非零退出码")
+    imp_p.set_defaults(func=import_time)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "loops", 1) < 1:
+        print("循环次数必须大于0", file=sys.stderr)
+        return EXIT_ERROR
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
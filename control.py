@@ -0,0 +1,307 @@
+"""
+Description: Local control API for headless AutoPlay instances.
+An asyncio server on a Unix socket (or 127.0.0.1 TCP port) speaks newline-delimited JSON: clients send
+load/run/pause/resume/stop/status/metrics commands and, after "subscribe", receive a coalesced stream of
+status and metric events on the same connection. The script runs in a worker thread; stop cancels the
+scheduler so the current wait or jitter ends immediately.
+"""
+
+import os
+import json
+import asyncio
+import threading
+import traceback
+from collections import deque
+
+# 同一批次内只保留最后一条的高频事件
+COALESCED_EVENTS = ("step_start", "step_end", "loop_wait", "video_end", "page_ready", "image_found")
+
+# 客户端写缓冲超过该字节数时丢弃可合并事件，慢客户端不会拖住服务
+CLIENT_BUFFER_LIMIT = 256 * 1024
+
+# 命令参数没有默认值的标记
+_REQUIRED = object()
+
+
+class ScriptController:
+    """
+    无界面的脚本控制器，负责加载脚本和在工作线程中执行
+    "param backend: 输入后端名称
+    "param on_event: 事件回调 on_event(kind, info)，在工作线程中调用
+    "param runner_options: 传给 StepRunner 的其他参数
+    """
+
+    def __init__(self, backend="pyautogui", on_event=None, **runner_options):
+        from engine import StepRunner, create_backend
+        from metrics import RunMetrics
+        from supervisor import Supervisor, IncidentLog, INCIDENT_LOG
+        from layout import Display
+
+        self.on_event = on_event
+        self.runner = StepRunner(create_backend(backend), on_event=self._forward, **runner_options)
+        self.runner.metrics = self.metrics = RunMetrics()
+        # 失败的步骤自动重试/恢复，不会因为一次异常结束执行
+        self.supervisor = Supervisor(self.runner, incident_log=IncidentLog(INCIDENT_LOG))
+        # 真实屏幕上按当前显示布局换算脚本坐标，其余后端不换算
+        self.display = Display.for_backend(backend)
+        self.steps = None
+        self.path = None
+        self.loop_count = 0
+        self.thread = None
+        self.result = None
+
+    def _forward(self, kind, info):
+        if self.on_event is not None:
+            self.on_event(kind, info)
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def load(self, path, fmt=None):
+        """加载脚本，返回步骤数"""
+        import scriptio
+        if self.running:
+            raise RuntimeError("脚本正在执行中")
+        steps, _ = scriptio.load(path, fmt)
+        if self.display is not None:
+            self.display.fit(steps)
+        self.steps = steps
+        self.path = path
+        self._forward("loaded", {"path": path, "total": len(self.steps)})
+        return len(self.steps)
+
+    def run(self, loop_count=1, loop_interval=0, start_loop=0, start_index=0):
+        if not self.steps:
+            raise RuntimeError("没有加载脚本")
+        if self.running:
+            raise RuntimeError("脚本正在执行中")
+        if loop_count < 1:
+            raise ValueError("循环次数必须大于0")
+        if self.display is not None:
+            # 两次执行之间分辨率或窗口位置可能变化，没有变化时不做任何换算
+            self.display.refresh()
+            self.display.fit(self.steps)
+        self.loop_count = loop_count
+        self.result = None
+        self.thread = threading.Thread(target=self._run, name="ScriptController",
+                                       args=(loop_count, loop_interval, start_loop, start_index), daemon=True)
+        self.thread.start()
+
+    def _run(self, loop_count, loop_interval, start_loop, start_index):
+        try:
+            self.supervisor.run(self.steps, loop_count, loop_interval, start_loop, start_index)
+            self.result = "stopped" if self.runner.stopped else "done"
+        except Exception as e:
+            # 引擎已经发送了 error 事件
+            self.result = f"error: {e}"
+
+    def pause(self):
+        self.runner.pause()
+        self._forward("paused", {})
+
+    def resume(self):
+        self.runner.resume()
+        self._forward("resumed", {})
+
+    def stop(self):
+        """停止执行，正在进行的等待/抖动(以及重试前的等待)会立即结束"""
+        self.supervisor.stop()
+
+    def status(self):
+        runner = self.runner
+        if self.running:
+            state = "paused" if runner.paused else "running"
+        else:
+            state = "loaded" if self.steps else "idle"
+        return {
+            "state": state,
+            "script": self.path,
+            "total": len(self.steps) if self.steps is not None else 0,
+            "loop": runner.current_loop,
+            "loop_count": self.loop_count,
+            "index": runner.current_step_index,
+            "result": self.result,
+            "incidents": len(self.supervisor.log.incidents),
+        }
+
+
+def _encode(message):
+    return (json.dumps(message, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+class ControlServer:
+    """
+    控制服务
+    "param controller: ScriptController
+    "param path: Unix socket 路径，与 port 二选一
+    "param port: 本机 TCP 端口(只监听 127.0.0.1)
+    "param flush_interval: 事件推送间隔(秒)
+    "param metrics_interval: 执行中推送 metrics 事件的间隔(秒)
+    """
+
+    def __init__(self, controller, path=None, port=None, flush_interval=0.1, metrics_interval=5.0):
+        if (path is None) == (port is None):
+            raise ValueError("必须指定 Unix socket 路径或端口之一")
+        self.controller = controller
+        self.path = path
+        self.port = port
+        self.flush_interval = flush_interval
+        self.metrics_interval = metrics_interval
+        controller.on_event = self.post
+
+        # 工作线程投递事件，事件循环定期取出，deque 的 append/popleft 无需加锁
+        self._events = deque()
+        self._subscribers = set()
+        self._server = None
+        self.dropped = 0
+
+        self._commands = {
+            "load": self._cmd_load,
+            "run": self._cmd_run,
+            "pause": lambda request: self.controller.pause(),
+            "resume": lambda request: self.controller.resume(),
+            "stop": lambda request: self.controller.stop(),
+            "status": lambda request: self.controller.status(),
+            "metrics": lambda request: self.controller.metrics.to_dict(),
+            "subscribe": None,
+            "unsubscribe": None,
+        }
+
+    def post(self, kind, info):
+        """投递事件，可在任意线程调用"""
+        self._events.append((kind, info))
+
+    # ---- 命令 ----
+
+    @staticmethod
+    def _field(request, cmd, name, kinds, default=_REQUIRED):
+        """读取命令参数并检查类型，缺少必需参数或类型不对时抛出 ValueError"""
+        value = request.get(name, default)
+        if value is _REQUIRED:
+            raise ValueError(f"{cmd} 需要 {name}")
+        if value is not default and (not isinstance(value, kinds) or isinstance(value, bool)):
+            raise ValueError(f"{cmd} 的 {name} 类型不正确")
+        return value
+
+    async def _cmd_load(self, request):
+        path = self._field(request, "load", "path", str)
+        fmt = self._field(request, "load", "format", str, None)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.controller.load, path, fmt)
+
+    def _cmd_run(self, request):
+        field = self._field
+        self.controller.run(field(request, "run", "loops", int, 1),
+                            field(request, "run", "interval", (int, float), 0),
+                            field(request, "run", "start_loop", int, 0),
+                            field(request, "run", "start_index", int, 0))
+        return self.controller.status()
+
+    async def _dispatch(self, request, writer):
+        if not isinstance(request, dict):
+            raise ValueError("请求必须是 JSON 对象")
+        cmd = request.get("cmd")
+        if cmd not in self._commands:
+            raise ValueError(f"未知命令: {cmd}")
+        if cmd == "subscribe":
+            self._subscribers.add(writer)
+            return self.controller.status()
+        if cmd == "unsubscribe":
+            self._subscribers.discard(writer)
+            return None
+        result = self._commands[cmd](request)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = {}
+                try:
+                    request = json.loads(line)
+                    result = await self._dispatch(request, writer)
+                    response = {"id": request.get("id"), "ok": True, "result": result}
+                except Exception as e:
+                    response = {"id": request.get("id") if isinstance(request, dict) else None,
+                                "ok": False, "error": str(e)}
+                writer.write(_encode(response))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+
+    # ---- 事件推送 ----
+
+    def _broadcast(self, message, droppable):
+        data = _encode(message)
+        for writer in list(self._subscribers):
+            if writer.is_closing():
+                self._subscribers.discard(writer)
+                continue
+            if droppable and writer.transport.get_write_buffer_size() > CLIENT_BUFFER_LIMIT:
+                self.dropped += 1
+                continue
+            writer.write(data)
+
+    def _flush(self):
+        """推送本批事件，可合并的事件只保留每种的最后一条"""
+        events = self._events
+        latest = {}
+        for _ in range(len(events)):
+            kind, info = events.popleft()
+            if kind in COALESCED_EVENTS:
+                latest[kind] = info
+                continue
+            for k, i in latest.items():
+                self._broadcast(dict(i, event=k), True)
+            latest = {}
+            self._broadcast(dict(info, event=kind), False)
+        for k, i in latest.items():
+            self._broadcast(dict(i, event=k), True)
+
+    async def _pump(self):
+        loop = asyncio.get_running_loop()
+        next_metrics = loop.time() + self.metrics_interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                if self._subscribers:
+                    self._flush()
+                    if self.controller.running and loop.time() >= next_metrics:
+                        next_metrics = loop.time() + self.metrics_interval
+                        self._broadcast({"event": "metrics", **self.controller.metrics.to_dict()}, True)
+                else:
+                    self._events.clear()
+            except Exception as e:
+                # 一次出错(如无法编码的事件)不能让事件推送停下来，记录后告诉订阅者
+                traceback.print_exc()
+                self._events.clear()
+                try:
+                    self._broadcast({"event": "pump_error", "error": f"{type(e).__name__}: {e}"}, True)
+                except Exception:
+                    traceback.print_exc()
+
+    async def serve_forever(self):
+        if self.path is not None:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._server = await asyncio.start_unix_server(self._handle_client, self.path)
+            os.chmod(self.path, 0o600)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, "127.0.0.1", self.port)
+        pump = asyncio.create_task(self._pump())
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            pump.cancel()
+            self.controller.stop()
+            if self.path is not None and os.path.exists(self.path):
+                os.unlink(self.path)
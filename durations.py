@@ -0,0 +1,172 @@
+"""
+Description: Per-course video duration database learned from previous runs.
+Observed play times (from video-end detection) are stored in SQLite keyed by the course list and the
+course position, so interval steps can wait each course's real length plus a safety margin instead of
+one worst-case duration for every course.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+
+DATABASE = "course_durations.db"
+
+# 默认安全余量：实际时长 * (1 + 比例) + 秒数
+MARGIN_RATIO = 0.05
+MARGIN_SECONDS = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS durations (
+    catalog TEXT NOT NULL,
+    course TEXT NOT NULL,
+    description TEXT,
+    samples INTEGER NOT NULL,
+    last REAL NOT NULL,
+    longest REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (catalog, course)
+)
+"""
+
+
+def plan_catalog(plan):
+    """
+    课程列表的标识：起始位置、间隔和网格/翻页设置相同的计划对应同一组课程
+    按坐标换算前的参数计算，在不同分辨率的屏幕上记录的时长属于同一组课程
+    """
+    plan = plan.unmapped()
+    layout = [plan.start_x, plan.start_y, plan.interval_x, plan.interval_y]
+    if plan.columns or plan.page_size:
+        layout += [plan.columns, plan.row_x, plan.row_y, plan.page_size]
+    return hashlib.sha1(json.dumps(layout).encode("utf-8")).hexdigest()[:16]
+
+
+def course_key(plan, course):
+    """课程的标识：课程在录制时屏幕上的位置(坐标换算前)，翻页的计划前面加上页码"""
+    plan = plan.unmapped()
+    x, y = plan.course_position(course)
+    if plan.page_size:
+        return f"{course // plan.page_size}:{x},{y}"
+    return f"{x},{y}"
+
+
+def with_margin(seconds, margin_seconds=MARGIN_SECONDS, margin_ratio=MARGIN_RATIO):
+    return seconds * (1 + margin_ratio) + margin_seconds
+
+
+class DurationStore:
+    """
+    课程时长数据库
+    "param path: SQLite 文件路径
+    每次操作使用独立的连接，可在执行脚本的工作线程中写入
+    """
+
+    def __init__(self, path=DATABASE):
+        self.path = path
+        with self._connect() as db:
+            db.execute(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def record(self, observations):
+        """
+        批量记录观测到的时长，observations 为 (catalog, course, description, seconds) 的序列
+        保留最近一次和最长的时长
+        """
+        now = time.time()
+        rows = [(catalog, course, desc, seconds, seconds, now)
+                for catalog, course, desc, seconds in observations]
+        if not rows:
+            return 0
+        db = self._connect()
+        try:
+            with db:
+                db.executemany("""
+                    INSERT INTO durations (catalog, course, description, samples, last, longest, updated)
+                    VALUES (?, ?, ?, 1, ?, ?, ?)
+                    ON CONFLICT (catalog, course) DO UPDATE SET
+                        description = excluded.description,
+                        samples = samples + 1,
+                        last = excluded.last,
+                        longest = MAX(longest, excluded.longest),
+                        updated = excluded.updated
+                """, rows)
+        finally:
+            db.close()
+        return len(rows)
+
+    def lookup(self, catalog):
+        """某个课程列表中所有已记录课程的最长时长 {course: 秒}"""
+        db = self._connect()
+        try:
+            rows = db.execute("SELECT course, longest FROM durations WHERE catalog = ?", (catalog,))
+            return dict(rows.fetchall())
+        finally:
+            db.close()
+
+    def plan_durations(self, plan, margin_seconds=MARGIN_SECONDS, margin_ratio=MARGIN_RATIO):
+        """
+        计划中各课程的等待时间 {课程序号: 秒}(已加安全余量)，没有记录的课程不在结果中
+        只遍历数据库中的记录，与课程数量无关
+        """
+        plan = plan.unmapped()
+        known = self.lookup(plan_catalog(plan))
+        if not known:
+            return {}
+        result = {}
+        for course, seconds in known.items():
+            page, _, position = course.rpartition(":")
+            try:
+                x, y = (int(v) for v in position.split(","))
+            except ValueError:
+                # 早期版本按换算后的小数坐标记录的课程，无法对应
+                continue
+            # 由位置反推课程序号
+            n = plan.locate_course(x, y, int(page) if page else 0)
+            if n is not None:
+                result[n] = round(with_margin(seconds, margin_seconds, margin_ratio), 1)
+        return result
+
+
+class DurationLearner:
+    """
+    在执行过程中收集视频结束检测的结果，执行结束后写入数据库
+    用法：runner.on_event = learner.tap(原回调)，结束后调用 learner.save()
+    "param steps: 正在执行的 Script
+    "param store: DurationStore
+    """
+
+    def __init__(self, steps, store):
+        self.steps = steps
+        self.store = store
+        self.index = None
+        self.observations = []
+
+    def observe(self, kind, info):
+        if kind == "step_start":
+            self.index = info["index"]
+        elif kind == "video_end" and info["result"] == "finished" and self.index is not None:
+            segment, offset = self.steps.segment_at(self.index)
+            if not hasattr(segment, "course_of"):
+                return
+            course = segment.course_of(segment.first + offset)
+            if course is None:
+                return
+            self.observations.append((plan_catalog(segment), course_key(segment, course),
+                                      info["step"]["desc"], info["elapsed"]))
+
+    def tap(self, on_event):
+        """包装事件回调：先记录，再交给原回调"""
+        def handler(kind, info):
+            self.observe(kind, info)
+            if on_event is not None:
+                on_event(kind, info)
+        return handler
+
+    def save(self):
+        """写入本次执行的观测结果，返回记录条数"""
+        count = self.store.record(self.observations)
+        self.observations = []
+        return count
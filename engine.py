@@ -0,0 +1,438 @@
+"""
+Description: Headless step execution engine for AutoPlay scripts.
+The engine runs the same step dicts as the GUI ("点击"/"移动"/"等待"/"滚动") against a pluggable input backend,
+so scripts can be executed and benchmarked without a display.
+"""
+
+from scheduler import DeadlineScheduler
+from plan import WAIT_VIDEO_END, WAIT_READY, READY_TOLERANCE, READY_TIMEOUT, iter_from
+from metrics import (PHASE_JITTER, PHASE_ACTION, PHASE_WAIT, PHASE_VIDEO_WAIT, PHASE_READY_WAIT,
+                     PHASE_LOOP_INTERVAL)
+
+# jitter / vision 依赖 numpy，在第一次用到时才导入，保证无界面运行时启动快
+
+# 步骤类型
+STEP_CLICK = "点击"
+STEP_MOVE = "移动"
+STEP_WAIT = "等待"
+STEP_CLICK_IMAGE = "点击图像"
+# 在 x, y 处滚动鼠标滚轮 step["clicks"] 格(负数向下)，用于翻页
+STEP_SCROLL = "滚动"
+
+
+class InputBackend:
+    """输入后端接口：引擎只通过这些方法操作鼠标"""
+
+    name = "base"
+
+    def move_to(self, x, y, duration=0.0):
+        raise NotImplementedError
+
+    def click(self, x, y):
+        raise NotImplementedError
+
+    def scroll(self, clicks, x, y):
+        raise NotImplementedError
+
+    def position(self):
+        raise NotImplementedError
+
+
+class PyAutoGUIBackend(InputBackend):
+    """使用 pyautogui 操作真实鼠标"""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def move_to(self, x, y, duration=0.0):
+        # 定时由引擎负责，跳过 pyautogui 自带的 PAUSE 延迟
+        self.pyautogui.moveTo(x, y, duration=duration, _pause=False)
+
+    def click(self, x, y):
+        self.pyautogui.click(x, y)
+
+    def scroll(self, clicks, x, y):
+        self.pyautogui.scroll(clicks, x=x, y=y)
+
+    def position(self):
+        x, y = self.pyautogui.position()
+        return x, y
+
+
+class NullBackend(InputBackend):
+    """空操作后端，只记住最后的位置，用于测量引擎自身的调度开销"""
+
+    name = "null"
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+
+    def move_to(self, x, y, duration=0.0):
+        self.x = x
+        self.y = y
+
+    def click(self, x, y):
+        self.x = x
+        self.y = y
+
+    def scroll(self, clicks, x, y):
+        self.x = x
+        self.y = y
+
+    def position(self):
+        return self.x, self.y
+
+
+class RecordingBackend(NullBackend):
+    """在内存中记录所有操作，events 中每项为 (操作, x, y)，滚动为 ("scroll", x, y, 格数)"""
+
+    name = "recording"
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def move_to(self, x, y, duration=0.0):
+        self.x = x
+        self.y = y
+        self.events.append(("move", x, y))
+
+    def click(self, x, y):
+        self.x = x
+        self.y = y
+        self.events.append(("click", x, y))
+
+    def scroll(self, clicks, x, y):
+        self.x = x
+        self.y = y
+        self.events.append(("scroll", x, y, clicks))
+
+    def clear(self):
+        self.events.clear()
+
+
+BACKENDS = {
+    PyAutoGUIBackend.name: PyAutoGUIBackend,
+    NullBackend.name: NullBackend,
+    RecordingBackend.name: RecordingBackend,
+}
+
+
+def create_backend(name):
+    """按名称创建输入后端"""
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"未知的输入后端: {name}")
+
+
+class StepRunner:
+    """
+    脚本执行引擎，与界面无关
+    "param backend: 输入后端
+    "param jitter_duration: 点击/移动前抖动持续时间，0 表示不抖动
+    "param jitter: 抖动幅度(像素)
+    "param jitter_rate: 抖动时每秒移动次数
+    "param jitter_seed: 抖动随机种子，便于复现
+    "param settle: 抖动后停顿时间
+    "param time_scale: 等待时间缩放系数，0 表示跳过所有等待(用于基准测试)
+    "param on_event: 进度回调 on_event(kind, info)
+    "param scheduler: 等待调度器，默认新建 DeadlineScheduler
+    "param frame_source: 帧来源，设置后 wait_mode 为 video_end 的步骤会检测视频结束，
+                         wait_mode 为 ready 的步骤会检测页面就绪
+    "param video_end_options: 传给 VideoEndDetector 的参数
+    "param ready_options: 传给 ReadyCheck 的参数(检测间隔)
+    "param locator: 图像模板定位器，默认用 frame_source 创建
+    """
+
+    def __init__(self, backend, jitter_duration=1.0, jitter=8, settle=0.5,
+                 time_scale=1.0, on_event=None, scheduler=None,
+                 jitter_rate=20, jitter_seed=None, frame_source=None, video_end_options=None,
+                 locator=None, ready_options=None):
+        self.backend = backend
+        self.jitter_duration = jitter_duration
+        self.jitter = jitter
+        self.settle = settle
+        self._jitter_args = (jitter_duration, jitter, jitter_rate, jitter_seed)
+        self._jitter_gen = None
+        self.time_scale = time_scale
+        self.on_event = on_event
+        self.frame_source = frame_source
+        self.video_end_options = video_end_options or {}
+        self.ready_options = ready_options or {}
+        self._locator = locator
+
+        self.is_running = False
+        self.current_loop = 0
+        self.current_step_index = 0
+        # 进度日志(ProgressJournal)，每完成一个步骤记录一次
+        self.journal = None
+        # 计时统计(metrics.RunMetrics)，为 None 时不做任何计时
+        self.metrics = None
+        self._jitter_spent = 0.0
+        self.scheduler = scheduler if scheduler is not None else DeadlineScheduler()
+
+        # 步骤类型分发表
+        self._handlers = {
+            STEP_CLICK: self._do_click,
+            STEP_MOVE: self._do_move,
+            STEP_CLICK_IMAGE: self._do_click_image,
+            STEP_SCROLL: self._do_scroll,
+        }
+
+    def emit(self, kind, **info):
+        """向监听者发送进度事件"""
+        if self.on_event is not None:
+            self.on_event(kind, info)
+
+    def stop(self):
+        """请求停止执行，正在进行的等待会立即结束"""
+        self.scheduler.cancel()
+
+    def pause(self):
+        """暂停执行，等待中的步骤会顺延"""
+        self.scheduler.pause()
+
+    def resume(self):
+        """继续执行"""
+        self.scheduler.resume()
+
+    @property
+    def stopped(self):
+        return self.scheduler.cancelled
+
+    @property
+    def paused(self):
+        return self.scheduler.paused
+
+    @property
+    def jitter_gen(self):
+        """抖动轨迹生成器，第一次抖动时创建"""
+        if self._jitter_gen is None:
+            from jitter import JitterGenerator
+            self._jitter_gen = JitterGenerator(*self._jitter_args)
+        return self._jitter_gen
+
+    @property
+    def jitter_cost(self):
+        """每次点击/移动前抖动所需的固定时间(秒)"""
+        if self.jitter_duration <= 0:
+            return 0.0
+        return (self.jitter_gen.cost() + self.settle) * self.time_scale
+
+    def move_with_jitter(self, x, y, duration=None, jitter=None):
+        """鼠标移动到指定位置并模拟人手抖动，用于唤醒播放和选择视频按键"""
+        from jitter import play_trajectory
+        metrics = self.metrics
+        if metrics is not None:
+            start = self.scheduler.clock()
+        times, points = self.jitter_gen.trajectory(x, y, duration, jitter)
+        end = self.jitter_gen.cost(duration)
+        if play_trajectory(self.backend, times, points, self.scheduler, self.time_scale, end):
+            self.wait(self.settle)
+        if metrics is not None:
+            spent = self.scheduler.clock() - start
+            self._jitter_spent += spent
+            metrics.phase(PHASE_JITTER).observe(spent)
+
+    def wait(self, seconds):
+        """可中断的等待，返回 False 表示被停止"""
+        seconds *= self.time_scale
+        if seconds <= 0:
+            return not self.stopped
+        return self.scheduler.wait(seconds)
+
+    def wait_video_end(self, step):
+        """等待视频播放结束，步骤的 wait 作为超时时间"""
+        from vision import VideoEndDetector
+        detector = VideoEndDetector(self.frame_source, step["region"], **self.video_end_options)
+        start = self.scheduler.clock()
+        result = detector.wait(self.scheduler, step["wait"] * self.time_scale)
+        self.emit("video_end", result=result, elapsed=self.scheduler.clock() - start,
+                  samples=detector.samples, step=step)
+        return result != "cancelled"
+
+    def wait_ready(self, step):
+        """
+        等待页面就绪，最长等待步骤的 timeout(不少于固定等待时间)
+        超时后直接继续，相当于退回到固定等待
+        """
+        from vision import ReadyCheck
+        check = ReadyCheck(self.frame_source, step["probes"], step.get("tolerance", READY_TOLERANCE),
+                           **self.ready_options)
+        start = self.scheduler.clock()
+        timeout = max(step.get("timeout", READY_TIMEOUT), step["wait"]) * self.time_scale
+        result = check.wait(self.scheduler, timeout)
+        self.emit("page_ready", result=result, elapsed=self.scheduler.clock() - start,
+                  samples=check.samples, step=step)
+        return result != "cancelled"
+
+    def wait_step(self, step):
+        """步骤执行后的等待"""
+        mode = step.get("wait_mode")
+        if mode == WAIT_VIDEO_END and self.frame_source is not None and step.get("region"):
+            return self.wait_video_end(step)
+        if mode == WAIT_READY and self.frame_source is not None and step.get("probes"):
+            return self.wait_ready(step)
+        return self.wait(step["wait"])
+
+    def _do_click(self, step):
+        # 录制的点击带 "jitter": False，按录制的时间直接点击
+        if self.jitter_duration > 0 and step.get("jitter", True):
+            self.move_with_jitter(step["x"], step["y"])
+        self.backend.click(step["x"], step["y"])
+
+    def _do_move(self, step):
+        # 录制的路径点带 "jitter": False，直接移动
+        if self.jitter_duration > 0 and step.get("jitter", True):
+            self.move_with_jitter(step["x"], step["y"])
+        self.backend.move_to(step["x"], step["y"])
+
+    def _do_scroll(self, step):
+        if self.jitter_duration > 0:
+            self.move_with_jitter(step["x"], step["y"])
+        self.backend.scroll(step["clicks"], step["x"], step["y"])
+
+    @property
+    def locator(self):
+        if self._locator is None:
+            from vision import TemplateLocator, TargetNotFound
+            if self.frame_source is None:
+                raise TargetNotFound("没有可用的帧来源，无法查找图像")
+            self._locator = TemplateLocator(self.frame_source)
+        return self._locator
+
+    def _do_click_image(self, step):
+        pos = self.locator.locate(step["template"])
+        if pos is None:
+            from vision import TargetNotFound
+            raise TargetNotFound(f"屏幕上找不到图像: {step['template']}")
+        x, y = pos
+        self.emit("image_found", x=x, y=y, step=step)
+        if self.jitter_duration > 0:
+            self.move_with_jitter(x, y)
+        self.backend.click(x, y)
+
+    def run_step(self, step):
+        """执行单个步骤(不含等待)"""
+        handler = self._handlers.get(step["type"])
+        if handler is not None:
+            handler(step)
+
+    def _observe_wait(self, metrics, step, start):
+        """记录步骤等待的耗时和超时"""
+        now = self.scheduler.clock()
+        mode = step.get("wait_mode")
+        if mode == WAIT_VIDEO_END:
+            metrics.phase(PHASE_VIDEO_WAIT).observe(now - start)
+            return
+        if mode == WAIT_READY:
+            metrics.phase(PHASE_READY_WAIT).observe(now - start)
+            return
+        metrics.phase(PHASE_WAIT).observe(now - start)
+        if step["wait"] * self.time_scale > 0:
+            metrics.overshoot(self.scheduler.lateness)
+
+    def run(self, steps, loop_count=1, loop_interval=0, start_loop=0, start_index=0):
+        """
+        执行脚本，返回实际执行的步骤数
+        start_loop/start_index 用于从进度日志恢复执行
+        异常会在发送 error 事件后继续抛出，由调用方处理
+        """
+        scheduler = self.scheduler
+        scheduler.reset()
+        self.is_running = True
+        executed = 0
+        total = len(steps)
+        handlers = self._handlers
+        emit = self.on_event is not None
+        journal = self.journal
+        metrics = self.metrics
+        if metrics is not None:
+            clock = scheduler.clock
+            metrics.run_started()
+            # 下一个步骤的计划开始时间
+            scheduled = None
+
+        try:
+            for loop in range(start_loop, loop_count):
+                if self.stopped:
+                    break
+                first = start_index if loop == start_loop else 0
+                # 在第一个步骤之前出错(如事件回调出错)时，位置指向将要执行的步骤
+                self.current_loop = loop
+                self.current_step_index = first
+                if emit:
+                    self.emit("loop_start", loop=loop, loop_count=loop_count)
+
+                # 只有起点需要随机访问，之后按段顺序生成步骤
+                for i, step in enumerate(iter_from(steps, first), first):
+                    # 暂停时在这里阻塞，停止时退出
+                    if not scheduler.checkpoint():
+                        break
+                    self.current_step_index = i
+                    if emit:
+                        self.emit("step_start", loop=loop, index=i, total=total, step=step)
+
+                    step_type = step["type"]
+                    if metrics is not None:
+                        started = clock()
+                        metrics.step_started(step_type, scheduled, started)
+                        self._jitter_spent = 0.0
+
+                    handler = handlers.get(step_type)
+                    if handler is not None:
+                        handler(step)
+                    executed += 1
+
+                    if metrics is not None:
+                        acted = clock()
+                        # 动作耗时不含抖动
+                        metrics.phase(PHASE_ACTION, step_type).observe(acted - started - self._jitter_spent)
+                        scheduled = acted
+
+                    if emit:
+                        self.emit("step_end", loop=loop, index=i, total=total, step=step)
+
+                    if step["wait"] > 0:
+                        self.wait_step(step)
+                        if metrics is not None:
+                            self._observe_wait(metrics, step, acted)
+                            # 检测类等待提前结束时没有计划的开始时间
+                            detected = step.get("wait_mode") in (WAIT_VIDEO_END, WAIT_READY)
+                            scheduled = None if detected else scheduler.deadline
+
+                    # 等待被停止打断的步骤不算完成，恢复时重新执行
+                    if journal is not None and not self.stopped:
+                        journal.record(loop, i)
+                    if metrics is not None:
+                        metrics.step_finished(clock())
+
+                # 循环间隔（除了最后一次）
+                if loop < loop_count - 1 and not self.stopped:
+                    if emit:
+                        self.emit("loop_wait", loop=loop, interval=loop_interval)
+                    if metrics is not None:
+                        waited = clock()
+                    self.wait(loop_interval)
+                    if metrics is not None:
+                        metrics.phase(PHASE_LOOP_INTERVAL).observe(clock() - waited)
+                        scheduled = scheduler.deadline if loop_interval * self.time_scale > 0 else clock()
+
+            if emit:
+                self.emit("stopped" if self.stopped else "done", executed=executed)
+            return executed
+
+        except Exception as e:
+            if emit:
+                self.emit("error", error=e, loop=self.current_loop, index=self.current_step_index)
+            raise
+
+        finally:
+            self.is_running = False
+            if metrics is not None:
+                metrics.run_finished()
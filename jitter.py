@@ -0,0 +1,75 @@
+"""
+Description: Precomputed mouse jitter trajectories.
+A whole jitter path is generated up front with NumPy and then replayed against absolute deadlines,
+so the time spent on each click is a known number (points / rate + settle) instead of depending on
+pyautogui's tweening and PAUSE delays.
+"""
+
+import numpy as np
+
+
+class JitterGenerator:
+    """
+    抖动轨迹生成器
+    "param duration: 抖动持续时间(秒)
+    "param amplitude: 抖动幅度(像素)
+    "param rate: 每秒移动次数
+    "param seed: 随机种子，相同种子生成相同轨迹
+    """
+
+    def __init__(self, duration=1.0, amplitude=8, rate=20, seed=None):
+        if rate <= 0:
+            raise ValueError("抖动频率必须大于0")
+        self.duration = duration
+        self.amplitude = amplitude
+        self.rate = rate
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+    def point_count(self, duration=None):
+        """一条轨迹包含的点数"""
+        if duration is None:
+            duration = self.duration
+        return max(int(round(duration * self.rate)), 0)
+
+    def cost(self, duration=None):
+        """回放一条轨迹所需的时间(秒)"""
+        return self.point_count(duration) / self.rate
+
+    def trajectory(self, x, y, duration=None, amplitude=None):
+        """
+        生成一条围绕 (x, y) 的抖动轨迹
+        返回 (times, points)：times 为相对起点的时间偏移，points 为 (N, 2) 的整数坐标
+        """
+        if amplitude is None:
+            amplitude = self.amplitude
+        n = self.point_count(duration)
+        times = np.arange(n, dtype=np.float64) / self.rate
+        points = self.rng.integers(-amplitude, amplitude + 1, size=(n, 2))
+        points += np.array((x, y), dtype=points.dtype)
+        return times, points
+
+
+def play_trajectory(backend, times, points, scheduler, time_scale=1.0, end=None):
+    """
+    按计划时间回放轨迹，返回 False 表示回放被取消
+    "param backend: 输入后端
+    "param times: 相对起点的时间偏移
+    "param points: (N, 2) 坐标数组
+    "param scheduler: DeadlineScheduler，用于精确定时和取消
+    "param end: 轨迹结束的时间偏移，给出时最后一个点之后会等到该时刻，使总耗时固定
+    """
+    if len(times) == 0:
+        return not scheduler.cancelled
+    # 一次性转换成 Python 列表，避免循环中逐个访问 NumPy 标量
+    offsets = (times * time_scale).tolist()
+    coords = points.tolist()
+    move_to = backend.move_to
+    start = scheduler.clock()
+    for offset, (px, py) in zip(offsets, coords):
+        if not scheduler.wait_until(start + offset):
+            return False
+        move_to(px, py)
+    if end is not None:
+        return scheduler.wait_until(start + end * time_scale)
+    return True
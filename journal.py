@@ -0,0 +1,162 @@
+"""
+Description: Crash-safe progress journal.
+Every completed step appends a fixed-size record to a per-script journal file, synced to disk in
+batches. After a crash or a Stop the last record tells exactly which loop and step to resume from;
+the header carries a hash of the script so a journal is never applied to a different script.
+"""
+
+import os
+import json
+import time
+import struct
+import hashlib
+
+JOURNAL_DIR = "progress_journal"
+
+MAGIC = b"APJ1"
+# 文件头：魔数、脚本哈希(sha256)、循环次数、步骤数
+HEADER = struct.Struct("<4s32sII")
+# 记录：循环序号、步骤序号、完成时间
+RECORD = struct.Struct("<IId")
+
+
+def script_fingerprint(steps):
+    """脚本内容的 sha256，Script 按段计算，避免展开生成的计划"""
+    digest = hashlib.sha256()
+    segments = getattr(steps, "segments", None)
+    if segments is None:
+        segments = [steps]
+    for segment in segments:
+        if hasattr(segment, "to_dict"):
+            # IntervalPlan：参数决定全部步骤
+            digest.update(b"plan")
+            digest.update(json.dumps(segment.to_dict(), sort_keys=True).encode("utf-8"))
+        else:
+            digest.update(b"steps")
+            for step in segment:
+                digest.update(json.dumps(step, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.digest()
+
+
+def journal_path(fingerprint, directory=JOURNAL_DIR):
+    return os.path.join(directory, fingerprint.hex()[:16] + ".journal")
+
+
+class Progress:
+    """日志中记录的进度，next_loop/next_index 为恢复执行的位置"""
+
+    __slots__ = ("loop_count", "total", "last_loop", "last_index", "completed")
+
+    def __init__(self, loop_count, total, last_loop, last_index, completed):
+        self.loop_count = loop_count
+        self.total = total
+        self.last_loop = last_loop
+        self.last_index = last_index
+        self.completed = completed
+
+    @property
+    def next_loop(self):
+        if self.last_loop is None:
+            return 0
+        return self.last_loop + 1 if self.last_index + 1 >= self.total else self.last_loop
+
+    @property
+    def next_index(self):
+        if self.last_loop is None:
+            return 0
+        return 0 if self.last_index + 1 >= self.total else self.last_index + 1
+
+
+def read_progress(path, fingerprint=None):
+    """
+    读取日志进度，只读文件头和最后一条记录
+    文件不存在、哈希不匹配或文件头损坏时返回 None
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return None
+            magic, digest, loop_count, total = HEADER.unpack(header)
+            if magic != MAGIC or (fingerprint is not None and digest != fingerprint):
+                return None
+            size = os.fstat(f.fileno()).st_size
+            # 忽略崩溃时写了一半的记录
+            count = (size - HEADER.size) // RECORD.size
+            if count == 0:
+                return Progress(loop_count, total, None, None, 0)
+            f.seek(HEADER.size + (count - 1) * RECORD.size)
+            loop, index, _ = RECORD.unpack(f.read(RECORD.size))
+            return Progress(loop_count, total, loop, index, count)
+    except FileNotFoundError:
+        return None
+
+
+class ProgressJournal:
+    """
+    追加写入的进度日志
+    "param path: 日志文件路径
+    "param fingerprint: script_fingerprint 的结果
+    "param loop_count: 循环次数
+    "param total: 每次循环的步骤数
+    "param resume: 为 True 时在已有日志后追加，否则重新开始
+    "param sync_every: 每写入多少条记录同步一次磁盘
+    "param sync_interval: 距上次同步超过多少秒时同步
+    """
+
+    def __init__(self, path, fingerprint, loop_count, total, resume=False,
+                 sync_every=32, sync_interval=5.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if resume and read_progress(path, fingerprint) is not None:
+            self._file = open(path, "r+b")
+            # 截掉写了一半的记录
+            size = os.fstat(self._file.fileno()).st_size
+            self._file.truncate(HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(HEADER.pack(MAGIC, fingerprint, loop_count, total))
+            self._sync()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    @classmethod
+    def for_script(cls, steps, loop_count, resume=False, directory=JOURNAL_DIR, **kwargs):
+        fingerprint = script_fingerprint(steps)
+        return cls(journal_path(fingerprint, directory), fingerprint, loop_count, len(steps),
+                   resume, **kwargs)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def record(self, loop, index):
+        """记录第 loop 次循环的第 index 个步骤已完成"""
+        self._file.write(RECORD.pack(loop, index, time.time()))
+        self._pending += 1
+        if self._pending >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self._sync()
+
+    def close(self, finished=False):
+        """
+        关闭日志，finished 为 True 表示整个脚本已执行完，删除日志
+        否则保留日志供下次恢复
+        """
+        if self._file is None:
+            return
+        if finished:
+            self._file.close()
+            self._file = None
+            os.remove(self.path)
+            return
+        self._sync()
+        self._file.close()
+        self._file = None
@@ -0,0 +1,548 @@
+"""
+Description: Small script language for AutoPlay.
+Repeat blocks, counters and coordinate expressions replace physically duplicated steps:
+
+    let start_x = 100
+    let interval_y = 40
+    repeat 100 as i
+        click start_x, 200 + i * interval_y wait 2 desc "选择视频{i + 1}"
+        click 800, 600 wait 300 desc "播放视频{i + 1}"
+    end
+
+Source is compiled once into flat instruction arrays (opcodes, operands, per-block offset tables) and
+expressions into small closures over a counter array, so a program covering any number of courses stays
+a few lines long. Programs behave like IntervalPlan: steps are produced on demand, sequentially by the
+instruction interpreter or by random access in O(depth * log n).
+"""
+
+import re
+import ast
+import copy
+import json
+import io
+import tokenize
+from array import array
+from bisect import bisect_right
+
+from plan import NO_POSITION_TYPES
+from layout import Transform
+
+# 指令
+OP_STEP = 0
+OP_REPEAT = 1
+OP_END = 2
+
+# 语句 -> 步骤类型
+ACTIONS = {
+    "click": "点击",
+    "move": "移动",
+    "wait": "等待",
+    "image": "点击图像",
+}
+CLAUSES = ("wait", "desc", "region", "nojitter")
+KEYWORDS = set(ACTIONS) | set(CLAUSES) | {"let", "repeat", "as", "end"}
+
+# 表达式中允许调用的函数(不支持乘方：9**9**9**9 这样的表达式会让编译或执行卡住)
+FUNCTIONS = {"min": min, "max": max, "abs": abs, "int": int, "round": round}
+_ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load, ast.Call,
+                  ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.USub, ast.UAdd)
+
+_FIELD = re.compile(r"\{([^{}]+)\}")
+
+
+class ScriptSyntaxError(ValueError):
+    """脚本语法错误，带行号"""
+
+    def __init__(self, message, line=None):
+        self.line = line
+        super().__init__(f"第 {line} 行: {message}" if line else message)
+
+
+class _Compiler:
+    """把表达式编译成常量或 f(v) 闭包，v 为计数器数组"""
+
+    def __init__(self, variables):
+        # let 定义的变量保存为已替换的语法树(宏)，计数器保存为槽位
+        self.macros = {name: ast.Constant(value) for name, value in (variables or {}).items()}
+        self.counters = {}
+        self.slots = 0
+
+    def parse(self, text, line):
+        try:
+            tree = ast.parse(text.strip(), mode="eval")
+        except SyntaxError:
+            raise ScriptSyntaxError(f"无效的表达式: {text.strip()}", line)
+        return tree.body
+
+    def _check(self, node, line):
+        for child in ast.walk(node):
+            if not isinstance(child, _ALLOWED_NODES):
+                raise ScriptSyntaxError(f"表达式中不支持 {type(child).__name__}", line)
+            if isinstance(child, ast.Call) and not (isinstance(child.func, ast.Name)
+                                                     and child.func.id in FUNCTIONS and not child.keywords):
+                raise ScriptSyntaxError("只能调用 " + "/".join(FUNCTIONS), line)
+            if isinstance(child, ast.Constant) and not isinstance(child.value, (int, float)):
+                raise ScriptSyntaxError("表达式中只能使用数字", line)
+
+    def substitute(self, node, line):
+        """替换 let 变量，计数器改为 v[槽位]，返回 (新语法树, 是否引用计数器)"""
+        self._check(node, line)
+        uses_counter = False
+
+        compiler = self
+
+        class Rewriter(ast.NodeTransformer):
+            def visit_Call(self, call):
+                call.args = [self.visit(arg) for arg in call.args]
+                return call
+
+            def visit_Name(self, name):
+                nonlocal uses_counter
+                if name.id in compiler.counters:
+                    uses_counter = True
+                    return ast.Subscript(value=ast.Name("v", ast.Load()),
+                                         slice=ast.Constant(compiler.counters[name.id]), ctx=ast.Load())
+                if name.id in compiler.macros:
+                    macro = compiler.macros[name.id]
+                    if isinstance(macro, tuple):
+                        uses_counter = uses_counter or macro[1]
+                        return macro[0]
+                    return macro
+                raise ScriptSyntaxError(f"未定义的变量: {name.id}", line)
+
+        return Rewriter().visit(node), uses_counter
+
+    def expression(self, text, line):
+        """编译表达式，不引用计数器时直接求值为常量"""
+        node, uses_counter = self.substitute(self.parse(text, line), line)
+        if not uses_counter:
+            return self._evaluate(node, line)
+        lam = ast.Expression(ast.Lambda(
+            args=ast.arguments(posonlyargs=[], args=[ast.arg("v")], kwonlyargs=[], kw_defaults=[],
+                               defaults=[]),
+            body=node))
+        ast.fix_missing_locations(lam)
+        return eval(compile(lam, "<autoplay>", "eval"), {"__builtins__": {}, **FUNCTIONS})
+
+    def _evaluate(self, node, line):
+        expr = ast.fix_missing_locations(ast.Expression(node))
+        try:
+            return eval(compile(expr, "<autoplay>", "eval"), {"__builtins__": {}, **FUNCTIONS})
+        except (ArithmeticError, TypeError, ValueError) as e:
+            raise ScriptSyntaxError(f"表达式求值失败: {e}", line)
+
+    def define(self, name, text, line):
+        node, uses_counter = self.substitute(self.parse(text, line), line)
+        self.macros[name] = (node, uses_counter) if uses_counter else ast.Constant(self._evaluate(node, line))
+
+    def template(self, text, line):
+        """描述模板，{表达式} 在生成步骤时求值"""
+        parts = []
+        dynamic = False
+        pos = 0
+        for match in _FIELD.finditer(text):
+            parts.append(text[pos:match.start()])
+            value = self.expression(match.group(1), line)
+            dynamic = dynamic or callable(value)
+            parts.append(value)
+            pos = match.end()
+        parts.append(text[pos:])
+        if not dynamic:
+            return "".join(str(_number(p)) if not isinstance(p, str) else p for p in parts)
+
+        def render(v):
+            return "".join(p if isinstance(p, str) else str(_number(p(v) if callable(p) else p)) for p in parts)
+        return render
+
+
+def _number(value):
+    """整数值的浮点数显示为整数"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _split_clauses(text, line):
+    """按顶层关键字(wait/desc/region/nojitter)拆分语句，返回 (开头部分, {子句: 文本})"""
+    tokens = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(text).readline):
+            tokens.append(tok)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        raise ScriptSyntaxError("无法解析的语句", line)
+    depth = 0
+    cuts = []
+    for tok in tokens:
+        if tok.type == tokenize.OP and tok.string in "([":
+            depth += 1
+        elif tok.type == tokenize.OP and tok.string in ")]":
+            depth -= 1
+        elif tok.type == tokenize.NAME and depth == 0 and tok.string in CLAUSES:
+            cuts.append((tok.start[1], tok.end[1], tok.string))
+    head = text[:cuts[0][0]] if cuts else text
+    clauses = {}
+    for i, (start, end, name) in enumerate(cuts):
+        stop = cuts[i + 1][0] if i + 1 < len(cuts) else len(text)
+        if name in clauses:
+            raise ScriptSyntaxError(f"重复的 {name}", line)
+        clauses[name] = text[end:stop].strip()
+    return head.strip(), clauses
+
+
+def _string(text, line):
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = None
+    if not isinstance(value, str):
+        raise ScriptSyntaxError(f"需要双引号字符串: {text}", line)
+    return value
+
+
+class _Code:
+    """编译结果：指令数组、动作表和每个块的偏移表，多个 Program 切片共享"""
+
+    def __init__(self):
+        self.ops = array("B")
+        # STEP：动作序号；REPEAT：重复次数；END：对应 REPEAT 的位置
+        self.args = array("q")
+        # REPEAT：计数器槽位、每次迭代的步骤数、END 之后的位置
+        self.slots = array("h")
+        self.sizes = array("q")
+        self.jumps = array("l")
+        self.actions = []
+        self.slot_count = 0
+        # 块起始位置 -> (步骤偏移, 指令位置)
+        self.blocks = {}
+        self.length = 0
+
+    def mapped(self, transform):
+        """坐标经 transform 映射后的编译结果：指令数组共享，只改写动作表"""
+        code = copy.copy(self)
+        code.actions = [_map_action(action, transform) for action in self.actions]
+        return code
+
+    def emit(self, op, arg=0, slot=-1, size=0, jump=0):
+        self.ops.append(op)
+        self.args.append(arg)
+        self.slots.append(slot)
+        self.sizes.append(size)
+        self.jumps.append(jump)
+        return len(self.ops) - 1
+
+
+class _Block:
+    """编译中的 repeat 块"""
+
+    def __init__(self, pc, line, saved=None):
+        self.pc = pc
+        self.line = line
+        # 块内每一项的 (步骤偏移, 指令位置)
+        self.offsets = []
+        self.pcs = []
+        self.size = 0
+        # 被计数器遮住的同名计数器和变量，块结束时恢复
+        self.saved = saved
+
+    def add(self, pc, size):
+        self.offsets.append(self.size)
+        self.pcs.append(pc)
+        self.size += size
+
+    def table(self):
+        return array("q", self.offsets), array("l", self.pcs)
+
+
+def compile_source(source, variables=None):
+    """把源码编译为 _Code，variables 为预先定义的变量(可被 let 覆盖)"""
+    compiler = _Compiler(variables)
+    code = _Code()
+    stack = [_Block(-1, 0)]
+
+    for number, raw in enumerate(source.splitlines(), 1):
+        text = _strip_comment(raw)
+        if not text:
+            continue
+        word, _, rest = text.partition(" ")
+        rest = rest.strip()
+
+        if word == "let":
+            name, eq, expr = rest.partition("=")
+            name = name.strip()
+            if not eq or not name.isidentifier() or name in KEYWORDS:
+                raise ScriptSyntaxError("用法: let 名称 = 表达式", number)
+            if name in compiler.counters:
+                raise ScriptSyntaxError(f"{name} 是计数器，不能重新定义", number)
+            compiler.define(name, expr, number)
+
+        elif word == "repeat":
+            count_text, _, name = rest.rpartition(" as ") if " as " in rest else (rest, "", "")
+            name = name.strip()
+            if name and (not name.isidentifier() or name in KEYWORDS):
+                raise ScriptSyntaxError(f"无效的计数器名: {name}", number)
+            count = compiler.expression(count_text, number)
+            if callable(count):
+                raise ScriptSyntaxError("重复次数不能依赖计数器", number)
+            if count != int(count) or count < 0:
+                raise ScriptSyntaxError("重复次数必须是非负整数", number)
+            slot = code.slot_count
+            code.slot_count += 1
+            pc = code.emit(OP_REPEAT, int(count), slot)
+            saved = None
+            if name:
+                saved = (name, compiler.counters.get(name), compiler.macros.pop(name, None))
+                compiler.counters[name] = slot
+            stack.append(_Block(pc, number, saved))
+
+        elif word == "end":
+            if rest or len(stack) == 1:
+                raise ScriptSyntaxError("多余的 end", number)
+            block = stack.pop()
+            end = code.emit(OP_END, block.pc)
+            code.sizes[block.pc] = block.size
+            code.jumps[block.pc] = end + 1
+            code.blocks[block.pc + 1] = block.table()
+            # 计数器只在块内可见
+            if block.saved:
+                name, old_slot, old_macro = block.saved
+                if old_slot is None:
+                    compiler.counters.pop(name, None)
+                else:
+                    compiler.counters[name] = old_slot
+                if old_macro is not None:
+                    compiler.macros[name] = old_macro
+            stack[-1].add(block.pc, code.args[block.pc] * block.size)
+
+        elif word in ACTIONS:
+            code.actions.append(_action(compiler, word, rest, number))
+            stack[-1].add(code.emit(OP_STEP, len(code.actions) - 1), 1)
+
+        else:
+            raise ScriptSyntaxError(f"未知语句: {word}", number)
+
+    if len(stack) > 1:
+        raise ScriptSyntaxError("repeat 缺少 end", stack[-1].line)
+    code.blocks[0] = stack[0].table()
+    code.length = stack[0].size
+    return code
+
+
+def _strip_comment(raw):
+    """去掉不在字符串中的 # 注释"""
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(raw):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "#":
+            return raw[:i].strip()
+    return raw.strip()
+
+
+def _action(compiler, word, rest, line):
+    """编译一个动作语句，返回 (类型, x, y, 等待, 描述, 附加字段)"""
+    head, clauses = _split_clauses(rest, line)
+    x = y = 0
+    extra = {}
+    if word in ("click", "move"):
+        coords = [part for part in _split_args(head)]
+        if len(coords) != 2:
+            raise ScriptSyntaxError(f"用法: {word} x, y [wait 秒] [desc \"描述\"]", line)
+        x = compiler.expression(coords[0], line)
+        y = compiler.expression(coords[1], line)
+    elif word == "wait":
+        if "wait" in clauses or not head:
+            raise ScriptSyntaxError("用法: wait 秒 [desc \"描述\"]", line)
+        clauses["wait"] = head
+    elif word == "image":
+        extra["template"] = _string(head, line)
+
+    wait = compiler.expression(clauses["wait"], line) if clauses.get("wait") else 0
+    desc = compiler.template(_string(clauses["desc"], line), line) if "desc" in clauses else ""
+    if "region" in clauses:
+        region = _split_args(clauses["region"])
+        if len(region) != 4:
+            raise ScriptSyntaxError("用法: region x, y, 宽, 高", line)
+        values = [compiler.expression(part, line) for part in region]
+        if any(callable(v) for v in values):
+            raise ScriptSyntaxError("检测区域不能依赖计数器", line)
+        extra["wait_mode"] = "video_end"
+        extra["region"] = [int(v) for v in values]
+    if "nojitter" in clauses:
+        if clauses["nojitter"]:
+            raise ScriptSyntaxError("nojitter 不带参数", line)
+        extra["jitter"] = False
+    return ACTIONS[word], x, y, wait, desc, extra or None
+
+
+def _map_axis(value, scale, offset):
+    """常量坐标直接换算，依赖计数器的坐标包一层闭包"""
+    if callable(value):
+        return lambda v: round(value(v) * scale + offset)
+    return round(value * scale + offset)
+
+
+def _map_action(action, transform):
+    kind, x, y, wait, desc, extra = action
+    if kind not in NO_POSITION_TYPES:
+        x = _map_axis(x, transform.sx, transform.dx)
+        y = _map_axis(y, transform.sy, transform.dy)
+    return kind, x, y, wait, desc, transform.extra(extra)
+
+
+def _split_args(text):
+    """按顶层逗号拆分"""
+    parts = []
+    depth = 0
+    current = []
+    for ch in text:
+        if ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    if "".join(current).strip():
+        parts.append("".join(current))
+    return [p.strip() for p in parts]
+
+
+class Program:
+    """
+    编译后的脚本程序，像 IntervalPlan 一样按需生成步骤
+    "param source: 源码
+    "param variables: 预先定义的变量
+    "param transform: 坐标映射(layout.Transform)，编译时改写到动作表中
+    first/stop 表示程序的一部分(编辑时拆分)
+    """
+
+    __slots__ = ("source", "variables", "transform", "code", "first", "stop")
+
+    def __init__(self, source, variables=None, first=0, stop=None, code=None, transform=None):
+        self.source = source
+        self.variables = dict(variables) if variables else None
+        self.transform = transform
+        if code is None:
+            code = compile_source(source, variables)
+            if transform is not None:
+                code = code.mapped(transform)
+        self.code = code
+        self.first = first
+        self.stop = self.code.length if stop is None else stop
+
+    @classmethod
+    def load(cls, path, variables=None):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.read(), variables)
+
+    def __len__(self):
+        return self.stop - self.first
+
+    def _make(self, index, v):
+        """由动作表生成步骤字典(引擎、进度记录和步骤列表都按字典读取步骤)，计算出的坐标四舍五入"""
+        kind, x, y, wait, desc, extra = self.code.actions[index]
+        step = {"type": kind,
+                "x": round(x(v)) if callable(x) else round(x),
+                "y": round(y(v)) if callable(y) else round(y),
+                "wait": _number(wait(v) if callable(wait) else wait),
+                "desc": desc(v) if callable(desc) else desc}
+        if extra:
+            step.update(extra)
+        return step
+
+    def _seek(self, n):
+        """完整程序中第 n 个步骤的 (指令位置, 计数器)，按块偏移表二分查找"""
+        code = self.code
+        v = [0] * code.slot_count
+        block = 0
+        while True:
+            offsets, pcs = code.blocks[block]
+            j = bisect_right(offsets, n) - 1
+            n -= offsets[j]
+            pc = pcs[j]
+            if code.ops[pc] == OP_STEP:
+                return pc, v
+            v[code.slots[pc]], n = divmod(n, code.sizes[pc])
+            block = pc + 1
+
+    def step(self, n):
+        """完整程序中第 n 个步骤"""
+        pc, v = self._seek(n)
+        return self._make(self.code.args[pc], v)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, stride = index.indices(len(self))
+            if stride != 1:
+                raise ValueError("不支持步长切片")
+            return self.sub_plan(self.first + start, self.first + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("步骤序号超出范围")
+        return self.step(self.first + index)
+
+    def __iter__(self):
+        """顺序执行指令数组；从中间开始时只定位一次第一个步骤(恢复执行、拆分后的程序)"""
+        remaining = self.stop - self.first
+        if remaining <= 0:
+            return
+        code = self.code
+        ops, args, slots, jumps = code.ops, code.args, code.slots, code.jumps
+        make = self._make
+        if self.first:
+            pc, v = self._seek(self.first)
+        else:
+            v = [0] * code.slot_count
+            pc = 0
+        end = len(ops)
+        while pc < end:
+            op = ops[pc]
+            if op == OP_STEP:
+                yield make(args[pc], v)
+                remaining -= 1
+                if not remaining:
+                    return
+                pc += 1
+            elif op == OP_REPEAT:
+                if args[pc] and code.sizes[pc]:
+                    v[slots[pc]] = 0
+                    pc += 1
+                else:
+                    pc = jumps[pc]
+            else:
+                repeat = args[pc]
+                v[slots[repeat]] += 1
+                pc = repeat + 1 if v[slots[repeat]] < args[repeat] else pc + 1
+
+    def sub_plan(self, first, stop):
+        """只包含完整程序中 [first, stop) 步骤的程序，共享编译结果"""
+        return Program(self.source, self.variables, first, stop, self.code, self.transform)
+
+    def mapped(self, transform):
+        """坐标经 transform 映射后的程序，与已有的映射合并后从源码重新编译，不累积取整误差"""
+        if self.transform is not None:
+            transform = self.transform.then(transform)
+        return Program(self.source, self.variables, self.first, self.stop, transform=transform)
+
+    def to_dict(self):
+        data = {"source": self.source, "variables": self.variables, "first": self.first, "stop": self.stop}
+        if self.transform is not None:
+            data["transform"] = list(self.transform)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        transform = Transform(*data["transform"]) if data.get("transform") else None
+        return cls(data["source"], data.get("variables"), data.get("first", 0), data.get("stop"),
+                   transform=transform)
@@ -0,0 +1,287 @@
+"""
+Description: Resolution-independent coordinates.
+A script records the reference area its coordinates were taken in (the primary screen, the whole virtual desktop
+or a window found by its title) in its settings. When the script is loaded, the current display layout is read
+once and the affine transform from the reference area to the current one is computed and cached until the layout
+changes; the whole script is then mapped in one pass (typed step arrays with NumPy, generated plans and compiled
+programs by their parameters), so executing a step costs nothing extra.
+"""
+
+import re
+import sys
+from array import array
+from collections import namedtuple
+
+# numpy 只在映射手工步骤表时导入
+
+# 参考区域：主显示器、所有显示器组成的虚拟桌面、按标题查找的窗口
+ANCHOR_SCREEN = "screen"
+ANCHOR_DESKTOP = "desktop"
+ANCHOR_WINDOW = "window"
+ANCHORS = (ANCHOR_SCREEN, ANCHOR_DESKTOP, ANCHOR_WINDOW)
+
+# 缩放方式：宽高分别缩放，或按较小的比例等比缩放(以区域左上角对齐，适合从左上角排版的网页)
+FIT_STRETCH = "stretch"
+FIT_UNIFORM = "uniform"
+
+_GEOMETRY = re.compile(r"^\s*(\d+)\s*[xX]\s*(\d+)\s*(?:([+-]\s*\d+)\s*([+-]\s*\d+))?\s*$")
+
+
+class LayoutError(RuntimeError):
+    """无法确定当前显示布局(例如找不到参考窗口)"""
+
+
+class Frame(namedtuple("Frame", "left top width height")):
+    """屏幕坐标中的矩形区域"""
+
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, text):
+        """解析 "宽x高" 或 "宽x高+左+上"(左/上可以为负，如 "1920x1080-1920+0")"""
+        match = _GEOMETRY.match(text)
+        if match is None:
+            raise ValueError(f"无效的区域: {text}，格式为 宽x高[+左+上]")
+        width, height, left, top = match.groups()
+        frame = cls(int(left.replace(" ", "")) if left else 0, int(top.replace(" ", "")) if top else 0,
+                    int(width), int(height))
+        if frame.width <= 0 or frame.height <= 0:
+            raise ValueError(f"无效的区域: {text}")
+        return frame
+
+    def __str__(self):
+        return f"{self.width}x{self.height}{self.left:+d}{self.top:+d}"
+
+
+class Reference(namedtuple("Reference", "frame anchor title fit")):
+    """
+    脚本坐标的参考区域
+    "param frame: 坐标所在的区域(录制时的屏幕或窗口位置)
+    "param anchor: screen / desktop / window
+    "param title: anchor 为 window 时查找的窗口标题
+    "param fit: stretch / uniform
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, frame, anchor=ANCHOR_SCREEN, title=None, fit=FIT_STRETCH):
+        if anchor not in ANCHORS:
+            raise ValueError(f"未知的参考区域: {anchor}")
+        if anchor == ANCHOR_WINDOW and not title:
+            raise ValueError("以窗口为参考时需要窗口标题")
+        if fit not in (FIT_STRETCH, FIT_UNIFORM):
+            raise ValueError(f"未知的缩放方式: {fit}")
+        return super().__new__(cls, Frame(*frame), anchor, title or None, fit)
+
+    def to_dict(self):
+        data = {"anchor": self.anchor, "left": self.frame.left, "top": self.frame.top,
+                "width": self.frame.width, "height": self.frame.height}
+        if self.title:
+            data["title"] = self.title
+        if self.fit != FIT_STRETCH:
+            data["fit"] = self.fit
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        frame = Frame(int(data.get("left", 0)), int(data.get("top", 0)), int(data["width"]), int(data["height"]))
+        return cls(frame, data.get("anchor", ANCHOR_SCREEN), data.get("title"), data.get("fit", FIT_STRETCH))
+
+
+class Transform(namedtuple("Transform", "sx sy dx dy")):
+    """仿射变换 x' = x * sx + dx, y' = y * sy + dy"""
+
+    __slots__ = ()
+
+    @classmethod
+    def between(cls, source, target, fit=FIT_STRETCH):
+        """把 source 区域映射到 target 区域的变换"""
+        sx = target.width / source.width
+        sy = target.height / source.height
+        if fit == FIT_UNIFORM:
+            sx = sy = min(sx, sy)
+        return cls(sx, sy, target.left - source.left * sx, target.top - source.top * sy)
+
+    @property
+    def identity(self):
+        return self.sx == 1 and self.sy == 1 and self.dx == 0 and self.dy == 0
+
+    def then(self, other):
+        """先做本变换再做 other"""
+        return Transform(self.sx * other.sx, self.sy * other.sy,
+                         self.dx * other.sx + other.dx, self.dy * other.sy + other.dy)
+
+    def point(self, x, y):
+        """映射坐标，结果取整到像素"""
+        return round(x * self.sx + self.dx), round(y * self.sy + self.dy)
+
+    def exact(self, x, y):
+        """映射坐标，保留小数(作为计划的起点，后续位置由它加上间隔再取整)"""
+        return _number(x * self.sx + self.dx), _number(y * self.sy + self.dy)
+
+    def vector(self, x, y):
+        """映射间隔(只缩放)，为保证多个间隔累加后不偏移，非整数的结果保留小数"""
+        return _number(x * self.sx), _number(y * self.sy)
+
+    def rect(self, region):
+        """映射 [x, y, 宽, 高] 区域"""
+        left, top, width, height = region
+        x0, y0 = self.point(left, top)
+        x1, y1 = self.point(left + width, top + height)
+        return [x0, y0, max(1, x1 - x0), max(1, y1 - y0)]
+
+    def frame(self, frame):
+        return Frame(*self.rect(frame))
+
+    def probes(self, probes):
+        """映射就绪检测点 [[x, y, r, g, b], ...]，颜色不变"""
+        return [list(self.point(probe[0], probe[1])) + list(probe[2:]) for probe in probes]
+
+    def extra(self, extra):
+        """映射步骤附加字段中的坐标(检测区域、就绪检测点)"""
+        if not extra or ("region" not in extra and "probes" not in extra):
+            return extra
+        extra = dict(extra)
+        if extra.get("region"):
+            extra["region"] = self.rect(extra["region"])
+        if extra.get("probes"):
+            extra["probes"] = self.probes(extra["probes"])
+        return extra
+
+    def arrays(self, xs, ys, types=None, skip=()):
+        """
+        一次映射整列坐标，返回新的 (xs, ys) 数组
+        "param xs, ys: array("q")
+        "param types: 与坐标对应的步骤类型编号数组，类型在 skip 中的步骤坐标保持不变
+        """
+        import numpy as np
+        x = np.frombuffer(xs, dtype=np.int64) if len(xs) else np.zeros(0, dtype=np.int64)
+        y = np.frombuffer(ys, dtype=np.int64) if len(ys) else np.zeros(0, dtype=np.int64)
+        new_x = np.rint(x * self.sx + self.dx).astype(np.int64)
+        new_y = np.rint(y * self.sy + self.dy).astype(np.int64)
+        if types is not None and skip and len(types):
+            keep = np.isin(np.frombuffer(types, dtype=np.uint8), np.asarray(skip, dtype=np.uint8))
+            new_x[keep] = x[keep]
+            new_y[keep] = y[keep]
+        return array("q", new_x.tobytes()), array("q", new_y.tobytes())
+
+
+def _number(value):
+    value = round(value, 6)
+    return int(value) if value == int(value) else value
+
+
+# ---- 当前显示布局 ----
+
+DisplayLayout = namedtuple("DisplayLayout", "screen desktop")
+
+
+def _virtual_desktop():
+    """Windows 上所有显示器组成的虚拟桌面(原点可能为负)；X11 的根窗口本身就覆盖所有显示器"""
+    if sys.platform != "win32":
+        return None
+    import ctypes
+    metric = ctypes.windll.user32.GetSystemMetrics
+    # SM_XVIRTUALSCREEN, SM_YVIRTUALSCREEN, SM_CXVIRTUALSCREEN, SM_CYVIRTUALSCREEN
+    return Frame(metric(76), metric(77), metric(78), metric(79))
+
+
+def read_layout():
+    """读取当前显示布局(主显示器和虚拟桌面)"""
+    import pyautogui
+    width, height = pyautogui.size()
+    screen = Frame(0, 0, int(width), int(height))
+    return DisplayLayout(screen, _virtual_desktop() or screen)
+
+
+def find_window(title):
+    """按标题查找窗口，返回其区域"""
+    try:
+        import pygetwindow
+    except ImportError:
+        raise LayoutError("以窗口为参考需要 pygetwindow(目前只支持 Windows 和 macOS)")
+    try:
+        windows = pygetwindow.getWindowsWithTitle(title)
+    except NotImplementedError:
+        raise LayoutError("当前系统不支持按标题查找窗口")
+    if not windows:
+        raise LayoutError(f"找不到窗口: {title}")
+    window = windows[0]
+    return Frame(window.left, window.top, window.width, window.height)
+
+
+class Display:
+    """
+    当前显示布局和由参考区域到当前区域的变换缓存
+    布局只在 refresh() 时重新读取，发生变化时才清空缓存
+    "param layout: 固定的布局(无界面运行或测试时使用，窗口参考也按主显示器处理)，None 表示读取真实屏幕
+    """
+
+    def __init__(self, layout=None):
+        self.fixed = layout is not None
+        self.layout = layout
+        self._transforms = {}
+
+    @classmethod
+    def for_backend(cls, backend_name, screen=None):
+        """
+        按输入后端创建：指定了 screen(Frame)时使用固定布局，真实屏幕后端读取当前布局，
+        其余后端返回 None(不映射坐标)
+        """
+        if screen is not None:
+            return cls(DisplayLayout(screen, screen))
+        if backend_name == "pyautogui":
+            return cls()
+        return None
+
+    def refresh(self):
+        """重新读取布局，返回是否发生了变化"""
+        if self.fixed:
+            return False
+        layout = read_layout()
+        if layout == self.layout:
+            return False
+        self.layout = layout
+        self._transforms.clear()
+        return True
+
+    def area(self, anchor=ANCHOR_SCREEN, title=None):
+        """当前布局中的主显示器、虚拟桌面或窗口区域"""
+        if self.layout is None:
+            self.refresh()
+        if anchor == ANCHOR_DESKTOP:
+            return self.layout.desktop
+        if anchor == ANCHOR_WINDOW and not self.fixed:
+            # 窗口可能随时移动，每次查找，变换按区域缓存
+            return find_window(title)
+        return self.layout.screen
+
+    def reference(self, anchor=ANCHOR_SCREEN, title=None, fit=FIT_STRETCH):
+        """以当前区域作为参考(保存在当前屏幕上录制的脚本时使用)"""
+        return Reference(self.area(anchor, title), anchor, title, fit)
+
+    def transform(self, reference):
+        """返回 (变换, 映射后的区域)"""
+        target = self.area(reference.anchor, reference.title)
+        key = (reference.frame, target, reference.fit)
+        cached = self._transforms.get(key)
+        if cached is None:
+            transform = Transform.between(reference.frame, target, reference.fit)
+            cached = self._transforms[key] = (transform, transform.frame(reference.frame))
+        return cached
+
+    def fit(self, script, default=None):
+        """
+        把脚本坐标映射到当前布局，返回是否做了映射
+        "param script: plan.Script，script.reference 为 None 时使用 default
+        "param default: 没有记录参考区域的脚本(旧脚本)的参考区域，None 表示不映射
+        """
+        reference = script.reference or default
+        if reference is None:
+            return False
+        transform, frame = self.transform(reference)
+        script.reference = reference._replace(frame=frame)
+        if transform.identity:
+            return False
+        script.transform(transform)
+        return True
@@ -0,0 +1,248 @@
+"""
+Description: Per-step timing metrics for script runs.
+The engine reports every phase of a step (jitter, action, wait, video/ready wait, loop interval) together with
+scheduled-vs-actual start and wait overshoot into fixed-bucket histograms. Observing a value is a bisect
+and a few additions; summaries are exported as JSON and Prometheus text at the end of a run or periodically.
+"""
+
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+
+# 直方图桶上界(秒)，覆盖毫秒级调度误差到小时级的视频等待
+DEFAULT_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                  1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+# 步骤阶段
+PHASE_JITTER = "jitter"
+PHASE_ACTION = "action"
+PHASE_WAIT = "wait"
+PHASE_VIDEO_WAIT = "video_wait"
+PHASE_READY_WAIT = "ready_wait"
+PHASE_LOOP_INTERVAL = "loop_interval"
+
+METRIC_PREFIX = "autoplay"
+
+
+class Histogram:
+    """固定桶直方图，counts[i] 为落在 (bounds[i-1], bounds[i]] 的次数，最后一个桶为 +Inf"""
+
+    __slots__ = ("bounds", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """按桶估计分位数(桶内线性插值)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.bounds[i - 1] if i > 0 else min(self.min, 0.0)
+                high = self.bounds[i] if i < len(self.bounds) else self.max
+                value = low + (high - low) * (rank - seen) / n
+                return min(max(value, self.min), self.max)
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+def _atomic_write(path, text):
+    """写入临时文件后替换，导出过程中读取方不会看到半个文件"""
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".metrics-", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class RunMetrics:
+    """
+    一次或多次执行的计时统计，设置到 StepRunner.metrics 后由引擎填充
+    "param json_path: JSON 摘要导出路径
+    "param prom_path: Prometheus 文本格式导出路径
+    "param export_interval: 执行中定期导出的间隔(秒)，None 表示只在执行结束时导出
+    "param gauges: 返回附加指标字典的函数(例如 MouseMonitor.stats)，导出时调用
+    """
+
+    def __init__(self, json_path=None, prom_path=None, export_interval=None, gauges=None,
+                 bounds=DEFAULT_BOUNDS, clock=time.monotonic):
+        self.json_path = json_path
+        self.prom_path = prom_path
+        self.export_interval = export_interval
+        self.gauges = gauges
+        self.bounds = bounds
+        self.clock = clock
+
+        # (指标名, 标签元组) -> Histogram
+        # 引擎线程添加新的键，导出可能在其他线程(如控制服务)进行：添加键和复制字典都持有锁
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.steps = {}
+        self.runs = 0
+        self.started_at = None
+        self.elapsed = 0.0
+        self._next_export = None
+        # 最近一次导出失败的原因，导出失败不影响脚本执行
+        self.export_error = None
+
+    def histogram(self, name, *labels):
+        """按名称和标签取直方图，labels 为 (键, 值) 对"""
+        key = (name, labels)
+        hist = self.histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self.histograms.setdefault(key, Histogram(self.bounds))
+        return hist
+
+    def phase(self, phase, step_type=None):
+        if step_type is None:
+            return self.histogram("phase_seconds", ("phase", phase))
+        return self.histogram("phase_seconds", ("phase", phase), ("type", step_type))
+
+    # ---- 引擎钩子 ----
+
+    def run_started(self):
+        self.runs += 1
+        self.started_at = self.clock()
+        if self.export_interval:
+            self._next_export = self.started_at + self.export_interval
+
+    def step_started(self, step_type, scheduled, actual):
+        """步骤开始，scheduled 为计划开始时间(上一次等待的截止时间)"""
+        count = self.steps.get(step_type)
+        if count is None:
+            with self._lock:
+                self.steps[step_type] = 1
+        else:
+            self.steps[step_type] = count + 1
+        if scheduled is not None:
+            self.histogram("start_delay_seconds").observe(actual - scheduled)
+
+    def overshoot(self, lateness):
+        """等待醒来比截止时间晚了多少"""
+        self.histogram("wait_overshoot_seconds").observe(lateness)
+
+    def step_finished(self, now):
+        """每个步骤结束时调用，到时间则定期导出"""
+        if self._next_export is not None and now >= self._next_export:
+            self._next_export = now + self.export_interval
+            self._safe_export()
+
+    def run_finished(self):
+        if self.started_at is not None:
+            self.elapsed += self.clock() - self.started_at
+            self.started_at = None
+        self._next_export = None
+        self._safe_export()
+
+    def _safe_export(self):
+        try:
+            self.export()
+            self.export_error = None
+        except OSError as e:
+            self.export_error = e
+
+    # ---- 导出 ----
+
+    def _snapshot(self):
+        """(步骤计数, 排好序的直方图列表) 的副本，可以在任意线程中调用"""
+        with self._lock:
+            return dict(self.steps), sorted(self.histograms.items())
+
+    def to_dict(self):
+        elapsed = self.elapsed
+        if self.started_at is not None:
+            elapsed += self.clock() - self.started_at
+        steps, items = self._snapshot()
+        histograms = {}
+        for (name, labels), hist in items:
+            key = name + _labels(labels)
+            histograms[key] = hist.summary()
+        data = {
+            "runs": self.runs,
+            "elapsed_seconds": elapsed,
+            "steps": steps,
+            "histograms": histograms,
+        }
+        if self.gauges is not None:
+            data["gauges"] = self.gauges()
+        return data
+
+    def to_prometheus(self):
+        steps, items = self._snapshot()
+        lines = []
+        lines.append(f"# TYPE {METRIC_PREFIX}_runs_total counter")
+        lines.append(f"{METRIC_PREFIX}_runs_total {self.runs}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_steps_total counter")
+        for step_type, n in sorted(steps.items()):
+            lines.append(f"{METRIC_PREFIX}_steps_total{_labels((('type', step_type),))} {n}")
+
+        declared = set()
+        for (name, labels), hist in items:
+            metric = f"{METRIC_PREFIX}_{name}"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, n in zip(self.bounds, hist.counts):
+                cumulative += n
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{metric}_bucket{_labels(labels + (('le', '+Inf'),))} {hist.count}")
+            lines.append(f"{metric}_sum{_labels(labels)} {hist.sum!r}")
+            lines.append(f"{metric}_count{_labels(labels)} {hist.count}")
+
+        if self.gauges is not None:
+            for key, value in sorted(self.gauges().items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {METRIC_PREFIX}_{key} gauge")
+                    lines.append(f"{METRIC_PREFIX}_{key} {value!r}")
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """写出 JSON 摘要和 Prometheus 文本文件(未设置路径的跳过)"""
+        if self.json_path:
+            _atomic_write(self.json_path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+        if self.prom_path:
+            _atomic_write(self.prom_path, self.to_prometheus())
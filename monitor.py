@@ -0,0 +1,94 @@
+"""
+Description: Adaptive mouse position monitor.
+Polls the pointer through root.after, speeding up while it moves and backing off while it is still,
+reports only real changes and stops polling entirely while suspended (minimized or playing).
+"""
+
+import time
+
+
+class MouseMonitor:
+    """
+    自适应鼠标位置监控
+    "param root: Tk 根窗口(只用到 after/after_cancel)
+    "param position: 获取鼠标位置的函数，返回 (x, y)
+    "param on_change: 位置变化时调用 on_change(x, y)
+    "param min_interval: 鼠标移动时的轮询间隔(毫秒)
+    "param max_interval: 鼠标静止时逐步退避到的最长间隔(毫秒)
+    "param backoff: 每次未变化时间隔放大的倍数
+    """
+
+    def __init__(self, root, position, on_change, min_interval=50, max_interval=1000, backoff=1.5):
+        self.root = root
+        self.position = position
+        self.on_change = on_change
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+        self.interval = min_interval
+        self.last = None
+        self._after_id = None
+        # 暂停原因集合，例如 "minimized"、"playing"，为空时才轮询
+        self._suspended = set()
+
+        # 统计
+        self.polls = 0
+        self.changes = 0
+        self.poll_time = 0.0
+        self.started_at = time.monotonic()
+
+    def start(self):
+        if self._after_id is None and not self._suspended:
+            self.interval = self.min_interval
+            self._poll()
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def suspend(self, reason):
+        """因 reason 暂停轮询"""
+        self._suspended.add(reason)
+        self.stop()
+
+    def resume(self, reason):
+        """解除 reason 导致的暂停，没有其他原因时恢复轮询"""
+        self._suspended.discard(reason)
+        self.start()
+
+    @property
+    def running(self):
+        return self._after_id is not None
+
+    def _poll(self):
+        self._after_id = None
+        if self._suspended:
+            return
+        start = time.perf_counter()
+        pos = tuple(self.position())
+        self.poll_time += time.perf_counter() - start
+        self.polls += 1
+
+        if pos != self.last:
+            self.last = pos
+            self.changes += 1
+            self.on_change(*pos)
+            # 鼠标在动，加快轮询
+            self.interval = self.min_interval
+        else:
+            self.interval = min(int(self.interval * self.backoff) + 1, self.max_interval)
+        self._after_id = self.root.after(self.interval, self._poll)
+
+    def stats(self):
+        """轮询频率和开销"""
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "polls": self.polls,
+            "changes": self.changes,
+            "interval_ms": self.interval if self.running else None,
+            "polls_per_second": self.polls / elapsed,
+            "poll_time_seconds": self.poll_time,
+            "mean_poll_ms": self.poll_time / self.polls * 1000 if self.polls else 0.0,
+        }
@@ -0,0 +1,544 @@
+"""
+Description: Compact step storage for scripts.
+IntervalPlan keeps only the parameters of an interval run (optionally a paged grid of courses) and
+produces its steps on demand, StepTable stores hand-made steps in typed arrays, and Script chains both
+behind a list-like interface so the GUI and the engine never unroll a large generated script.
+"""
+
+import sys
+from array import array
+from bisect import bisect_right
+
+# 步骤类型编码，StepTable 中只保存编号，未知类型(如旧脚本中的自定义类型)追加到各个表自己的类型表中
+STEP_TYPES = ("点击", "等待", "移动", "点击图像", "滚动")
+
+
+# 等待模式：固定时长，检测到视频结束为止(vision.VideoEndDetector)，或检测到页面就绪为止(vision.ReadyCheck)
+WAIT_FIXED = "fixed"
+WAIT_VIDEO_END = "video_end"
+WAIT_READY = "ready"
+
+# 就绪检测的默认颜色容差和最长检测时间(秒)
+READY_TOLERANCE = 24
+READY_TIMEOUT = 10.0
+
+# 不使用 x, y 的步骤类型，映射坐标时保持不变
+NO_POSITION_TYPES = ("等待", "点击图像")
+
+# 基本字段，其余字段(模板、检测区域、滚动格数等)作为附加字段保存
+BASE_FIELDS = ("type", "x", "y", "wait", "desc")
+
+# 翻页方式：在翻页位置滚动鼠标滚轮，或点击"下一页"按钮
+PAGE_SCROLL = "scroll"
+PAGE_CLICK = "click"
+
+
+def _multiple(dx, dy, vx, vy):
+    """求非负整数 t 使 t * (vx, vy) == (dx, dy)，不存在或不唯一时返回 None"""
+    if vx:
+        t, rest = divmod(dx, vx)
+    elif vy:
+        t, rest = divmod(dy, vy)
+    else:
+        return 0 if dx == 0 and dy == 0 else None
+    if rest or t < 0 or (t * vx, t * vy) != (dx, dy):
+        return None
+    return t
+
+
+# 坐标换算会改变的课程排列参数
+_ORIGIN_FIELDS = ("start_x", "start_y", "interval_x", "interval_y", "row_x", "row_y")
+
+
+class IntervalPlan:
+    """
+    间隔步骤计划：每个课程两个步骤，先点击课程位置选择视频，再点击播放位置播放
+    课程可以排成多行多列的网格，并按页翻页(每页之后插入一个滚动或点击"下一页"的步骤)
+    只保存参数，步骤按需生成，内存占用与课程数量无关
+    first/stop 用于表示计划的一部分(编辑生成的步骤时拆分计划)
+    """
+
+    __slots__ = ("start_x", "start_y", "play_x", "play_y", "interval_x", "interval_y",
+                 "course_count", "video_duration", "load_wait", "video_region", "durations",
+                 "ready_probes", "ready_tolerance", "ready_timeout",
+                 "columns", "row_x", "row_y", "page_size", "page_action", "page_x", "page_y",
+                 "page_scroll", "page_wait", "origin", "first", "stop")
+
+    def __init__(self, start_x, start_y, play_x, play_y, interval_x=0, interval_y=0,
+                 course_count=1, video_duration=300, load_wait=2, video_region=None,
+                 durations=None, ready_probes=None, ready_tolerance=READY_TOLERANCE,
+                 ready_timeout=READY_TIMEOUT, columns=0, row_x=0, row_y=0, page_size=0, page_action=PAGE_SCROLL,
+                 page_x=0, page_y=0, page_scroll=-5, page_wait=2, origin=None, first=0, stop=None):
+        if course_count <= 0:
+            raise ValueError("课程数量必须大于0")
+        if columns < 0 or page_size < 0:
+            raise ValueError("每行课程数和每页课程数不能小于0")
+        if page_action not in (PAGE_SCROLL, PAGE_CLICK):
+            raise ValueError(f"未知的翻页方式: {page_action}")
+        self.start_x = start_x
+        self.start_y = start_y
+        self.play_x = play_x
+        self.play_y = play_y
+        # 同一行中相邻课程的间隔
+        self.interval_x = interval_x
+        self.interval_y = interval_y
+        self.course_count = course_count
+        self.video_duration = video_duration
+        self.load_wait = load_wait
+        self.video_region = video_region
+        # 各课程的播放等待时间 {课程序号: 秒}，没有记录的课程使用 video_duration
+        self.durations = durations or None
+        # 选择视频后的就绪检测点 [[x, y, r, g, b], ...]，设置后 load_wait 只作为无法截图时的固定等待
+        self.ready_probes = ready_probes or None
+        self.ready_tolerance = ready_tolerance
+        self.ready_timeout = ready_timeout
+        # 网格：每行 columns 个课程(0 表示只有一行)，相邻两行的间隔为 (row_x, row_y)
+        self.columns = columns
+        self.row_x = row_x
+        self.row_y = row_y
+        # 翻页：每页 page_size 个课程(0 表示不翻页)，每页从起始位置重新排列
+        # 翻页步骤在 (page_x, page_y) 处滚动 page_scroll 格，或点击该位置的"下一页"按钮
+        self.page_size = page_size
+        self.page_action = page_action
+        self.page_x = page_x
+        self.page_y = page_y
+        self.page_scroll = page_scroll
+        self.page_wait = page_wait
+        # 坐标换算(mapped)前的课程排列参数，课程时长等按录制时的布局识别课程；None 表示没有换算过
+        self.origin = origin
+        self.first = first
+        self.stop = course_count * 2 + self.pages - 1 if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.first
+
+    @property
+    def pages(self):
+        if not self.page_size:
+            return 1
+        return -(-self.course_count // self.page_size)
+
+    def course_position(self, course):
+        """第 course 个课程(从0开始)的位置"""
+        slot = course % self.page_size if self.page_size else course
+        row, column = divmod(slot, self.columns) if self.columns else (0, slot)
+        return (self.start_x + self.interval_x * column + self.row_x * row,
+                self.start_y + self.interval_y * column + self.row_y * row)
+
+    def course_of(self, n):
+        """完整计划中第 n 个步骤对应的课程序号，翻页步骤返回 None"""
+        if not self.page_size:
+            return n >> 1
+        page, rest = divmod(n, self.page_size * 2 + 1)
+        if rest == self.page_size * 2:
+            return None
+        return page * self.page_size + (rest >> 1)
+
+    def locate_course(self, x, y, page=0):
+        """
+        由屏幕位置反推第 page 页上的课程序号，找不到或位置有歧义时返回 None
+        只按列数遍历，与课程数量无关
+        """
+        dx = x - self.start_x
+        dy = y - self.start_y
+        if not self.columns:
+            if not self.interval_x and not self.interval_y and (self.page_size or self.course_count) > 1:
+                # 所有课程在同一位置，无法区分
+                return None
+            slot = _multiple(dx, dy, self.interval_x, self.interval_y)
+        else:
+            slot = None
+            for column in range(self.columns):
+                row = _multiple(dx - self.interval_x * column, dy - self.interval_y * column,
+                                self.row_x, self.row_y)
+                if row is not None:
+                    slot = row * self.columns + column
+                    break
+        if slot is None or (self.page_size and slot >= self.page_size):
+            return None
+        course = page * self.page_size + slot if self.page_size else slot
+        return course if course < self.course_count else None
+
+    def page_step(self, page):
+        """第 page 页(从0开始)结束后翻到下一页的步骤"""
+        desc = f"翻到第{page + 2}页"
+        if self.page_action == PAGE_CLICK:
+            return {"type": "点击", "x": self.page_x, "y": self.page_y, "wait": self.page_wait, "desc": desc}
+        return {"type": "滚动", "x": self.page_x, "y": self.page_y, "wait": self.page_wait, "desc": desc,
+                "clicks": self.page_scroll}
+
+    def step(self, n):
+        """完整计划中第 n 个步骤(从0开始)"""
+        if self.page_size:
+            page, rest = divmod(n, self.page_size * 2 + 1)
+            if rest == self.page_size * 2:
+                return self.page_step(page)
+            course = page * self.page_size + (rest >> 1)
+        else:
+            rest = n
+            course = n >> 1
+        if rest & 1 == 0:
+            # 选择视频
+            x, y = self.course_position(course)
+            step = {"type": "点击", "x": round(x), "y": round(y), "wait": self.load_wait,
+                    "desc": f"选择视频{course + 1}"}
+            if self.ready_probes:
+                step["wait_mode"] = WAIT_READY
+                step["probes"] = [list(probe) for probe in self.ready_probes]
+                step["tolerance"] = self.ready_tolerance
+                step["timeout"] = self.ready_timeout
+            return step
+        wait = self.video_duration
+        if self.durations is not None:
+            wait = self.durations.get(course, wait)
+        step = {"type": "点击", "x": self.play_x, "y": self.play_y, "wait": wait,
+                "desc": f"播放视频{course + 1}"}
+        if self.video_region:
+            step["wait_mode"] = WAIT_VIDEO_END
+            step["region"] = list(self.video_region)
+        return step
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, stride = index.indices(len(self))
+            if stride != 1:
+                raise ValueError("不支持步长切片")
+            return self.sub_plan(self.first + start, self.first + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("步骤序号超出范围")
+        return self.step(self.first + index)
+
+    def __iter__(self):
+        step = self.step
+        for n in range(self.first, self.stop):
+            yield step(n)
+
+    def sub_plan(self, first, stop):
+        """同样参数、只包含完整计划中 [first, stop) 步骤的计划"""
+        params = {name: getattr(self, name) for name in self.__slots__}
+        params["first"] = first
+        params["stop"] = stop
+        return IntervalPlan(**params)
+
+    def mapped(self, transform):
+        """
+        坐标经 transform(layout.Transform)映射后的计划，只换算参数
+        起点和间隔可能变为小数，课程位置在生成步骤时才取整，排在后面的课程不会累积取整误差
+        """
+        params = self.to_dict()
+        if self.origin is None:
+            params["origin"] = {name: getattr(self, name) for name in _ORIGIN_FIELDS}
+        params["start_x"], params["start_y"] = transform.exact(self.start_x, self.start_y)
+        params["play_x"], params["play_y"] = transform.point(self.play_x, self.play_y)
+        params["interval_x"], params["interval_y"] = transform.vector(self.interval_x, self.interval_y)
+        params["row_x"], params["row_y"] = transform.vector(self.row_x, self.row_y)
+        params["page_x"], params["page_y"] = transform.point(self.page_x, self.page_y)
+        if self.video_region:
+            params["video_region"] = transform.rect(self.video_region)
+        if self.ready_probes:
+            params["ready_probes"] = transform.probes(self.ready_probes)
+        return IntervalPlan(**params)
+
+    def unmapped(self):
+        """坐标换算前的计划(课程排列相同，位置为录制时的整数坐标)"""
+        if self.origin is None:
+            return self
+        params = self.to_dict()
+        params.update(self.origin)
+        params["origin"] = None
+        return IntervalPlan(**params)
+
+    def to_dict(self):
+        """计划参数，用于保存"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        if data.get("durations"):
+            # JSON 中字典的键是字符串
+            data["durations"] = {int(k): float(v) for k, v in data["durations"].items()}
+        return cls(**data)
+
+
+def _pixel(value):
+    """坐标取最近的整数像素(换算或插值得到的小数坐标不截断)"""
+    return value if isinstance(value, int) else round(float(value))
+
+
+class StepTable:
+    """
+    手工步骤表：基本字段存放在类型化数组中，描述字符串做驻留，
+    只有带附加字段的步骤才占用一个字典
+    坐标四舍五入为整数像素，整数的等待时间读出时仍是整数
+    """
+
+    __slots__ = ("names", "codes", "types", "xs", "ys", "waits", "whole_waits", "descs", "extras")
+
+    def __init__(self, steps=()):
+        # 类型编号 -> 名称，每个表独立，未知类型不会影响其他表
+        self.names = list(STEP_TYPES)
+        self.codes = {name: code for code, name in enumerate(self.names)}
+        self.types = array("B")
+        self.xs = array("q")
+        self.ys = array("q")
+        self.waits = array("d")
+        self.whole_waits = array("B")
+        self.descs = []
+        self.extras = []
+        for step in steps:
+            self.append(step)
+
+    def __len__(self):
+        return len(self.types)
+
+    def type_code(self, name):
+        """步骤类型的编号，未知类型追加到本表的类型表中"""
+        code = self.codes.get(name)
+        if code is None:
+            if len(self.names) >= 256:
+                raise ValueError(f"步骤类型过多: {name}")
+            code = len(self.names)
+            self.names.append(name)
+            self.codes[name] = code
+        return code
+
+    def _split(self, step):
+        code = self.type_code(step["type"])
+        extra = {k: v for k, v in step.items() if k not in BASE_FIELDS} or None
+        wait = step.get("wait", 0)
+        return (code, _pixel(step.get("x", 0)), _pixel(step.get("y", 0)), float(wait), isinstance(wait, int),
+                sys.intern(str(step.get("desc", ""))), extra)
+
+    def append(self, step):
+        code, x, y, wait, whole, desc, extra = self._split(step)
+        self.types.append(code)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.waits.append(wait)
+        self.whole_waits.append(whole)
+        self.descs.append(desc)
+        self.extras.append(extra)
+
+    def insert(self, index, step):
+        code, x, y, wait, whole, desc, extra = self._split(step)
+        self.types.insert(index, code)
+        self.xs.insert(index, x)
+        self.ys.insert(index, y)
+        self.waits.insert(index, wait)
+        self.whole_waits.insert(index, whole)
+        self.descs.insert(index, desc)
+        self.extras.insert(index, extra)
+
+    def __setitem__(self, index, step):
+        code, x, y, wait, whole, desc, extra = self._split(step)
+        self.types[index] = code
+        self.xs[index] = x
+        self.ys[index] = y
+        self.waits[index] = wait
+        self.whole_waits[index] = whole
+        self.descs[index] = desc
+        self.extras[index] = extra
+
+    def __delitem__(self, index):
+        for column in (self.types, self.xs, self.ys, self.waits, self.whole_waits, self.descs, self.extras):
+            del column[index]
+
+    def __getitem__(self, index):
+        wait = self.waits[index]
+        step = {
+            "type": self.names[self.types[index]],
+            "x": self.xs[index],
+            "y": self.ys[index],
+            "wait": int(wait) if self.whole_waits[index] else wait,
+            "desc": self.descs[index],
+        }
+        extra = self.extras[index]
+        if extra:
+            step.update(extra)
+        return step
+
+    def __iter__(self):
+        for i in range(len(self.types)):
+            yield self[i]
+
+    def mapped(self, transform):
+        """坐标经 transform(layout.Transform)映射后的步骤表，整列坐标一次换算"""
+        table = StepTable()
+        table.names = list(self.names)
+        table.codes = dict(self.codes)
+        skip = [self.codes[name] for name in NO_POSITION_TYPES if name in self.codes]
+        table.types = array("B", self.types)
+        table.xs, table.ys = transform.arrays(self.xs, self.ys, self.types, skip)
+        table.waits = array("d", self.waits)
+        table.whole_waits = array("B", self.whole_waits)
+        table.descs = list(self.descs)
+        # 附加字段很少，逐个换算其中的检测区域和检测点
+        table.extras = [extra and transform.extra(extra) for extra in self.extras]
+        return table
+
+
+def iter_from(steps, start=0):
+    """从第 start 个步骤开始顺序产生步骤，Script 按段生成，其他序列按下标读取"""
+    method = getattr(steps, "iter_from", None)
+    if method is not None:
+        return method(start)
+    if start == 0:
+        return iter(steps)
+    return (steps[i] for i in range(start, len(steps)))
+
+
+class Script:
+    """
+    由若干段(IntervalPlan、lang.Program 或 StepTable)组成的脚本，对外表现为步骤字典的列表
+    编辑生成的步骤时只拆分对应的计划，不会展开整个计划
+    """
+
+    def __init__(self, steps=()):
+        self.segments = []
+        self._starts = None
+        # 坐标的参考区域(layout.Reference)，None 表示未记录(按当前屏幕的像素坐标处理)
+        self.reference = None
+        if steps:
+            self.extend(steps)
+
+    # ---- 段管理 ----
+
+    def _changed(self):
+        self._starts = None
+
+    def _offsets(self):
+        if self._starts is None:
+            starts = []
+            total = 0
+            for segment in self.segments:
+                starts.append(total)
+                total += len(segment)
+            self._starts = starts
+            self._total = total
+        return self._starts
+
+    def _locate(self, index):
+        """全局序号 -> (段序号, 段内序号)"""
+        starts = self._offsets()
+        if index < 0:
+            index += self._total
+        if not 0 <= index < self._total:
+            raise IndexError("步骤序号超出范围")
+        seg = bisect_right(starts, index) - 1
+        return seg, index - starts[seg]
+
+    def _table_at(self, seg, offset):
+        """
+        保证 (seg, offset) 处的步骤位于 StepTable 中，必要时把计划拆成三段
+        返回新的 (段序号, 段内序号)
+        """
+        segment = self.segments[seg]
+        if isinstance(segment, StepTable):
+            return seg, offset
+        pieces = []
+        if offset > 0:
+            pieces.append(segment[:offset])
+        pieces.append(StepTable([segment[offset]]))
+        if offset + 1 < len(segment):
+            pieces.append(segment[offset + 1:])
+        self.segments[seg:seg + 1] = pieces
+        self._changed()
+        return seg + (1 if offset > 0 else 0), 0
+
+    def _tail_table(self):
+        if not self.segments or not isinstance(self.segments[-1], StepTable):
+            self.segments.append(StepTable())
+        return self.segments[-1]
+
+    def segment_at(self, index):
+        """第 index 个步骤所在的段和段内序号，不拆分计划"""
+        seg, offset = self._locate(index)
+        return self.segments[seg], offset
+
+    # ---- 列表接口 ----
+
+    def __len__(self):
+        self._offsets()
+        return self._total
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        for segment in self.segments:
+            yield from segment
+
+    def iter_from(self, start):
+        """
+        从第 start 个步骤开始顺序产生步骤：只在起点做一次随机访问，
+        之后各段按自己的顺序方式生成(程序由解释器执行，不逐步二分查找)
+        """
+        if start >= len(self):
+            return
+        seg, offset = self._locate(start)
+        for segment in self.segments[seg:]:
+            if offset:
+                if isinstance(segment, StepTable):
+                    yield from (segment[i] for i in range(offset, len(segment)))
+                else:
+                    yield from segment[offset:]
+                offset = 0
+            else:
+                yield from segment
+
+    def __getitem__(self, index):
+        seg, offset = self._locate(index)
+        return self.segments[seg][offset]
+
+    def __setitem__(self, index, step):
+        seg, offset = self._table_at(*self._locate(index))
+        self.segments[seg][offset] = step
+
+    def pop(self, index=-1):
+        seg, offset = self._table_at(*self._locate(index))
+        table = self.segments[seg]
+        step = table[offset]
+        del table[offset]
+        if not len(table):
+            del self.segments[seg]
+        self._changed()
+        return step
+
+    def insert(self, index, step):
+        if index >= len(self):
+            self.append(step)
+            return
+        seg, offset = self._table_at(*self._locate(index))
+        self.segments[seg].insert(offset, step)
+        self._changed()
+
+    def append(self, step):
+        self._tail_table().append(step)
+        self._changed()
+
+    def extend(self, steps):
+        if isinstance(steps, StepTable) or hasattr(steps, "sub_plan"):
+            # IntervalPlan 和 lang.Program 等按需生成步骤的段
+            self.segments.append(steps)
+        elif isinstance(steps, Script):
+            self.segments.extend(steps.segments)
+        else:
+            table = self._tail_table()
+            for step in steps:
+                table.append(step)
+        self._changed()
+
+    def clear(self):
+        self.segments.clear()
+        self._changed()
+
+    def transform(self, transform):
+        """把所有段的坐标按 transform 映射，段的长度不变"""
+        self.segments = [segment.mapped(transform) for segment in self.segments]
+
+    def to_list(self):
+        """展开成步骤字典列表(用于保存为旧格式)"""
+        return list(self)
@@ -0,0 +1,269 @@
+"""
+Description: High-frequency action recorder.
+A sampling thread stores pointer positions at up to a few hundred Hz in a preallocated NumPy ring
+buffer, clicks come from a pynput listener when it is installed, and nothing touches the Tk thread.
+On stop, move paths are simplified with a vectorized Ramer-Douglas-Peucker pass into a small set of
+"移动"/"点击" steps whose waits are the measured gaps between actions.
+"""
+
+import time
+import threading
+
+import numpy as np
+
+# 缓冲区中每个样本的类型
+SAMPLE_MOVE = 0
+SAMPLE_CLICK = 1
+
+
+def rdp_mask(points, epsilon):
+    """
+    Ramer-Douglas-Peucker 路径简化，返回保留点的布尔掩码
+    用显式栈代替递归，每一段的点到直线距离用 NumPy 一次算出
+    """
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    pts = np.asarray(points, dtype=np.float64)
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        seg = pts[start + 1:end]
+        a = pts[start]
+        b = pts[end]
+        ab = b - a
+        norm = np.hypot(ab[0], ab[1])
+        if norm == 0:
+            dist = np.hypot(seg[:, 0] - a[0], seg[:, 1] - a[1])
+        else:
+            # 叉积求点到直线距离
+            dist = np.abs(ab[0] * (seg[:, 1] - a[1]) - ab[1] * (seg[:, 0] - a[0])) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > epsilon:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return keep
+
+
+class ActionRecorder:
+    """
+    鼠标动作录制器
+    "param position: 获取鼠标位置的函数
+    "param rate: 采样频率(Hz)
+    "param capacity: 环形缓冲区样本数，超出后覆盖最早的样本
+    "param listen_clicks: 是否用 pynput 监听点击(未安装时只录制移动)
+    """
+
+    def __init__(self, position, rate=200, capacity=200_000, listen_clicks=True):
+        if rate <= 0:
+            raise ValueError("采样频率必须大于0")
+        self.position = position
+        self.rate = rate
+        self.capacity = capacity
+        self.listen_clicks = listen_clicks
+
+        # 预分配缓冲区：时间、x、y、类型
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.coords = np.zeros((capacity, 2), dtype=np.int32)
+        self.kinds = np.zeros(capacity, dtype=np.uint8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._listener = None
+        # 不录制的屏幕区域 (left, top, width, height)，即录制程序自己的窗口
+        self.exclude = None
+        self.is_recording = False
+
+    # ---- 录制 ----
+
+    def _push(self, t, x, y, kind):
+        with self._lock:
+            i = self.count % self.capacity
+            self.times[i] = t
+            self.coords[i, 0] = x
+            self.coords[i, 1] = y
+            self.kinds[i] = kind
+            self.count += 1
+
+    def _excluded(self, x, y):
+        if self.exclude is None:
+            return False
+        left, top, width, height = self.exclude
+        return left <= x < left + width and top <= y < top + height
+
+    def _on_click(self, x, y, button, pressed):
+        # 点击录制程序自己的窗口(如"停止录制"按钮)不是要录制的动作
+        if pressed and self.is_recording and not self._excluded(x, y):
+            self._push(time.monotonic(), int(x), int(y), SAMPLE_CLICK)
+
+    def _sample(self):
+        interval = 1.0 / self.rate
+        next_time = time.monotonic()
+        last = None
+        while not self._stop.is_set():
+            pos = tuple(self.position())
+            # 鼠标不动时不写入缓冲区
+            if pos != last:
+                self._push(time.monotonic(), pos[0], pos[1], SAMPLE_MOVE)
+                last = pos
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay < 0:
+                next_time = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def start(self, exclude=None):
+        """
+        开始录制(清空之前的样本)
+        "param exclude: 不录制的区域 (left, top, width, height)，一般为录制程序的窗口
+        """
+        if self.is_recording:
+            return
+        self.exclude = exclude
+        self.count = 0
+        self._stop.clear()
+        self.is_recording = True
+        if self.listen_clicks:
+            try:
+                from pynput import mouse
+            except ImportError:
+                self._listener = None
+            else:
+                self._listener = mouse.Listener(on_click=self._on_click)
+                self._listener.start()
+        self._thread = threading.Thread(target=self._sample, name="ActionRecorder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止录制"""
+        if not self.is_recording:
+            return
+        self.is_recording = False
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        self._trim_tail()
+
+    def _trim_tail(self):
+        """去掉结尾移向排除区域(去按"停止录制")的移动路径：最后一次点击之后、终点在排除区域内的移动"""
+        if self.exclude is None:
+            return
+        times, coords, kinds = self.samples()
+        n = len(times)
+        if n == 0 or not self._excluded(*coords[-1].tolist()):
+            return
+        clicks = np.flatnonzero(kinds == SAMPLE_CLICK)
+        if len(clicks):
+            keep = clicks[-1] + 1
+        else:
+            # 没有点击时只去掉排除区域内的样本
+            left, top, width, height = self.exclude
+            inside = ((coords[:, 0] >= left) & (coords[:, 0] < left + width)
+                      & (coords[:, 1] >= top) & (coords[:, 1] < top + height))
+            outside = np.flatnonzero(~inside)
+            keep = outside[-1] + 1 if len(outside) else 0
+        with self._lock:
+            # 样本已按时间排好，重写到缓冲区开头
+            self.times[:keep] = times[:keep]
+            self.coords[:keep] = coords[:keep]
+            self.kinds[:keep] = kinds[:keep]
+            self.count = keep
+
+    @property
+    def clicks_supported(self):
+        """是否能自动捕获点击"""
+        return self._listener is not None
+
+    def samples(self):
+        """按时间顺序返回 (times, coords, kinds) 的副本"""
+        with self._lock:
+            n = min(self.count, self.capacity)
+            start = self.count - n
+            idx = (np.arange(start, self.count) % self.capacity)
+            times = self.times[idx]
+            coords = self.coords[idx]
+            kinds = self.kinds[idx]
+        # 两个线程写入的样本可能有轻微乱序
+        order = np.argsort(times, kind="stable")
+        return times[order], coords[order], kinds[order]
+
+    # ---- 转换成步骤 ----
+
+    def to_steps(self, epsilon=3.0, min_wait=0.0, desc="录制"):
+        """
+        把录制结果转换成步骤列表
+        移动路径按 epsilon 像素的误差简化，每个步骤的等待时间为到下一个动作的间隔
+        """
+        times, coords, kinds = self.samples()
+        if len(times) == 0:
+            return []
+
+        keep = np.zeros(len(times), dtype=bool)
+        clicks = np.flatnonzero(kinds == SAMPLE_CLICK)
+        keep[clicks] = True
+        # 以点击为界分段简化移动路径
+        bounds = np.concatenate(([0], clicks, [len(times) - 1]))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if end > start:
+                keep[start:end + 1] |= rdp_mask(coords[start:end + 1], epsilon)
+
+        idx = np.flatnonzero(keep)
+        # 点击位置上紧挨着的移动样本是多余的
+        if len(idx) > 1:
+            same = ((kinds[idx[:-1]] == SAMPLE_MOVE) & (kinds[idx[1:]] == SAMPLE_CLICK)
+                    & np.all(coords[idx[:-1]] == coords[idx[1:]], axis=1))
+            idx = np.concatenate((idx[:-1][~same], idx[-1:]))
+
+        waits = np.diff(times[idx], append=times[idx[-1]])
+        waits = np.maximum(np.round(waits, 3), min_wait)
+        steps = []
+        for n, (i, wait) in enumerate(zip(idx.tolist(), waits.tolist()), 1):
+            x, y = coords[i].tolist()
+            # 录制的动作按原样回放，不加抖动，保持录制时的间隔
+            if kinds[i] == SAMPLE_CLICK:
+                steps.append({"type": "点击", "x": x, "y": y, "wait": wait, "desc": f"{desc}点击{n}",
+                              "jitter": False})
+            else:
+                steps.append({"type": "移动", "x": x, "y": y, "wait": wait, "desc": f"{desc}移动{n}",
+                              "jitter": False})
+        return steps
+
+
+def capture_next_click(callback, fallback_delay=3.0, position=None):
+    """
+    捕获下一次鼠标点击的位置并调用 callback(x, y)(在监听线程中调用)
+    没有安装 pynput 时等待 fallback_delay 秒后使用当时的鼠标位置
+    返回 True 表示使用点击监听
+    """
+    try:
+        from pynput import mouse
+    except ImportError:
+        def delayed():
+            x, y = position()
+            callback(x, y)
+        timer = threading.Timer(fallback_delay, delayed)
+        timer.daemon = True
+        timer.start()
+        return False
+
+    def on_click(x, y, button, pressed):
+        if pressed:
+            callback(int(x), int(y))
+            return False
+
+    listener = mouse.Listener(on_click=on_click)
+    listener.daemon = True
+    listener.start()
+    return True
@@ -0,0 +1,110 @@
+"""
+Description: Drift-free deadline scheduler used by the step engine.
+Waits are planned against absolute time.monotonic() deadlines instead of summing short sleeps,
+so oversleeping never accumulates, Stop takes effect immediately and pause/resume shifts the plan.
+"""
+
+import time
+import threading
+
+
+class DeadlineScheduler:
+    """
+    基于绝对截止时间的等待调度器
+    "param clock: 单调时钟函数，默认为 time.monotonic
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._cancelled = False
+        self._paused = False
+        self._paused_at = None
+
+        # 当前计划的截止时间和上一次醒来时的延迟(用于漂移补偿)
+        self.deadline = None
+        self.lateness = 0.0
+        self.paused_total = 0.0
+
+    # ---- 控制 ----
+
+    def reset(self):
+        """清除取消/暂停状态，开始新的一次执行"""
+        with self._cond:
+            self._cancelled = False
+            self._paused = False
+            self._paused_at = None
+            self.deadline = None
+            self.lateness = 0.0
+            self.paused_total = 0.0
+
+    def cancel(self):
+        """立即唤醒并取消所有等待"""
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+
+    def pause(self):
+        """暂停：等待中的截止时间会顺延暂停的时长"""
+        with self._cond:
+            if not self._paused:
+                self._paused = True
+                self._paused_at = self.clock()
+                self._cond.notify_all()
+
+    def resume(self):
+        """继续执行"""
+        with self._cond:
+            if self._paused:
+                paused_for = self.clock() - self._paused_at
+                self.paused_total += paused_for
+                if self.deadline is not None:
+                    self.deadline += paused_for
+                self._paused = False
+                self._paused_at = None
+                self._cond.notify_all()
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    @property
+    def paused(self):
+        return self._paused
+
+    # ---- 等待 ----
+
+    def _block(self, timeout):
+        """在条件变量上阻塞，timeout 为 None 表示一直等到被通知(调用时已持有锁)"""
+        self._cond.wait(timeout)
+
+    def checkpoint(self):
+        """步骤之间调用：暂停时阻塞，返回 False 表示已取消"""
+        with self._cond:
+            while self._paused and not self._cancelled:
+                self._block(None)
+            return not self._cancelled
+
+    def wait(self, seconds):
+        """
+        从现在起等待 seconds 秒，扣除上一次等待的超时部分以补偿漂移
+        返回 False 表示等待被取消
+        """
+        now = self.clock()
+        return self.wait_until(now + seconds - self.lateness)
+
+    def wait_until(self, deadline):
+        """等待到绝对截止时间 deadline，返回 False 表示等待被取消"""
+        with self._cond:
+            self.deadline = deadline
+            while not self._cancelled:
+                if self._paused:
+                    self._block(None)
+                    continue
+                remaining = self.deadline - self.clock()
+                if remaining <= 0:
+                    break
+                self._block(remaining)
+            # 记录本次醒来比计划晚了多少，下一次等待会把它扣掉
+            self.lateness = max(0.0, self.clock() - self.deadline)
+            return not self._cancelled
@@ -0,0 +1,465 @@
+"""
+Description: Script file formats.
+Besides the original JSON file, scripts can be stored as JSON lines (.jsonl, one step or plan per line)
+or in a compact binary format (.aps, fixed-width step records plus interned string tables); script
+language sources (.apl, see lang.py) are compiled on load.
+All writers stream to a temporary file and rename it into place, readers stream step by step, and
+generated interval plans and compiled programs are stored as their parameters instead of unrolled steps.
+The area a script's coordinates refer to (see layout.py) is kept in the settings as "reference".
+
+Usage: python scriptio.py convert <input> <output>
+"""
+
+import os
+import sys
+import json
+import struct
+import argparse
+import tempfile
+from datetime import datetime
+
+from plan import IntervalPlan, Script, BASE_FIELDS
+from layout import Reference
+
+FORMAT_JSON = "json"
+FORMAT_JSONL = "jsonl"
+FORMAT_BINARY = "aps"
+FORMAT_SOURCE = "apl"
+
+EXTENSIONS = {
+    ".json": FORMAT_JSON,
+    ".jsonl": FORMAT_JSONL,
+    ".aps": FORMAT_BINARY,
+    ".apl": FORMAT_SOURCE,
+}
+
+# 按参数保存的段在 JSON lines 中的键
+SEGMENT_KEYS = ("plan", "program")
+
+JSONL_FORMAT_NAME = "autoplay-jsonl"
+
+# 二进制格式
+BIN_MAGIC = b"APS1"
+BIN_END_MAGIC = b"APSE"
+BIN_VERSION = 1
+BIN_HEADER = struct.Struct("<4sHH")
+# 段头：类型(0=步骤 1=计划 2=程序)、数量
+BIN_SEGMENT = struct.Struct("<BI")
+SEGMENT_STEPS = 0
+SEGMENT_PLAN = 1
+SEGMENT_PROGRAM = 2
+# 步骤记录：类型编号、描述编号、x、y、等待时间、附加字段编号
+BIN_RECORD = struct.Struct("<HIiidI")
+# 文件尾：字符串表位置、结束魔数
+BIN_FOOTER = struct.Struct("<Q4s")
+NO_EXTRA = 0xFFFFFFFF
+_U32 = struct.Struct("<I")
+
+
+def detect_format(path):
+    """按扩展名判断格式，未知扩展名按原 JSON 处理"""
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), FORMAT_JSON)
+
+
+def is_segment(item):
+    """是否为按参数保存的段(IntervalPlan 或 lang.Program)"""
+    return hasattr(item, "sub_plan")
+
+
+def segment_key(segment):
+    return "plan" if isinstance(segment, IntervalPlan) else "program"
+
+
+def _segment_from_dict(key, data):
+    if key == "plan":
+        return IntervalPlan.from_dict(data)
+    # lang 只在用到脚本语言时导入
+    from lang import Program
+    return Program.from_dict(data)
+
+
+# ---- 写入 ----
+
+class ScriptWriter:
+    """
+    流式写入脚本，先写到同目录的临时文件，close 时原子替换目标文件
+    用法：with open_writer(path, settings) as w: w.write_step(step) / w.write_plan(plan)
+    """
+
+    binary = False
+
+    def __init__(self, path, settings=None):
+        self.path = path
+        self.settings = settings or {}
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, self.temp_path = tempfile.mkstemp(prefix=".autoplay-", suffix=".tmp", dir=directory)
+        if self.binary:
+            self.file = os.fdopen(fd, "wb")
+        else:
+            self.file = os.fdopen(fd, "w", encoding="utf-8")
+        self.count = 0
+        self.start()
+
+    def start(self):
+        pass
+
+    def finish(self):
+        pass
+
+    def write_step(self, step):
+        raise NotImplementedError
+
+    def write_plan(self, plan):
+        """默认展开计划(或程序)逐步写入"""
+        for step in plan:
+            self.write_step(step)
+
+    def write_script(self, steps):
+        """写入 Script(按段，计划保持紧凑)或任意步骤序列"""
+        for segment in getattr(steps, "segments", [steps]):
+            if is_segment(segment):
+                self.write_plan(segment)
+            else:
+                for step in segment:
+                    self.write_step(step)
+
+    def close(self):
+        """完成写入并替换目标文件"""
+        try:
+            self.finish()
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        finally:
+            self.file.close()
+        # mkstemp 创建的文件只有属主可读写，沿用原文件或普通文件的权限
+        try:
+            mode = os.stat(self.path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(self.temp_path, mode)
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        """放弃写入，目标文件保持不变"""
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JSONWriter(ScriptWriter):
+    """原来的 JSON 格式，步骤数组逐个写出，不在内存中构造整个列表"""
+
+    def start(self):
+        head = json.dumps({"timestamp": datetime.now().isoformat(), "settings": self.settings},
+                          indent=2, ensure_ascii=False)
+        # 去掉结尾的 "}"，接着写 steps 数组
+        self.file.write(head[:-1].rstrip() + ',\n  "steps": [')
+
+    def write_step(self, step):
+        self.file.write(("\n    " if self.count == 0 else ",\n    ")
+                        + json.dumps(step, ensure_ascii=False))
+        self.count += 1
+
+    def finish(self):
+        self.file.write("\n  ]\n}\n" if self.count else "]\n}\n")
+
+
+class JSONLinesWriter(ScriptWriter):
+    """JSON lines：首行为文件头，之后每行一个步骤或一个计划"""
+
+    def start(self):
+        self.file.write(json.dumps({"format": JSONL_FORMAT_NAME, "version": 1,
+                                    "timestamp": datetime.now().isoformat(),
+                                    "settings": self.settings}, ensure_ascii=False) + "\n")
+
+    def write_step(self, step):
+        self.file.write(json.dumps(step, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def write_plan(self, plan):
+        self.file.write(json.dumps({segment_key(plan): plan.to_dict()}, ensure_ascii=False) + "\n")
+        self.count += len(plan)
+
+
+class _StringTable:
+    """字符串驻留表"""
+
+    def __init__(self):
+        self.index = {}
+        self.items = []
+
+    def get(self, text):
+        i = self.index.get(text)
+        if i is None:
+            i = len(self.items)
+            self.index[text] = i
+            self.items.append(text)
+        return i
+
+
+class BinaryWriter(ScriptWriter):
+    """
+    紧凑二进制格式：定长步骤记录，类型、描述和附加字段写在文件末尾的字符串表中
+    """
+
+    binary = True
+
+    def start(self):
+        self.types = _StringTable()
+        self.descs = _StringTable()
+        self.extras = _StringTable()
+        self._segment_pos = None
+        self._segment_count = 0
+        self.file.write(BIN_HEADER.pack(BIN_MAGIC, BIN_VERSION, 0))
+        self._write_blob(json.dumps(self.settings, ensure_ascii=False).encode("utf-8"))
+
+    def _write_blob(self, data):
+        self.file.write(_U32.pack(len(data)))
+        self.file.write(data)
+
+    def _end_segment(self):
+        """回填当前步骤段的数量"""
+        if self._segment_pos is not None:
+            end = self.file.tell()
+            self.file.seek(self._segment_pos)
+            self.file.write(BIN_SEGMENT.pack(SEGMENT_STEPS, self._segment_count))
+            self.file.seek(end)
+            self._segment_pos = None
+
+    def write_step(self, step):
+        if self._segment_pos is None:
+            self._segment_pos = self.file.tell()
+            self._segment_count = 0
+            self.file.write(BIN_SEGMENT.pack(SEGMENT_STEPS, 0))
+        extra = {k: v for k, v in step.items() if k not in BASE_FIELDS}
+        extra_index = (self.extras.get(json.dumps(extra, sort_keys=True, ensure_ascii=False))
+                       if extra else NO_EXTRA)
+        self.file.write(BIN_RECORD.pack(
+            self.types.get(step["type"]), self.descs.get(str(step.get("desc", ""))),
+            round(step.get("x", 0)), round(step.get("y", 0)), float(step.get("wait", 0)), extra_index))
+        self._segment_count += 1
+        self.count += 1
+
+    def write_plan(self, plan):
+        self._end_segment()
+        kind = SEGMENT_PLAN if segment_key(plan) == "plan" else SEGMENT_PROGRAM
+        self.file.write(BIN_SEGMENT.pack(kind, len(plan)))
+        self._write_blob(json.dumps(plan.to_dict(), ensure_ascii=False).encode("utf-8"))
+        self.count += len(plan)
+
+    def finish(self):
+        self._end_segment()
+        table_pos = self.file.tell()
+        for table in (self.types, self.descs, self.extras):
+            self.file.write(_U32.pack(len(table.items)))
+            for text in table.items:
+                self._write_blob(text.encode("utf-8"))
+        self.file.write(BIN_FOOTER.pack(table_pos, BIN_END_MAGIC))
+
+
+class SourceWriter(ScriptWriter):
+    """脚本语言源码，只能保存从源码加载且没有修改过的程序"""
+
+    def write_step(self, step):
+        raise ValueError("脚本已修改，不能保存为源码格式，请另存为 json / jsonl / aps")
+
+    def write_plan(self, plan):
+        if segment_key(plan) != "program" or self.count or len(plan) != plan.code.length:
+            raise ValueError("脚本已修改，不能保存为源码格式，请另存为 json / jsonl / aps")
+        if plan.transform is not None:
+            raise ValueError("脚本坐标已按当前屏幕换算，不能保存为源码格式，请另存为 json / jsonl / aps")
+        self.file.write(plan.source)
+        self.count += len(plan)
+
+
+WRITERS = {
+    FORMAT_JSON: JSONWriter,
+    FORMAT_JSONL: JSONLinesWriter,
+    FORMAT_BINARY: BinaryWriter,
+    FORMAT_SOURCE: SourceWriter,
+}
+
+
+def open_writer(path, settings=None, fmt=None):
+    return WRITERS[fmt or detect_format(path)](path, settings)
+
+
+def save(path, steps, settings=None, fmt=None):
+    """原子保存脚本，返回写入的步骤数；脚本记录了坐标参考区域时一并保存在设置中"""
+    reference = getattr(steps, "reference", None)
+    if reference is not None:
+        settings = dict(settings or {}, reference=reference.to_dict())
+    with open_writer(path, settings, fmt) as writer:
+        writer.write_script(steps)
+    return writer.count
+
+
+# ---- 读取 ----
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("settings", {}), iter(data.get("steps", []))
+
+
+def _read_jsonl(path):
+    f = open(path, "r", encoding="utf-8")
+    header = json.loads(f.readline() or "{}")
+    if header.get("format") != JSONL_FORMAT_NAME:
+        f.close()
+        raise ValueError(f"不是 AutoPlay JSON lines 脚本: {path}")
+
+    def items():
+        with f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                if "type" not in item and len(item) == 1 and next(iter(item)) in SEGMENT_KEYS:
+                    yield _segment_from_dict(*item.popitem())
+                else:
+                    yield item
+
+    return header.get("settings", {}), items()
+
+
+def _read_blob(f):
+    (size,) = _U32.unpack(f.read(_U32.size))
+    return f.read(size)
+
+
+def _read_binary(path):
+    f = open(path, "rb")
+    try:
+        magic, version, _ = BIN_HEADER.unpack(f.read(BIN_HEADER.size))
+        if magic != BIN_MAGIC or version != BIN_VERSION:
+            raise ValueError(f"不是 AutoPlay 二进制脚本: {path}")
+        settings = json.loads(_read_blob(f).decode("utf-8"))
+        body_start = f.tell()
+
+        # 先从文件尾读出字符串表
+        f.seek(-BIN_FOOTER.size, os.SEEK_END)
+        table_pos, end_magic = BIN_FOOTER.unpack(f.read(BIN_FOOTER.size))
+        if end_magic != BIN_END_MAGIC:
+            raise ValueError(f"二进制脚本不完整: {path}")
+        f.seek(table_pos)
+        tables = []
+        for _ in range(3):
+            (count,) = _U32.unpack(f.read(_U32.size))
+            tables.append([_read_blob(f).decode("utf-8") for _ in range(count)])
+        types, descs, extras = tables
+        extras = [json.loads(text) for text in extras]
+    except Exception:
+        f.close()
+        raise
+
+    def items():
+        with f:
+            f.seek(body_start)
+            record_size = BIN_RECORD.size
+            while f.tell() < table_pos:
+                kind, count = BIN_SEGMENT.unpack(f.read(BIN_SEGMENT.size))
+                if kind != SEGMENT_STEPS:
+                    data = json.loads(_read_blob(f).decode("utf-8"))
+                    yield _segment_from_dict("program" if kind == SEGMENT_PROGRAM else "plan", data)
+                    continue
+                # 分块读取记录
+                remaining = count
+                while remaining:
+                    n = min(remaining, 4096)
+                    for t, d, x, y, wait, e in BIN_RECORD.iter_unpack(f.read(n * record_size)):
+                        step = {"type": types[t], "x": x, "y": y, "wait": wait, "desc": descs[d]}
+                        if e != NO_EXTRA:
+                            step.update(extras[e])
+                        yield step
+                    remaining -= n
+
+    return settings, items()
+
+
+def _read_source(path):
+    from lang import Program
+    return {}, iter([Program.load(path)])
+
+
+READERS = {
+    FORMAT_JSON: _read_json,
+    FORMAT_JSONL: _read_jsonl,
+    FORMAT_BINARY: _read_binary,
+    FORMAT_SOURCE: _read_source,
+}
+
+
+def read_items(path, fmt=None):
+    """
+    返回 (settings, items)，items 是逐个产生步骤字典、IntervalPlan 或 Program 的迭代器
+    JSON lines 和二进制格式边读边产生，不会一次读入整个文件
+    """
+    return READERS[fmt or detect_format(path)](path)
+
+
+def iter_steps(path, fmt=None):
+    """逐个产生步骤字典(计划会被展开)"""
+    _, items = read_items(path, fmt)
+    for item in items:
+        if is_segment(item):
+            yield from item
+        else:
+            yield item
+
+
+def load(path, fmt=None):
+    """读取脚本，返回 (Script, settings)，script.reference 为设置中记录的坐标参考区域"""
+    settings, items = read_items(path, fmt)
+    script = Script()
+    if settings.get("reference"):
+        script.reference = Reference.from_dict(settings["reference"])
+    for item in items:
+        if is_segment(item):
+            script.extend(item)
+        else:
+            script.append(item)
+    return script, settings
+
+
+def convert(src, dst, src_fmt=None, dst_fmt=None):
+    """格式转换，返回步骤数"""
+    settings, items = read_items(src, src_fmt)
+    with open_writer(dst, settings, dst_fmt) as writer:
+        for item in items:
+            if is_segment(item):
+                writer.write_plan(item)
+            else:
+                writer.write_step(item)
+    return writer.count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AutoPlay 脚本格式工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    conv = sub.add_parser("convert", help="在 json / jsonl / aps / apl 格式之间转换")
+    conv.add_argument("input")
+    conv.add_argument("output")
+    conv.add_argument("--from", dest="src_fmt", choices=sorted(READERS), help="输入格式(默认按扩展名)")
+    conv.add_argument("--to", dest="dst_fmt", choices=sorted(WRITERS), help="输出格式(默认按扩展名)")
+    args = parser.parse_args(argv)
+
+    count = convert(args.input, args.output, args.src_fmt, args.dst_fmt)
+    print(f"已转换 {count} 个步骤: {args.input} -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""
+Description: Parallel multi-session runner.
+Each session is a separate process bound to its own virtual X display (Xvfb), so every worker has its own
+pointer and screen. Jobs (a script plus the account/browser command to start on that display) are handed
+out to free sessions, progress and metrics flow back over a queue, and failed workers are restarted and
+resume from their progress journal.
+"""
+
+import os
+import sys
+import time
+import queue
+import shutil
+import subprocess
+import traceback
+import multiprocessing
+
+# 虚拟显示编号从这里开始，避免与真实显示 :0 冲突
+DISPLAY_BASE = 100
+SESSIONS_DIR = "sessions"
+
+# 进度消息最短间隔(秒)，避免工作进程刷屏
+PROGRESS_INTERVAL = 0.5
+
+
+class VirtualDisplay:
+    """
+    Xvfb 虚拟显示
+    "param number: 显示编号，对应 DISPLAY=:number
+    "param size: 屏幕 (宽, 高, 色深)
+    """
+
+    def __init__(self, number, size=(1920, 1080, 24)):
+        self.number = number
+        self.size = size
+        self.process = None
+
+    @property
+    def name(self):
+        return f":{self.number}"
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, timeout=10.0):
+        if self.alive:
+            return
+        xvfb = shutil.which("Xvfb")
+        if xvfb is None:
+            raise RuntimeError("找不到 Xvfb，无法创建虚拟显示")
+        width, height, depth = self.size
+        self.process = subprocess.Popen(
+            [xvfb, self.name, "-screen", "0", f"{width}x{height}x{depth}", "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        socket = f"/tmp/.X11-unix/X{self.number}"
+        deadline = time.monotonic() + timeout
+        while not os.path.exists(socket):
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Xvfb {self.name} 启动失败")
+            if time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError(f"Xvfb {self.name} 启动超时")
+            time.sleep(0.05)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+
+class Job:
+    """
+    一个会话任务
+    "param name: 任务名(例如账号名)，也用作日志和指标目录名
+    "param script: 脚本文件路径
+    "param loop_count: 循环次数
+    "param loop_interval: 循环间隔(秒)
+    "param setup: 在该会话的显示上先启动的命令(例如用对应账号的配置目录打开浏览器)
+    "param setup_wait: 启动命令后等待多少秒再执行脚本
+    """
+
+    def __init__(self, name, script, loop_count=1, loop_interval=0, setup=None, setup_wait=5.0):
+        self.name = name
+        self.script = script
+        self.loop_count = loop_count
+        self.loop_interval = loop_interval
+        self.setup = setup
+        self.setup_wait = setup_wait
+        self.attempts = 0
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], data["script"], data.get("loops", 1), data.get("interval", 0),
+                   data.get("setup"), data.get("setup_wait", 5.0))
+
+
+def _session_main(slot, display, job, backend, directory, resume, messages):
+    """工作进程入口：绑定显示后导入输入后端并执行脚本"""
+    if display is not None:
+        # pyautogui 在导入时连接 DISPLAY，必须先设置
+        os.environ["DISPLAY"] = display
+    setup = None
+    try:
+        import scriptio
+        from engine import StepRunner, create_backend
+        from journal import ProgressJournal, script_fingerprint, journal_path, read_progress
+        from metrics import RunMetrics
+        from supervisor import Supervisor, IncidentLog
+        from layout import Display
+
+        steps, _ = scriptio.load(job.script)
+        display = Display.for_backend(backend)
+        if display is not None:
+            # 按本会话 Xvfb 显示的分辨率换算坐标
+            display.fit(steps)
+        if job.setup:
+            setup = subprocess.Popen(job.setup, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            time.sleep(job.setup_wait)
+
+        frame_source = None
+        if backend == "pyautogui":
+            from capture import ScreenFrameSource, FrameGrabber
+            frame_source = FrameGrabber(ScreenFrameSource())
+            frame_source.start()
+
+        last = [0.0]
+
+        def on_event(kind, info):
+            if kind == "incident":
+                messages.put(("incident", slot, job.name, info))
+            elif kind == "step_end":
+                now = time.monotonic()
+                if now - last[0] < PROGRESS_INTERVAL:
+                    return
+                last[0] = now
+                messages.put(("progress", slot, job.name,
+                              {"loop": info["loop"], "index": info["index"], "total": info["total"]}))
+
+        job_dir = os.path.join(directory, job.name)
+        runner = StepRunner(create_backend(backend), on_event=on_event, frame_source=frame_source)
+        runner.metrics = RunMetrics(os.path.join(job_dir, "metrics.json"),
+                                    os.path.join(job_dir, "metrics.prom"), export_interval=60)
+
+        # 重启的任务从进度日志记录的位置继续
+        fingerprint = script_fingerprint(steps)
+        path = journal_path(fingerprint, job_dir)
+        start_loop = start_index = 0
+        progress = read_progress(path, fingerprint) if resume else None
+        if progress is not None and progress.next_loop < job.loop_count:
+            start_loop, start_index = progress.next_loop, progress.next_index
+        runner.journal = journal = ProgressJournal(path, fingerprint, job.loop_count, len(steps),
+                                                   resume=(start_loop, start_index) != (0, 0))
+
+        # 步骤级的故障在会话内重试/恢复，进程崩溃才由 SessionPool 重启
+        supervisor = Supervisor(runner, incident_log=IncidentLog(os.path.join(job_dir, "incidents.jsonl")))
+        finished = False
+        try:
+            supervisor.run(steps, job.loop_count, job.loop_interval, start_loop, start_index)
+            finished = not runner.stopped
+        finally:
+            journal.close(finished)
+            if frame_source is not None:
+                frame_source.stop()
+        messages.put(("done", slot, job.name, runner.metrics.to_dict()))
+    except BaseException:
+        messages.put(("failed", slot, job.name, traceback.format_exc()))
+        sys.exit(1)
+    finally:
+        if setup is not None:
+            setup.terminate()
+
+
+class SessionPool:
+    """
+    多会话执行池
+    "param workers: 同时运行的会话数，默认为 CPU 核数
+    "param backend: 输入后端，pyautogui 时每个会话创建一个 Xvfb 显示
+    "param max_restarts: 每个任务失败后最多重启几次
+    "param directory: 进度日志和指标的保存目录，每个任务一个子目录
+    "param on_event: 回调 on_event(kind, info)，kind 为 progress / incident / done / failed / restart
+    """
+
+    def __init__(self, workers=None, backend="pyautogui", max_restarts=2, directory=SESSIONS_DIR,
+                 on_event=None, display_base=DISPLAY_BASE, display_size=(1920, 1080, 24)):
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.max_restarts = max_restarts
+        self.directory = directory
+        self.on_event = on_event
+        self.displays = []
+        if backend == "pyautogui":
+            self.displays = [VirtualDisplay(display_base + i, display_size) for i in range(self.workers)]
+        # spawn：子进程重新导入模块，DISPLAY 能在导入 pyautogui 之前设置好
+        self._context = multiprocessing.get_context("spawn")
+        self.results = {}
+        self.progress = {}
+
+    def emit(self, kind, **info):
+        if self.on_event is not None:
+            self.on_event(kind, info)
+
+    def _start(self, slot, job, messages, resume):
+        display = None
+        if self.displays:
+            self.displays[slot].start()
+            display = self.displays[slot].name
+        job.attempts += 1
+        process = self._context.Process(
+            target=_session_main, name=f"session-{slot}-{job.name}",
+            args=(slot, display, job, self.backend, self.directory, resume, messages))
+        process.start()
+        return process
+
+    def _handle(self, message):
+        kind, slot, name, info = message
+        if kind == "progress":
+            self.progress[name] = info
+            self.emit("progress", slot=slot, job=name, **info)
+        elif kind == "done":
+            self.results[name] = {"status": "done", "metrics": info}
+            self.emit("done", slot=slot, job=name)
+        elif kind == "incident":
+            self.emit("incident", slot=slot, job=name, **info)
+        elif kind == "failed":
+            self.results[name] = {"status": "failed", "error": info}
+
+    def _drain(self, messages):
+        while True:
+            try:
+                self._handle(messages.get(timeout=0.1))
+            except queue.Empty:
+                return
+
+    def run(self, jobs):
+        """执行所有任务，返回 {任务名: 结果}，结果为指标摘要或失败信息"""
+        pending = list(jobs)
+        pending.reverse()
+        running = {}
+        messages = self._context.Queue()
+        try:
+            while pending or running:
+                # 空闲的会话领取新任务
+                for slot in range(self.workers):
+                    if slot not in running and pending:
+                        job = pending.pop()
+                        running[slot] = (job, self._start(slot, job, messages, resume=False))
+
+                try:
+                    self._handle(messages.get(timeout=0.5))
+                except queue.Empty:
+                    pass
+
+                # 回收结束的进程，失败的任务从进度日志处重启
+                for slot, (job, process) in list(running.items()):
+                    if process.is_alive():
+                        continue
+                    process.join()
+                    del running[slot]
+                    # 进程退出前发出的消息可能还在队列里
+                    self._drain(messages)
+                    result = self.results.get(job.name)
+                    if result is not None and result["status"] == "done":
+                        continue
+                    if job.attempts <= self.max_restarts:
+                        self.emit("restart", slot=slot, job=job.name, attempt=job.attempts,
+                                  exitcode=process.exitcode)
+                        running[slot] = (job, self._start(slot, job, messages, resume=True))
+                    else:
+                        self.results.setdefault(job.name, {"status": "failed",
+                                                           "error": f"退出码 {process.exitcode}"})
+                        self.emit("failed", slot=slot, job=job.name,
+                                  error=self.results[job.name]["error"])
+        finally:
+            for job, process in running.values():
+                process.terminate()
+                process.join()
+            for display in self.displays:
+                display.stop()
+        return self.results
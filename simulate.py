@@ -0,0 +1,171 @@
+"""
+Description: Virtual-clock dry runs of AutoPlay scripts.
+The real StepRunner loop is executed against a scheduler whose clock only moves when a wait would block,
+with a no-op input backend, so a run that takes days finishes in milliseconds. Every loop of a script
+takes the same virtual time, so only the first two loops are executed and the rest is extrapolated exactly.
+"""
+
+from array import array
+
+from scheduler import DeadlineScheduler
+from engine import StepRunner, NullBackend
+from metrics import RunMetrics, PHASE_JITTER, PHASE_LOOP_INTERVAL
+
+
+class VirtualScheduler(DeadlineScheduler):
+    """虚拟时钟调度器：阻塞等待时直接把时钟拨到截止时间"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+        super().__init__(clock=self.time)
+
+    def time(self):
+        return self.now
+
+    def _block(self, timeout):
+        # 模拟中没有其他线程来唤醒，暂停等价于不等待
+        if timeout is not None and timeout > 0:
+            self.now += timeout
+
+
+class SimulatedRunner(StepRunner):
+    """在虚拟时钟上执行的引擎，抖动按固定耗时推进时钟而不逐点回放"""
+
+    def __init__(self, **options):
+        options.setdefault("scheduler", VirtualScheduler())
+        super().__init__(NullBackend(), **options)
+
+    def move_with_jitter(self, x, y, duration=None, jitter=None):
+        # 与 play_trajectory(end=...) 的耗时完全一致：轨迹结束时间 + 停顿
+        scheduler = self.scheduler
+        metrics = self.metrics
+        start = scheduler.clock()
+        if scheduler.wait_until(start + self.jitter_gen.cost(duration) * self.time_scale):
+            self.wait(self.settle)
+        self.backend.move_to(x, y)
+        if metrics is not None:
+            spent = scheduler.clock() - start
+            self._jitter_spent += spent
+            metrics.phase(PHASE_JITTER).observe(spent)
+
+    def _do_click_image(self, step):
+        # 模拟时没有屏幕，按步骤中记录的坐标点击
+        if self.jitter_duration > 0:
+            self.move_with_jitter(step["x"], step["y"])
+        self.backend.click(step["x"], step["y"])
+
+
+def _phase_totals(metrics):
+    """按阶段汇总耗时(秒)，action 不区分步骤类型"""
+    totals = {}
+    for (name, labels), hist in metrics.histograms.items():
+        if name == "phase_seconds":
+            phase = labels[0][1]
+            totals[phase] = totals.get(phase, 0.0) + hist.sum
+    return totals
+
+
+class SimulationResult:
+    """
+    模拟结果
+    "param total: 总耗时(秒)
+    "param phases: 各阶段耗时(秒)
+    "param executed: 执行的步骤总数
+    """
+
+    def __init__(self, steps, loop_count, start_loop, start_index, total, phases, executed,
+                 first_times, loop_times, loop_period):
+        self.steps = steps
+        self.loop_count = loop_count
+        self.start_loop = start_loop
+        self.start_index = start_index
+        self.total = total
+        self.phases = phases
+        self.executed = executed
+        # 第一次循环(可能从中间开始)和完整循环中每个步骤的开始时间
+        self._first_times = first_times
+        self._loop_times = loop_times
+        # 之后每次循环(含间隔)的周期
+        self.loop_period = loop_period
+
+    def start_time(self, loop, index):
+        """第 loop 次循环第 index 个步骤的开始时间(秒，从执行开始算)"""
+        if loop == self.start_loop:
+            return self._first_times[index - self.start_index]
+        return self._loop_times[index] + (loop - self.start_loop - 1) * self.loop_period
+
+    def timeline(self, limit=None):
+        """按时间顺序逐个产生 (开始时间, 循环序号, 步骤序号, 步骤)，不展开全部步骤"""
+        total = len(self.steps)
+        produced = 0
+        for loop in range(self.start_loop, self.loop_count):
+            first = self.start_index if loop == self.start_loop else 0
+            for i in range(first, total):
+                if limit is not None and produced >= limit:
+                    return
+                yield self.start_time(loop, i), loop, i, self.steps[i]
+                produced += 1
+
+    def summary(self):
+        return {
+            "total_seconds": self.total,
+            "executed": self.executed,
+            "loop_period_seconds": self.loop_period,
+            "phases": dict(self.phases),
+        }
+
+
+def simulate(steps, loop_count=1, loop_interval=0, start_loop=0, start_index=0, **options):
+    """
+    在虚拟时钟上模拟执行脚本，options 为 StepRunner 的抖动等参数(默认与界面一致)
+    视频结束检测的步骤按最长等待时间(步骤的 wait)计算
+    """
+    metrics = RunMetrics()
+    runner = SimulatedRunner(**options)
+    runner.metrics = metrics
+    scheduler = runner.scheduler
+    total_steps = len(steps)
+
+    first_times = array("d")
+    loop_times = array("d")
+    snapshot = {}
+
+    def on_event(kind, info):
+        if kind == "step_start":
+            (first_times if info["loop"] == start_loop else loop_times).append(scheduler.now)
+        elif kind == "loop_start" and info["loop"] == start_loop + 1:
+            snapshot["time"] = scheduler.now
+            snapshot["phases"] = _phase_totals(metrics)
+
+    runner.on_event = on_event
+    # 每次循环的耗时相同，只执行前两次，其余按周期推算
+    simulated = min(loop_count, start_loop + 2)
+    executed = runner.run(steps, simulated, loop_interval, start_loop, start_index)
+    end = scheduler.now
+    phases = _phase_totals(metrics)
+
+    remaining = loop_count - simulated
+    loop_start = snapshot.get("time", end)
+    if "time" in snapshot:
+        # 第二次循环的耗时加上一次循环间隔
+        interval = phases.get(PHASE_LOOP_INTERVAL, 0.0)
+        loop_period = end - loop_start + interval
+        if remaining:
+            before = snapshot["phases"]
+            for phase, value in phases.items():
+                phases[phase] = value + remaining * (value - before.get(phase, 0.0))
+            phases[PHASE_LOOP_INTERVAL] = phases.get(PHASE_LOOP_INTERVAL, 0.0) + remaining * interval
+    else:
+        loop_period = end
+    total = end + remaining * loop_period
+    executed += remaining * total_steps
+    return SimulationResult(steps, loop_count, start_loop, start_index, total, phases, executed,
+                            first_times, loop_times, loop_period)
+
+
+def format_duration(seconds):
+    """把秒数格式化为 时:分:秒"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,205 @@
+"""
+Description: Step list view for the script editor.
+Small scripts are shown as ordinary Treeview rows with stable item IDs and updated row by row;
+large scripts switch to a virtual viewport that only renders the rows currently visible.
+"""
+
+from tkinter import ttk
+
+# 超过该步骤数时切换到虚拟视图
+VIRTUAL_THRESHOLD = 2000
+
+
+def step_values(index, step):
+    """步骤在列表中显示的各列"""
+    return (index + 1, step["type"], step["x"], step["y"], step["wait"], step["desc"])
+
+
+class StepListView:
+    """
+    步骤列表，包装 Treeview 和滚动条
+    "param tree: 已创建好列的 Treeview
+    "param scrollbar: 纵向滚动条
+    "param steps: 步骤序列(Script 或列表)的获取函数，脚本对象被替换后仍能拿到最新的
+    """
+
+    def __init__(self, tree, scrollbar, steps):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.get_steps = steps
+        self.virtual = False
+
+        # 普通模式：与步骤一一对应的稳定 item ID
+        self.iids = []
+        self._next_iid = 0
+
+        # 虚拟模式：顶部步骤序号、可见行数和选中的步骤
+        self.top = 0
+        self.rows = 0
+        self.selected = None
+        self.rowheight = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+
+        tree.bind("<<TreeviewSelect>>", self._on_select)
+        tree.bind("<Configure>", self._on_configure)
+        tree.bind("<MouseWheel>", self._on_wheel)
+        tree.bind("<Button-4>", self._on_wheel)
+        tree.bind("<Button-5>", self._on_wheel)
+
+    # ---- 对外接口 ----
+
+    def refresh(self):
+        """脚本整体变化(加载、清除、生成)后重建显示"""
+        steps = self.get_steps()
+        self.tree.delete(*self.tree.get_children())
+        self.iids = []
+        self.selected = None
+        self.virtual = len(steps) > VIRTUAL_THRESHOLD
+        if self.virtual:
+            self.tree.configure(yscrollcommand=lambda *args: None)
+            self.scrollbar.configure(command=self._on_scroll)
+            self.rows = 0
+            self.top = 0
+            self._render()
+        else:
+            self.tree.configure(yscrollcommand=self.scrollbar.set)
+            self.scrollbar.configure(command=self.tree.yview)
+            for i, step in enumerate(steps):
+                iid = self._new_iid()
+                self.iids.append(iid)
+                self.tree.insert("", "end", iid=iid, values=step_values(i, step))
+
+    def step_inserted(self, index):
+        """在 index 处插入了一个步骤"""
+        steps = self.get_steps()
+        if self.virtual or len(steps) > VIRTUAL_THRESHOLD:
+            if not self.virtual:
+                self.refresh()
+                return
+            if self.selected is not None and self.selected >= index:
+                self.selected += 1
+            self._render()
+            return
+        iid = self._new_iid()
+        self.iids.insert(index, iid)
+        self.tree.insert("", index, iid=iid, values=step_values(index, steps[index]))
+        self._renumber(index + 1)
+
+    def step_updated(self, index):
+        """index 处的步骤被修改"""
+        if self.virtual:
+            if self.top <= index < self.top + self.rows:
+                self._render()
+            return
+        self.tree.item(self.iids[index], values=step_values(index, self.get_steps()[index]))
+
+    def step_removed(self, index):
+        """index 处的步骤被删除"""
+        if self.virtual:
+            if self.selected is not None:
+                if self.selected == index:
+                    self.selected = None
+                elif self.selected > index:
+                    self.selected -= 1
+            self._render()
+            return
+        self.tree.delete(self.iids.pop(index))
+        self._renumber(index)
+
+    def selected_index(self):
+        """当前选中步骤的序号，没有选中时返回 None"""
+        if self.virtual:
+            return self.selected
+        selection = self.tree.selection()
+        if not selection:
+            return None
+        return self.tree.index(selection[0])
+
+    def see(self, index):
+        """滚动到 index 处的步骤"""
+        if self.virtual:
+            if not self.top <= index < self.top + self.rows:
+                self.top = index
+                self._render()
+        elif 0 <= index < len(self.iids):
+            self.tree.see(self.iids[index])
+
+    # ---- 普通模式 ----
+
+    def _new_iid(self):
+        self._next_iid += 1
+        return f"s{self._next_iid}"
+
+    def _renumber(self, start):
+        """插入/删除后只更新受影响行的序号"""
+        for i in range(start, len(self.iids)):
+            self.tree.set(self.iids[i], "序号", i + 1)
+
+    # ---- 虚拟模式 ----
+
+    def _visible_rows(self):
+        # 减去表头高度
+        return max(1, (self.tree.winfo_height() - self.rowheight) // self.rowheight)
+
+    def _render(self):
+        """只渲染可见的行：复用固定数量的行，O(可见行数)"""
+        steps = self.get_steps()
+        total = len(steps)
+        rows = self._visible_rows()
+        self.top = max(0, min(self.top, total - rows))
+
+        children = self.tree.get_children()
+        if len(children) != rows:
+            self.tree.delete(*children)
+            children = [self.tree.insert("", "end", iid=f"row{r}") for r in range(rows)]
+            self.rows = rows
+
+        select = ()
+        for r, iid in enumerate(children):
+            index = self.top + r
+            if index < total:
+                self.tree.item(iid, values=step_values(index, steps[index]))
+                if index == self.selected:
+                    select = (iid,)
+            else:
+                self.tree.item(iid, values=())
+        self.tree.selection_set(select)
+
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _scroll_to(self, top):
+        if top != self.top:
+            self.top = top
+            self._render()
+
+    def _on_scroll(self, action, amount, unit=None):
+        total = len(self.get_steps())
+        if action == "moveto":
+            self._scroll_to(int(float(amount) * total))
+        elif action == "scroll":
+            step = self.rows if unit == "pages" else 1
+            self._scroll_to(max(0, self.top + int(amount) * step))
+
+    def _on_wheel(self, event):
+        if not self.virtual:
+            return None
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self._on_scroll("scroll", -3)
+        else:
+            self._on_scroll("scroll", 3)
+        return "break"
+
+    def _on_configure(self, event):
+        if self.virtual and self._visible_rows() != self.rows:
+            self._render()
+
+    def _on_select(self, event):
+        if not self.virtual:
+            return
+        selection = self.tree.selection()
+        if selection and selection[0].startswith("row"):
+            index = self.top + self.tree.index(selection[0])
+            if index < len(self.get_steps()):
+                self.selected = index
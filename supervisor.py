@@ -0,0 +1,344 @@
+"""
+Description: Supervisor for unattended runs.
+Wraps a StepRunner: failed steps (exceptions, steps overrunning their time budget, failed visual checks) are
+retried with bounded exponential backoff, then a recovery sequence is run (by default the current course is
+selected again), and only then is the step skipped or the run aborted. Every incident is appended to a
+JSON lines log, so an overnight run keeps going and leaves a record of what went wrong.
+"""
+
+import json
+import threading
+from datetime import datetime
+
+INCIDENT_LOG = "incidents.jsonl"
+
+# 放弃时的处理：跳过失败的步骤继续执行，或结束执行
+GIVE_UP_SKIP = "skip"
+GIVE_UP_ABORT = "abort"
+
+# 只记录、不影响执行的故障(就绪检测超时后按固定等待继续)
+ACTION_CONTINUE = "continue"
+
+# 故障总数上限：默认至少 100 次，长脚本按执行步骤数的 10% 放宽
+MIN_INCIDENTS = 100
+INCIDENT_RATIO = 0.1
+
+# 故障类型
+FAILURE_ERROR = "error"
+FAILURE_STALL = "stall"
+FAILURE_CHECK = "check"
+
+# 出现时立即结束执行、不重试也不恢复的异常(pyautogui 的角落保护：有人把鼠标推到了屏幕角落)
+STOP_EXCEPTIONS = ("FailSafeException",)
+
+# 引擎在每次尝试结束时发送的事件，由 Supervisor 在整个执行结束时统一发送
+_RUN_EVENTS = ("done", "stopped", "error")
+
+
+class CheckFailed(RuntimeError):
+    """步骤的检测没有通过(页面没有就绪、自定义检测返回 False)"""
+
+
+class IncidentLog:
+    """
+    故障记录，每行一个 JSON 对象
+    "param path: 文件路径，None 表示只保存在内存中
+    """
+
+    def __init__(self, path=INCIDENT_LOG):
+        self.path = path
+        self.incidents = []
+        self._lock = threading.Lock()
+
+    def write(self, incident):
+        incident = dict(incident, time=datetime.now().isoformat(timespec="seconds"))
+        with self._lock:
+            self.incidents.append(incident)
+            if self.path is not None:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(incident, ensure_ascii=False, default=str) + "\n")
+        return incident
+
+
+def course_start(steps, index):
+    """
+    默认的恢复位置：失败步骤属于生成的课程时，从该课程的"选择视频"步骤重新开始
+    其他步骤原样重试
+    """
+    segment_at = getattr(steps, "segment_at", None)
+    if segment_at is None:
+        return index
+    segment, offset = segment_at(index)
+    course_of = getattr(segment, "course_of", None)
+    if course_of is None:
+        return index
+    n = segment.first + offset
+    course = course_of(n)
+    if course is None:
+        return index
+    # 同一课程的选择步骤在当前步骤或前一个步骤
+    start = n - 1 if n > segment.first and course_of(n - 1) == course else n
+    return index - (n - start)
+
+
+class Supervisor:
+    """
+    带故障检测和自动恢复的执行器
+    "param runner: StepRunner
+    "param max_retries: 同一步骤连续失败后最多重试几次
+    "param backoff: 第一次重试前等待的秒数，之后每次翻倍
+    "param max_backoff: 重试等待的上限(秒)
+    "param stall_grace: 步骤超出预计耗时(抖动 + 等待/检测超时)多少秒视为卡住
+    "param recovery_steps: 重试用尽后先执行的恢复步骤(例如点击关闭弹窗)
+    "param rewind: rewind(steps, index) 返回恢复后重新开始的步骤序号，默认重新选择当前课程
+    "param max_recoveries: 同一步骤最多执行几次恢复
+    "param give_up: 恢复后仍失败时跳过该步骤(skip)或结束执行(abort)
+    "param max_incidents: 一次执行中需要处理的故障总数上限，超过后结束执行；
+        None 表示按脚本长度确定(至少 MIN_INCIDENTS 次，或执行步骤数的 INCIDENT_RATIO)
+    "param check: 可选的检测 check(step)，在步骤动作之后调用，返回 False 视为失败
+    "param ready_timeout_fails: 页面就绪检测超时是否视为失败(重试、重新选择课程)；
+        默认只记录故障，按固定等待的结果继续执行
+    "param incident_log: IncidentLog，默认写入 incidents.jsonl
+    "param poll: 卡住检测的检查间隔(秒)
+    """
+
+    def __init__(self, runner, max_retries=3, backoff=2.0, max_backoff=60.0, stall_grace=60.0,
+                 recovery_steps=(), rewind=course_start, max_recoveries=1, give_up=GIVE_UP_SKIP,
+                 max_incidents=None, check=None, ready_timeout_fails=False, incident_log=None, poll=1.0):
+        if give_up not in (GIVE_UP_SKIP, GIVE_UP_ABORT):
+            raise ValueError(f"未知的放弃方式: {give_up}")
+        self.runner = runner
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stall_grace = stall_grace
+        self.recovery_steps = list(recovery_steps)
+        self.rewind = rewind
+        self.max_recoveries = max_recoveries
+        self.give_up = give_up
+        self.max_incidents = max_incidents
+        self.check = check
+        self.ready_timeout_fails = ready_timeout_fails
+        self.log = incident_log if incident_log is not None else IncidentLog()
+        self.poll = poll
+
+        self._on_event = None
+        self._stop_requested = threading.Event()
+        self._lock = threading.Lock()
+        # 当前步骤的开始时间和允许的耗时，_started 为 None 表示不在监视中
+        self._started = None
+        self._budget = 0.0
+        self._paused_total = 0.0
+        # 监视线程发现卡住时记录已用的秒数
+        self._stalled = None
+        # 所有尝试中执行过的步骤数(失败的尝试没有返回值，按 step_end 事件计数)
+        self.executed = 0
+
+    # ---- 控制 ----
+
+    def stop(self):
+        """停止执行(包括正在进行的重试等待)"""
+        self._stop_requested.set()
+        self.runner.stop()
+
+    @property
+    def stopping(self):
+        """调用了 stop，或者有人直接停止了 runner(不是监视线程取消的)"""
+        return self._stop_requested.is_set() or (self.runner.stopped and self._stalled is None)
+
+    def emit(self, kind, **info):
+        if self._on_event is not None:
+            self._on_event(kind, info)
+
+    # ---- 故障检测 ----
+
+    def step_budget(self, step):
+        """步骤最长应该用多少秒：抖动 + 等待(检测类等待取超时时间) + 余量"""
+        wait = max(step.get("wait", 0), step.get("timeout", 0))
+        return self.runner.jitter_cost + wait * self.runner.time_scale + self.stall_grace
+
+    def _arm(self, budget):
+        scheduler = self.runner.scheduler
+        with self._lock:
+            self._paused_total = scheduler.paused_total
+            self._started = scheduler.clock()
+            self._budget = budget
+
+    def _disarm(self):
+        with self._lock:
+            self._started = None
+
+    def _observe(self, kind, info):
+        """在引擎线程中接收事件：记录步骤开始时间，执行检测"""
+        if kind == "loop_start" and self._stop_requested.is_set():
+            # runner.run 开始时会清除取消状态，在重新开始之前调用的 stop 要在这里重新生效
+            self.runner.stop()
+        elif kind == "step_start":
+            self._arm(self.step_budget(info["step"]))
+        elif kind == "loop_wait":
+            self._arm(info["interval"] * self.runner.time_scale + self.stall_grace)
+        elif kind == "step_end":
+            self.executed += 1
+            if self.check is not None and self.check(info["step"]) is False:
+                raise CheckFailed(f"步骤检测未通过: {info['step'].get('desc', '')}")
+        elif kind == "page_ready" and info["result"] == "timeout":
+            detail = f"页面没有就绪: {info['step'].get('desc', '')}"
+            if self.ready_timeout_fails:
+                raise CheckFailed(detail)
+            # 与没有监督时一样，超时后按固定等待继续，只留下记录
+            runner = self.runner
+            incident = {"failure": FAILURE_CHECK, "detail": detail, "loop": runner.current_loop,
+                        "index": runner.current_step_index, "desc": info["step"].get("desc", ""),
+                        "attempt": 1, "action": ACTION_CONTINUE}
+            self.log.write(incident)
+            self.emit("incident", **incident)
+        if kind in _RUN_EVENTS:
+            self._disarm()
+            return
+        self.emit(kind, **info)
+
+    def _watch(self, done):
+        """
+        监视线程：步骤超出允许的耗时后取消当前等待，由 run 按卡住处理
+        阻塞在输入操作中的步骤要等该操作返回后才能结束
+        """
+        scheduler = self.runner.scheduler
+        while not done.wait(self.poll):
+            with self._lock:
+                if self._started is None or scheduler.paused:
+                    continue
+                # 暂停的时间不算
+                elapsed = scheduler.clock() - self._started - (scheduler.paused_total - self._paused_total)
+                if elapsed <= self._budget:
+                    continue
+                self._stalled = elapsed
+                self._started = None
+            self.runner.stop()
+
+    # ---- 执行 ----
+
+    def _backoff(self, attempt):
+        return min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+
+    def _recover(self, steps, index):
+        """执行恢复步骤，返回重新开始的步骤序号，恢复步骤本身出错只记录不中断"""
+        runner = self.runner
+        for step in self.recovery_steps:
+            if self.stopping:
+                break
+            try:
+                runner.run_step(step)
+            except Exception as e:
+                self.log.write({"failure": FAILURE_ERROR, "detail": f"恢复步骤失败: {type(e).__name__}: {e}",
+                                "desc": step.get("desc", ""), "action": "recover"})
+                break
+            if step.get("wait", 0) > 0 and not runner.wait(step["wait"]):
+                break
+        return self.rewind(steps, index) if self.rewind is not None else index
+
+    def run(self, steps, loop_count=1, loop_interval=0, start_loop=0, start_index=0):
+        """
+        在监督下执行脚本，返回实际执行的步骤数
+        故障按 重试 -> 恢复 -> 跳过/结束 的顺序处理，结束时抛出最后一次的异常
+        """
+        runner = self.runner
+        self._stop_requested.clear()
+        self._on_event = runner.on_event
+        runner.on_event = self._observe
+        total = len(steps)
+        position = (start_loop, start_index)
+        # 失败位置 -> [重试次数, 恢复次数]
+        attempts = {}
+        incidents = 0
+        max_incidents = self.max_incidents
+        if max_incidents is None:
+            max_incidents = max(MIN_INCIDENTS, int(total * (loop_count - start_loop) * INCIDENT_RATIO))
+        self.executed = 0
+
+        done = threading.Event()
+        watcher = threading.Thread(target=self._watch, args=(done,), name="Supervisor", daemon=True)
+        watcher.start()
+        try:
+            while True:
+                self._stalled = None
+                error = None
+                try:
+                    runner.run(steps, loop_count, loop_interval, *position)
+                except Exception as e:
+                    error = e
+                self._disarm()
+                stalled = self._stalled
+
+                if error is None and stalled is None:
+                    self.emit("stopped" if runner.stopped else "done", executed=self.executed)
+                    return self.executed
+                if self.stopping:
+                    self.emit("stopped", executed=self.executed)
+                    return self.executed
+
+                loop, index = runner.current_loop, runner.current_step_index
+                if stalled is not None:
+                    kind, detail = FAILURE_STALL, f"步骤超时，已用 {stalled:.1f} 秒"
+                elif isinstance(error, CheckFailed):
+                    kind, detail = FAILURE_CHECK, str(error)
+                else:
+                    kind, detail = FAILURE_ERROR, f"{type(error).__name__}: {error}"
+
+                counts = attempts.setdefault((loop, index), [0, 0])
+                incidents += 1
+                step = steps[index] if index < total else {}
+                incident = {"failure": kind, "detail": detail, "loop": loop, "index": index,
+                            "desc": step.get("desc", ""), "attempt": counts[0] + 1}
+
+                if incidents > max_incidents or type(error).__name__ in STOP_EXCEPTIONS:
+                    # 紧急停止不能再移动和点击鼠标
+                    action = GIVE_UP_ABORT
+                elif counts[0] < self.max_retries:
+                    counts[0] += 1
+                    action = "retry"
+                    incident["backoff"] = self._backoff(counts[0])
+                elif counts[1] < self.max_recoveries:
+                    counts[1] += 1
+                    counts[0] = 0
+                    action = "recover"
+                elif self.give_up == GIVE_UP_ABORT:
+                    action = GIVE_UP_ABORT
+                else:
+                    action = GIVE_UP_SKIP
+
+                incident["action"] = action
+                self.log.write(incident)
+                self.emit("incident", **incident)
+
+                if action == GIVE_UP_ABORT:
+                    if error is None:
+                        error = RuntimeError(detail)
+                    self.emit("error", error=error, loop=loop, index=index)
+                    raise error
+                # 监视线程取消的等待在这里清除，清除之前或之后调用的 stop 照常生效
+                self._stalled = None
+                runner.scheduler.reset()
+                if self.stopping:
+                    self.emit("stopped", executed=self.executed)
+                    return self.executed
+                if action == "retry":
+                    if not runner.wait(incident["backoff"]) or self.stopping:
+                        self.emit("stopped", executed=self.executed)
+                        return self.executed
+                    position = (loop, index)
+                elif action == "recover":
+                    position = (loop, self._recover(steps, index))
+                    if self.stopping:
+                        self.emit("stopped", executed=self.executed)
+                        return self.executed
+                elif index + 1 < total:
+                    position = (loop, index + 1)
+                elif loop + 1 < loop_count:
+                    position = (loop + 1, 0)
+                else:
+                    self.emit("done", executed=self.executed)
+                    return self.executed
+        finally:
+            done.set()
+            runner.on_event = self._on_event
+            self._on_event = None
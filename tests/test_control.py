@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import scriptio
+from control import ScriptController, ControlServer
+from plan import Script
+
+
+@pytest.fixture
+def script_path(tmp_path, monkeypatch):
+    # 故障记录写在当前目录
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "script.jsonl")
+    scriptio.save(path, Script([{"type": "点击", "x": i, "y": 0, "wait": 0, "desc": f"步骤{i + 1}"}
+                                for i in range(3)]))
+    return path
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+        # 等待响应时收到的事件
+        self.events = []
+
+    async def send(self, cmd, **args):
+        self.next_id += 1
+        self.writer.write((json.dumps(dict(args, cmd=cmd, id=self.next_id)) + "\n").encode("utf-8"))
+        await self.writer.drain()
+        while True:
+            message = json.loads(await asyncio.wait_for(self.reader.readline(), 5))
+            if "event" not in message:
+                assert message["id"] == self.next_id
+                return message
+            self.events.append(message)
+
+    async def event(self, kind):
+        for message in self.events:
+            if message["event"] == kind:
+                self.events.remove(message)
+                return message
+        while True:
+            message = json.loads(await asyncio.wait_for(self.reader.readline(), 5))
+            if message.get("event") == kind:
+                return message
+
+
+def serve(test, flush_interval=0.01):
+    """启动服务，在同一个事件循环中执行 test(client, controller)"""
+    async def main():
+        controller = ScriptController("recording", time_scale=0, jitter_duration=0)
+        path = os.path.abspath("control.sock")
+        server = ControlServer(controller, path=path, flush_interval=flush_interval)
+        task = asyncio.create_task(server.serve_forever())
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_unix_connection(path)
+        try:
+            await test(Client(reader, writer), controller)
+        finally:
+            writer.close()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    asyncio.run(main())
+
+
+def test_load_run_and_status(script_path):
+    async def test(client, controller):
+        response = await client.send("load", path=script_path)
+        assert response == {"id": 1, "ok": True, "result": 3}
+        assert (await client.send("subscribe"))["result"]["state"] == "loaded"
+        await client.send("run", loops=2)
+        assert (await client.event("done"))["executed"] == 6
+        controller.thread.join(5)
+        status = (await client.send("status"))["result"]
+        assert status["state"] == "loaded" and status["result"] == "done"
+        clicks = [event[1] for event in controller.runner.backend.events if event[0] == "click"]
+        assert clicks == [0, 1, 2, 0, 1, 2]
+        metrics = (await client.send("metrics"))["result"]
+        assert metrics["steps"]["点击"] == 6
+    serve(test)
+
+
+def test_pause_resume_and_stop(script_path):
+    async def test(client, controller):
+        await client.send("load", path=script_path)
+        controller.runner.time_scale = 1
+        controller.steps[0] = {"type": "点击", "x": 0, "y": 0, "wait": 60, "desc": "长等待"}
+        await client.send("subscribe")
+        await client.send("run")
+        await client.event("step_end")
+        assert (await client.send("pause"))["ok"]
+        assert (await client.send("status"))["result"]["state"] == "paused"
+        await client.send("resume")
+        assert (await client.send("status"))["result"]["state"] == "running"
+        await client.send("stop")
+        await client.event("stopped")
+        controller.thread.join(5)
+        assert controller.result == "stopped"
+    serve(test)
+
+
+@pytest.mark.parametrize("request_, error", [
+    ({"cmd": "load"}, "load 需要 path"),
+    ({"cmd": "load", "path": 1}, "load 的 path 类型不正确"),
+    ({"cmd": "run", "loops": "2"}, "run 的 loops 类型不正确"),
+    ({"cmd": "run"}, "没有加载脚本"),
+    ({"cmd": "jump"}, "未知命令: jump"),
+])
+def test_invalid_commands_report_errors(script_path, request_, error):
+    async def test(client, controller):
+        response = await client.send(request_.pop("cmd"), **request_)
+        assert response == {"id": 1, "ok": False, "error": error}
+        # 出错后连接仍然可用
+        assert (await client.send("status"))["ok"]
+    serve(test)
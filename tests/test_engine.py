@@ -0,0 +1,75 @@
+import threading
+import time
+
+from engine import StepRunner, RecordingBackend
+from plan import Script
+
+
+def steps(n, wait=0):
+    return Script([{"type": "点击", "x": i, "y": 0, "wait": wait, "desc": f"步骤{i + 1}"} for i in range(n)])
+
+
+def clicks(backend):
+    return [event[1] for event in backend.events if event[0] == "click"]
+
+
+def test_run_executes_every_step_of_every_loop():
+    backend = RecordingBackend()
+    runner = StepRunner(backend, jitter_duration=0, time_scale=0)
+    assert runner.run(steps(3), loop_count=2) == 6
+    assert clicks(backend) == [0, 1, 2, 0, 1, 2]
+
+
+def test_run_resumes_from_start_position():
+    backend = RecordingBackend()
+    runner = StepRunner(backend, jitter_duration=0, time_scale=0)
+    assert runner.run(steps(4), loop_count=2, start_loop=1, start_index=2) == 2
+    assert clicks(backend) == [2, 3]
+
+
+def test_stop_ends_the_current_wait():
+    backend = RecordingBackend()
+    started = threading.Event()
+    runner = StepRunner(backend, jitter_duration=0, time_scale=1,
+                        on_event=lambda kind, info: kind == "step_end" and started.set())
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("executed", runner.run(steps(3, wait=60))))
+    thread.start()
+    assert started.wait(5)
+    begin = time.monotonic()
+    runner.stop()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert time.monotonic() - begin < 2
+    assert runner.stopped
+    assert result["executed"] == 1
+    assert clicks(backend) == [0]
+
+
+def test_pause_holds_the_next_step_until_resume():
+    backend = RecordingBackend()
+    paused = threading.Event()
+
+    def on_event(kind, info):
+        if kind == "step_end" and info["index"] == 0:
+            runner.pause()
+            paused.set()
+
+    runner = StepRunner(backend, jitter_duration=0, time_scale=0, on_event=on_event)
+    thread = threading.Thread(target=runner.run, args=(steps(3),))
+    thread.start()
+    assert paused.wait(5)
+    time.sleep(0.2)
+    assert runner.paused
+    assert clicks(backend) == [0]
+    runner.resume()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert clicks(backend) == [0, 1, 2]
+
+
+def test_recorded_clicks_skip_jitter():
+    backend = RecordingBackend()
+    runner = StepRunner(backend, jitter_duration=0.05, time_scale=0, jitter_seed=1)
+    runner.run(Script([{"type": "点击", "x": 5, "y": 6, "wait": 0, "desc": "", "jitter": False}]))
+    assert backend.events == [("click", 5, 6)]
@@ -0,0 +1,93 @@
+import pytest
+
+from lang import Program, ScriptSyntaxError
+from plan import IntervalPlan, Script, StepTable, iter_from
+
+SOURCE = """
+let left = 100
+repeat 3 as i
+    click left, 200 + i * 40 wait 2 desc "选择视频{i + 1}"
+    repeat 0
+        click 1, 1
+    end
+    repeat 2 as j
+        move i * 10 + j, j wait 0.5
+    end
+end
+wait 5 desc "结束"
+"""
+
+
+def mixed_script():
+    script = Script()
+    script.extend([{"type": "点击", "x": 1, "y": 2, "wait": 1, "desc": "开始"}])
+    script.extend(Program(SOURCE))
+    script.extend(IntervalPlan(100, 200, 800, 600, 0, 40, 4, 300, 2))
+    script.append({"type": "等待", "x": 0, "y": 0, "wait": 3, "desc": "结束"})
+    return script
+
+
+def test_program_random_access_matches_iteration():
+    program = Program(SOURCE)
+    steps = list(program)
+    assert len(steps) == len(program) == 3 * 3 + 1
+    assert [program[i] for i in range(len(program))] == steps
+    assert program[-1] == steps[-1]
+    assert steps[0] == {"type": "点击", "x": 100, "y": 200, "wait": 2, "desc": "选择视频1"}
+    assert steps[5] == {"type": "移动", "x": 11, "y": 1, "wait": 0.5, "desc": ""}
+
+
+def test_program_slices_iterate_from_their_first_step():
+    program = Program(SOURCE)
+    steps = list(program)
+    for start in range(len(steps) + 1):
+        for stop in range(start, len(steps) + 1):
+            assert list(program[start:stop]) == steps[start:stop]
+
+
+def test_script_random_access_matches_iteration():
+    script = mixed_script()
+    steps = list(script)
+    assert len(steps) == len(script)
+    assert [script[i] for i in range(len(script))] == steps
+    for start in range(len(steps) + 1):
+        assert list(iter_from(script, start)) == steps[start:]
+
+
+def test_editing_a_generated_step_splits_only_that_plan():
+    script = mixed_script()
+    steps = list(script)
+    edited = {"type": "移动", "x": 7, "y": 8, "wait": 1, "desc": "编辑"}
+    script[12] = edited
+    steps[12] = edited
+    script.insert(3, edited)
+    steps.insert(3, edited)
+    assert script.pop(20) == steps.pop(20)
+    assert list(script) == steps
+    assert [script[i] for i in range(len(script))] == steps
+
+
+def test_computed_coordinates_are_rounded():
+    assert list(Program("repeat 2 as i\n    click i * 1.5, 0.6\nend\n")) == [
+        {"type": "点击", "x": 0, "y": 1, "wait": 0, "desc": ""},
+        {"type": "点击", "x": 2, "y": 1, "wait": 0, "desc": ""},
+    ]
+
+
+def test_power_is_rejected():
+    with pytest.raises(ScriptSyntaxError):
+        Program("click 9 ** 9 ** 9 ** 9, 1\n")
+
+
+def test_step_table_rounds_coordinates_and_keeps_integer_waits():
+    table = StepTable([{"type": "点击", "x": 10.6, "y": 3.4, "wait": 2, "desc": ""},
+                       {"type": "等待", "x": 0, "y": 0, "wait": 2.5, "desc": ""}])
+    assert table[0]["x"] == 11 and table[0]["y"] == 3
+    assert table[0]["wait"] == 2 and isinstance(table[0]["wait"], int)
+    assert table[1]["wait"] == 2.5
+
+
+def test_unknown_step_types_stay_in_their_table():
+    table = StepTable([{"type": "自定义", "x": 0, "y": 0, "wait": 0, "desc": ""}])
+    assert table[0]["type"] == "自定义"
+    assert "自定义" not in StepTable().names
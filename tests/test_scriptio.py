@@ -0,0 +1,61 @@
+import pytest
+
+import scriptio
+from lang import Program
+from layout import Frame, Reference, ANCHOR_WINDOW
+from plan import IntervalPlan, Script
+
+SOURCE = 'repeat 3 as i\n    click 100, 200 + i * 40 wait 2 desc "选择视频{i + 1}"\nend\n'
+
+
+def sample_script():
+    script = Script()
+    script.extend([
+        {"type": "点击", "x": 1, "y": 2, "wait": 1, "desc": "开始"},
+        {"type": "点击", "x": 3, "y": 4, "wait": 30, "desc": "播放",
+         "wait_mode": "video_end", "region": [0, 0, 100, 50]},
+    ])
+    script.extend(IntervalPlan(100, 200, 800, 600, 0, 40, 5, 300, 2))
+    script.extend(Program(SOURCE))
+    script.append({"type": "滚动", "x": 10, "y": 20, "wait": 0.5, "desc": "翻页", "clicks": -3})
+    return script
+
+
+@pytest.mark.parametrize("fmt", [scriptio.FORMAT_JSON, scriptio.FORMAT_JSONL, scriptio.FORMAT_BINARY])
+def test_round_trip(tmp_path, fmt):
+    script = sample_script()
+    script.reference = Reference(Frame(0, 0, 1920, 1080), ANCHOR_WINDOW, "课程")
+    path = str(tmp_path / ("script." + fmt))
+    assert scriptio.save(path, script, {"loop": 3}) == len(script)
+    loaded, settings = scriptio.load(path)
+    assert settings["loop"] == 3
+    assert loaded.reference == script.reference
+    assert list(loaded) == list(script)
+
+
+@pytest.mark.parametrize("fmt", [scriptio.FORMAT_JSONL, scriptio.FORMAT_BINARY])
+def test_compact_formats_keep_generated_segments(tmp_path, fmt):
+    path = str(tmp_path / ("script." + fmt))
+    scriptio.save(path, sample_script())
+    loaded, _ = scriptio.load(path)
+    kinds = [type(segment).__name__ for segment in loaded.segments]
+    assert "IntervalPlan" in kinds and "Program" in kinds
+
+
+def test_source_round_trip(tmp_path):
+    path = str(tmp_path / "script.apl")
+    script = Script()
+    script.extend(Program(SOURCE))
+    scriptio.save(path, script)
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == SOURCE
+    loaded, _ = scriptio.load(path)
+    assert list(loaded) == list(script)
+
+
+def test_edited_program_cannot_be_saved_as_source(tmp_path):
+    script = Script()
+    script.extend(Program(SOURCE))
+    script[0] = {"type": "点击", "x": 0, "y": 0, "wait": 0, "desc": ""}
+    with pytest.raises(ValueError):
+        scriptio.save(str(tmp_path / "script.apl"), script)
@@ -0,0 +1,87 @@
+import pytest
+
+from engine import StepRunner, RecordingBackend
+from plan import Script
+from supervisor import Supervisor, IncidentLog, GIVE_UP_ABORT
+
+
+class FailSafeException(Exception):
+    """与 pyautogui 的角落保护同名"""
+
+
+class FailingBackend(RecordingBackend):
+    """点击 fail_x 时抛出 error"""
+
+    def __init__(self, fail_x, error=RuntimeError):
+        super().__init__()
+        self.fail_x = fail_x
+        self.error = error
+
+    def click(self, x, y):
+        if x == self.fail_x:
+            raise self.error("点击失败")
+        super().click(x, y)
+
+
+def steps(n):
+    return Script([{"type": "点击", "x": i, "y": 0, "wait": 0, "desc": f"步骤{i + 1}"} for i in range(n)])
+
+
+def supervisor(backend, **options):
+    runner = StepRunner(backend, jitter_duration=0, time_scale=0)
+    return Supervisor(runner, backoff=0, poll=0.01, incident_log=IncidentLog(None), **options)
+
+
+def clicks(backend):
+    return [event[1] for event in backend.events if event[0] == "click"]
+
+
+def test_retry_then_recover_then_skip():
+    backend = FailingBackend(2)
+    recovery = [{"type": "点击", "x": 99, "y": 0, "wait": 0, "desc": "恢复"}]
+    sup = supervisor(backend, max_retries=2, max_recoveries=1, recovery_steps=recovery)
+    assert sup.run(steps(5)) == 4
+    actions = [incident["action"] for incident in sup.log.incidents]
+    assert actions == ["retry", "retry", "recover", "retry", "retry", "skip"]
+    assert all(incident["index"] == 2 for incident in sup.log.incidents)
+    assert clicks(backend) == [0, 1, 99, 3, 4]
+
+
+def test_give_up_abort_raises_the_last_error():
+    backend = FailingBackend(1)
+    sup = supervisor(backend, max_retries=1, max_recoveries=0, give_up=GIVE_UP_ABORT)
+    with pytest.raises(RuntimeError):
+        sup.run(steps(3))
+    assert [incident["action"] for incident in sup.log.incidents] == ["retry", GIVE_UP_ABORT]
+    assert clicks(backend) == [0]
+
+
+def test_fail_safe_aborts_without_retrying():
+    backend = FailingBackend(1, FailSafeException)
+    recovery = [{"type": "点击", "x": 99, "y": 0, "wait": 0, "desc": "恢复"}]
+    sup = supervisor(backend, recovery_steps=recovery)
+    with pytest.raises(FailSafeException):
+        sup.run(steps(3))
+    assert [incident["action"] for incident in sup.log.incidents] == [GIVE_UP_ABORT]
+    assert clicks(backend) == [0]
+
+
+def test_failed_check_is_retried():
+    results = iter([True, False, True, True])
+    sup = supervisor(RecordingBackend(), check=lambda step: next(results))
+    assert sup.run(steps(3)) == 4
+    assert [incident["failure"] for incident in sup.log.incidents] == ["check"]
+
+
+def test_stop_before_restart_is_not_lost():
+    backend = FailingBackend(1)
+    sup = supervisor(backend)
+
+    def on_event(kind, info):
+        if kind == "incident":
+            sup.stop()
+
+    sup.runner.on_event = on_event
+    sup.run(steps(3))
+    assert clicks(backend) == [0]
+    assert len(sup.log.incidents) == 1
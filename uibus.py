@@ -0,0 +1,81 @@
+"""
+Description: Thread-safe message bus from worker threads to the Tk main loop.
+Workers append events to a deque without ever blocking; a single root.after drain loop on the Tk
+thread delivers them, keeping only the latest of the high-frequency progress events per frame.
+"""
+
+from collections import deque
+
+# 在主线程中执行函数的事件
+CALL = "call"
+
+
+class UIBus:
+    """
+    工作线程到界面的事件队列
+    "param root: Tk 根窗口
+    "param handler: 在 Tk 线程中处理事件的函数 handler(kind, info)
+    "param interval: 刷新间隔(毫秒)，决定最高重绘频率
+    "param coalesce: 可以合并的事件类型，同一帧内只保留最后一个
+    """
+
+    def __init__(self, root, handler, interval=50, coalesce=()):
+        self.root = root
+        self.handler = handler
+        self.interval = interval
+        self.coalesce = frozenset(coalesce)
+        # deque 的 append/popleft 是原子操作，工作线程无需加锁
+        self._queue = deque()
+        self._after_id = None
+
+        # 统计
+        self.delivered = 0
+        self.dropped = 0
+
+    def post(self, kind, info=None):
+        """投递事件，可在任意线程调用，不会阻塞"""
+        self._queue.append((kind, info))
+
+    def call(self, func, *args):
+        """在 Tk 线程中执行 func(*args)，例如弹出对话框、更新按钮状态"""
+        self.post(CALL, (func, args))
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval, self._drain)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _deliver(self, kind, info):
+        self.delivered += 1
+        if kind == CALL:
+            func, args = info
+            func(*args)
+        else:
+            self.handler(kind, info)
+
+    def _drain(self):
+        """处理本帧之前到达的所有事件，可合并的事件只保留最后一个"""
+        try:
+            queue = self._queue
+            latest = None
+            # 只处理开始时已在队列中的事件，工作线程持续投递也不会卡住界面
+            for _ in range(len(queue)):
+                kind, info = queue.popleft()
+                if kind in self.coalesce:
+                    if latest is not None:
+                        self.dropped += 1
+                    latest = (kind, info)
+                    continue
+                # 保持与不可合并事件之间的先后顺序
+                if latest is not None:
+                    self._deliver(*latest)
+                    latest = None
+                self._deliver(kind, info)
+            if latest is not None:
+                self._deliver(*latest)
+        finally:
+            self._after_id = self.root.after(self.interval, self._drain)
@@ -0,0 +1,360 @@
+"""
+Description: Lightweight visual checks used while a script runs.
+Frames are reduced to small grayscale signatures with NumPy so each comparison costs microseconds,
+which lets a wait end as soon as the screen shows the video has finished. Page readiness is checked
+with a few pixel probes read in one batch from a single small capture.
+"""
+
+import numpy as np
+
+
+def signature(frame, size=(8, 64)):
+    """
+    把帧缩小成 size=(行, 列) 的灰度块均值，用于快速比较
+    区域小于目标尺寸时按实际尺寸处理
+    """
+    frame = np.asarray(frame)
+    if frame.ndim == 3:
+        gray = frame[..., :3].astype(np.float32) @ np.array((0.299, 0.587, 0.114), dtype=np.float32)
+    else:
+        gray = frame.astype(np.float32)
+    rows = min(size[0], gray.shape[0])
+    cols = min(size[1], gray.shape[1])
+    # 裁掉不能整除的边缘后按块求均值
+    bh = gray.shape[0] // rows
+    bw = gray.shape[1] // cols
+    gray = gray[:bh * rows, :bw * cols]
+    return gray.reshape(rows, bh, cols, bw).mean(axis=(1, 3))
+
+
+def difference(sig_a, sig_b):
+    """两个签名间最大的块差异(灰度级)"""
+    if sig_a.shape != sig_b.shape:
+        return float("inf")
+    return float(np.abs(sig_a - sig_b).max())
+
+
+class VideoEndDetector:
+    """
+    通过采样屏幕区域判断视频是否播放结束
+    结束条件：区域画面连续 still_time 秒没有变化(进度条停止)，
+    或者与给定的结束画面(重播提示等)足够相似
+    "param source: 帧来源
+    "param region: 检测区域 (left, top, width, height)
+    "param interval: 采样间隔(秒)
+    "param still_time: 画面静止多久视为结束
+    "param threshold: 块灰度差异阈值，超过视为画面有变化
+    "param min_wait: 开始检测前至少等待的时间，避免页面加载时误判
+    "param end_frame: 可选的结束画面
+    """
+
+    def __init__(self, source, region, interval=2.0, still_time=10.0, threshold=3.0,
+                 min_wait=10.0, end_frame=None):
+        self.source = source
+        self.region = region
+        self.interval = interval
+        self.still_time = still_time
+        self.threshold = threshold
+        self.min_wait = min_wait
+        self.end_signature = signature(end_frame) if end_frame is not None else None
+        self.samples = 0
+
+    def wait(self, scheduler, timeout):
+        """
+        等待视频结束，最长 timeout 秒
+        返回 "finished"、"timeout" 或 "cancelled"
+        """
+        clock = scheduler.clock
+        start = clock()
+        deadline = start + timeout
+
+        # 先等待最短时间(不超过超时时间)，这段时间不需要截图
+        if not scheduler.wait_until(min(start + self.min_wait, deadline)):
+            return "cancelled"
+
+        handle = self.source.register(self.region)
+        try:
+            return self._sample(scheduler, deadline)
+        finally:
+            self.source.unregister(handle)
+
+    def _sample(self, scheduler, deadline):
+        """按间隔采样直到满足结束条件或超时"""
+        clock = scheduler.clock
+        last_sig = None
+        last_change = clock()
+
+        while True:
+            now = clock()
+            if now >= deadline:
+                return "timeout"
+
+            sig = signature(self.source.grab(self.region))
+            self.samples += 1
+            if self.end_signature is not None and difference(sig, self.end_signature) <= self.threshold:
+                return "finished"
+            if last_sig is None or difference(sig, last_sig) > self.threshold:
+                last_change = now
+                last_sig = sig
+            elif now - last_change >= self.still_time:
+                return "finished"
+
+            if not scheduler.wait_until(min(now + self.interval, deadline)):
+                return "cancelled"
+
+
+# ---- 页面就绪检测 ----
+
+def parse_color(value):
+    """"#RRGGBB" 或 (r, g, b) 转为 (r, g, b)"""
+    if isinstance(value, str):
+        text = value.strip().lstrip("#")
+        if len(text) != 6:
+            raise ValueError(f"无效的颜色: {value}")
+        return tuple(int(text[i:i + 2], 16) for i in (0, 2, 4))
+    r, g, b = (int(v) for v in value)
+    return r, g, b
+
+
+def normalize_probes(probes):
+    """
+    检测点统一为 [x, y, r, g, b] 列表(可直接保存在步骤中)
+    每个检测点可写成 [x, y, r, g, b]、[x, y, "#RRGGBB"] 或 (x, y, (r, g, b))
+    """
+    result = []
+    for probe in probes:
+        if len(probe) == 5:
+            x, y, r, g, b = probe
+            color = parse_color((r, g, b))
+        elif len(probe) == 3:
+            x, y, color = probe
+            color = parse_color(color)
+        else:
+            raise ValueError(f"无效的检测点: {probe}")
+        result.append([int(x), int(y), *color])
+    if not result:
+        raise ValueError("至少需要一个检测点")
+    return result
+
+
+class ReadyCheck:
+    """
+    页面就绪检测：所有检测点的颜色与期望颜色的每个通道差异都不超过 tolerance 时视为就绪
+    每次检测只截取包含所有检测点的最小区域，再用数组索引一次取出所有检测点比较
+    检测间隔从 first_delay 开始每次翻倍，最长 max_interval，页面很快就绪时几乎不额外等待
+    "param source: 帧来源
+    "param probes: 检测点，格式见 normalize_probes
+    "param tolerance: 每个颜色通道允许的差异
+    "param first_delay: 点击后第一次检测前的等待(秒)，避免把上一个页面误判为就绪
+    "param max_interval: 检测间隔上限(秒)
+    """
+
+    def __init__(self, source, probes, tolerance=24, first_delay=0.1, max_interval=0.5):
+        self.source = source
+        probes = np.array(normalize_probes(probes), dtype=np.int32)
+        left, top = probes[:, 0].min(), probes[:, 1].min()
+        width = probes[:, 0].max() - left + 1
+        height = probes[:, 1].max() - top + 1
+        self.region = (int(left), int(top), int(width), int(height))
+        # 检测点在截图区域内的行列坐标
+        self.rows = probes[:, 1] - top
+        self.cols = probes[:, 0] - left
+        self.colors = probes[:, 2:].astype(np.int16)
+        self.tolerance = tolerance
+        self.first_delay = first_delay
+        self.max_interval = max_interval
+        self.samples = 0
+
+    def ready(self, frame):
+        """一帧(截图区域)中所有检测点是否都符合期望颜色"""
+        pixels = np.asarray(frame)[self.rows, self.cols, :3].astype(np.int16)
+        return bool((np.abs(pixels - self.colors) <= self.tolerance).all())
+
+    def wait(self, scheduler, timeout):
+        """
+        等待页面就绪，最长 timeout 秒
+        返回 "ready"、"timeout" 或 "cancelled"
+        """
+        clock = scheduler.clock
+        deadline = clock() + timeout
+        delay = self.first_delay
+        while True:
+            if not scheduler.wait_until(min(clock() + delay, deadline)):
+                return "cancelled"
+            self.samples += 1
+            if self.ready(self.source.grab(self.region)):
+                return "ready"
+            if clock() >= deadline:
+                return "timeout"
+            delay = min(delay * 2, self.max_interval)
+
+
+# ---- 图像模板定位 ----
+
+def to_gray(frame):
+    """RGB 帧转为 float32 灰度"""
+    frame = np.asarray(frame)
+    if frame.ndim == 3:
+        return frame[..., :3].astype(np.float32) @ np.array((0.299, 0.587, 0.114), dtype=np.float32)
+    return frame.astype(np.float32)
+
+
+def pyramid(gray, levels):
+    """2x2 块均值逐级缩小，返回从原始尺寸到最粗层的列表"""
+    result = [gray]
+    for _ in range(levels - 1):
+        g = result[-1]
+        h = g.shape[0] // 2 * 2
+        w = g.shape[1] // 2 * 2
+        if h < 2 or w < 2:
+            break
+        result.append(g[:h, :w].reshape(h // 2, 2, w // 2, 2).mean(axis=(1, 3)))
+    return result
+
+
+def ssd_map(image, template):
+    """
+    模板在图像每个位置的平方差和
+    sum((I - T)^2) = sum(I^2) - 2 * sum(I * T) + sum(T^2)，其中 sum(I^2) 用积分图计算
+    """
+    th, tw = template.shape
+    windows = np.lib.stride_tricks.sliding_window_view(image, (th, tw))
+    corr = np.einsum("ijkl,kl->ij", windows, template, optimize=True)
+    sq = np.pad(np.square(image, dtype=np.float64), ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    win_sq = sq[th:, tw:] - sq[:-th, tw:] - sq[th:, :-tw] + sq[:-th, :-tw]
+    return win_sq - 2.0 * corr + float(np.square(template, dtype=np.float64).sum())
+
+
+def load_template(path):
+    """读取模板图片为 RGB 数组"""
+    from PIL import Image
+    with Image.open(path) as image:
+        return np.asarray(image.convert("RGB"))
+
+
+class TargetNotFound(LookupError):
+    """屏幕上找不到模板图像"""
+
+
+class TemplateLocator:
+    """
+    在屏幕上查找按钮模板，返回中心坐标
+    先在上次命中位置附近的缓存区域内做金字塔由粗到细搜索，未命中时才搜索整个屏幕
+    "param source: 帧来源
+    "param levels: 金字塔层数
+    "param threshold: 相似度阈值(0~1)，基于均方根灰度差
+    "param margin: 缓存区域在模板四周扩展的倍数(相对模板尺寸)
+    """
+
+    def __init__(self, source, levels=3, threshold=0.9, margin=1.0):
+        self.source = source
+        self.levels = levels
+        self.threshold = threshold
+        self.margin = margin
+        self.templates = {}
+        self.last_hits = {}
+        self.full_searches = 0
+        self.roi_searches = 0
+
+    def template(self, key):
+        """按路径缓存模板的灰度金字塔"""
+        pyr = self.templates.get(key)
+        if pyr is None:
+            pyr = self._build(load_template(key))
+            self.templates[key] = pyr
+        return pyr
+
+    def add_template(self, key, image):
+        """直接登记模板数组(无需图片文件)"""
+        self.last_hits.pop(key, None)
+        self.templates[key] = self._build(image)
+
+    def _build(self, image):
+        gray = to_gray(image)
+        # 模板在最粗层至少保留 4 像素
+        levels = 1
+        while levels < self.levels and min(gray.shape) >> levels >= 4:
+            levels += 1
+        return pyramid(gray, levels)
+
+    def search(self, frame, tpl_pyr):
+        """
+        在一帧内搜索模板，返回 (左上角 x, 左上角 y, 相似度)，区域太小时返回 None
+        """
+        gray = to_gray(frame)
+        th, tw = tpl_pyr[0].shape
+        if gray.shape[0] < th or gray.shape[1] < tw:
+            return None
+        img_pyr = pyramid(gray, len(tpl_pyr))
+        top = min(len(img_pyr), len(tpl_pyr)) - 1
+
+        # 最粗层全局搜索
+        img, tpl = img_pyr[top], tpl_pyr[top]
+        if img.shape[0] < tpl.shape[0] or img.shape[1] < tpl.shape[1]:
+            top = 0
+            img, tpl = img_pyr[0], tpl_pyr[0]
+        ssd = ssd_map(img, tpl)
+        r, c = np.unravel_index(int(np.argmin(ssd)), ssd.shape)
+
+        # 逐层细化：每层只在上一层结果附近 ±2 像素内搜索
+        for level in range(top - 1, -1, -1):
+            img, tpl = img_pyr[level], tpl_pyr[level]
+            th, tw = tpl.shape
+            max_r = img.shape[0] - th
+            max_c = img.shape[1] - tw
+            r0 = min(max(r * 2 - 2, 0), max_r)
+            c0 = min(max(c * 2 - 2, 0), max_c)
+            r1 = min(r * 2 + 2, max_r)
+            c1 = min(c * 2 + 2, max_c)
+            patch = img[r0:r1 + th, c0:c1 + tw]
+            ssd = ssd_map(patch, tpl)
+            dr, dc = np.unravel_index(int(np.argmin(ssd)), ssd.shape)
+            r, c = r0 + dr, c0 + dc
+
+        tpl = tpl_pyr[0]
+        th, tw = tpl.shape
+        diff = gray[r:r + th, c:c + tw] - tpl
+        rms = float(np.sqrt(np.mean(np.square(diff))))
+        return int(c), int(r), 1.0 - rms / 255.0
+
+    def roi(self, key, tpl_shape):
+        """上次命中位置附近的搜索区域"""
+        hit = self.last_hits.get(key)
+        if hit is None:
+            return None
+        th, tw = tpl_shape
+        mx = int(tw * self.margin) + 4
+        my = int(th * self.margin) + 4
+        screen_w, screen_h = self.source.size()
+        left = max(hit[0] - tw // 2 - mx, 0)
+        top = max(hit[1] - th // 2 - my, 0)
+        right = min(hit[0] - tw // 2 + tw + mx, screen_w)
+        bottom = min(hit[1] - th // 2 + th + my, screen_h)
+        return left, top, right - left, bottom - top
+
+    def locate(self, key):
+        """查找模板，返回屏幕上的中心坐标 (x, y)，找不到时返回 None"""
+        tpl_pyr = self.template(key)
+        th, tw = tpl_pyr[0].shape
+
+        region = self.roi(key, (th, tw))
+        if region is not None:
+            self.roi_searches += 1
+            found = self.search(self.source.grab(region), tpl_pyr)
+            if found is not None and found[2] >= self.threshold:
+                return self._hit(key, region, found, th, tw)
+
+        self.full_searches += 1
+        width, height = self.source.size()
+        region = (0, 0, width, height)
+        found = self.search(self.source.grab(region), tpl_pyr)
+        if found is not None and found[2] >= self.threshold:
+            return self._hit(key, region, found, th, tw)
+        self.last_hits.pop(key, None)
+        return None
+
+    def _hit(self, key, region, found, th, tw):
+        x = region[0] + found[0] + tw // 2
+        y = region[1] + found[1] + th // 2
+        self.last_hits[key] = (x, y)
+        return x, y